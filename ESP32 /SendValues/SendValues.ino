@@ -7,10 +7,168 @@ Adafruit_VL53L0X lox = Adafruit_VL53L0X();
 // Variable to store the measurement data
 VL53L0X_RangingMeasurementData_t measure;
 uint32_t t_val = 0;
+
+// --- Output format (must match SERIAL_FORMAT in ESP32.py) ---
+// FORMAT_TEXT:   "Distance(mm): 123\tFSR Reading: 456\tTime(ms):789"  (~52 bytes/sample)
+// FORMAT_TERSE:  "123,456,789"                                         (~15 bytes/sample)
+// FORMAT_BINARY: 11-byte frame, see serial_framing.py                  ( 11 bytes/sample)
+#define FORMAT_TEXT 0
+#define FORMAT_TERSE 1
+#define FORMAT_BINARY 2
+#define OUTPUT_FORMAT FORMAT_TEXT
+
+#define NO_DISTANCE 0xFFFF  // distance value sent when out of range (NaN) or not measured this sample
+
+#define FSR_PIN 4
+
+// --- Sampling (defaults; ESP32.py can change them with the commands below) ---
+uint32_t sampleIntervalMs = 50;    // one sample (FSR + time) every this many ms; 0 = as fast as possible
+uint32_t distanceIntervalMs = 0;   // single-shot distance at most this often; 0 = every sample
+uint32_t timingBudgetUs = 0;       // VL53L0X timing budget; 0 = the one set by begin()
+uint16_t continuousPeriodMs = 0;   // >0: VL53L0X continuous ranging with this period (non-blocking)
+uint32_t lastSampleMs = 0;
+uint32_t lastDistanceMs = 0;
+
+// --- Commands from the host, one per line (replies start with '#') ---
+// INTERVAL <ms>     sample interval
+// DISTANCE <ms>     distance interval in single-shot mode; samples in
+//                   between carry NO_DISTANCE, so the FSR runs faster
+// BUDGET <us>       VL53L0X timing budget (20000 fast .. 200000 accurate)
+// CONTINUOUS <ms>   continuous ranging with this period, 0 = single-shot
+// STATUS            reply with the current settings
+char command[32];
+uint8_t commandLength = 0;
+
+void sendBinary(uint16_t distance, uint16_t fsr, uint32_t t) {
+  uint8_t frame[11];
+  frame[0] = 0xA5;  // sync word
+  frame[1] = 0x5A;
+  memcpy(&frame[2], &t, 4);  // ESP32 is little-endian, as the frame
+  memcpy(&frame[6], &distance, 2);
+  memcpy(&frame[8], &fsr, 2);
+  uint8_t sum = 0;
+  for (int i = 2; i < 10; i++) {
+    sum += frame[i];
+  }
+  frame[10] = sum;  // checksum: sum of payload bytes modulo 256
+  Serial.write(frame, sizeof(frame));
+}
+
+void sendSample(uint16_t distance, uint16_t fsr, uint32_t t) {
+#if OUTPUT_FORMAT == FORMAT_BINARY
+  sendBinary(distance, fsr, t);
+#elif OUTPUT_FORMAT == FORMAT_TERSE
+  if (distance == NO_DISTANCE) {
+    Serial.print("NaN");
+  } else {
+    Serial.print(distance);
+  }
+  Serial.print(',');
+  Serial.print(fsr);
+  Serial.print(',');
+  Serial.println(t);
+#else
+  Serial.print("Distance(mm): ");
+  if (distance == NO_DISTANCE) {
+    Serial.print("NaN");
+  } else {
+    Serial.print(distance);
+  }
+  Serial.print("\tFSR Reading: ");
+  Serial.print(fsr);
+  Serial.print("\tTime(ms):");
+  Serial.println(t);
+#endif
+}
+
+void printStatus() {
+  Serial.print("# interval=");
+  Serial.print(sampleIntervalMs);
+  Serial.print(" distance=");
+  Serial.print(distanceIntervalMs);
+  Serial.print(" budget=");
+  Serial.print(timingBudgetUs);
+  Serial.print(" continuous=");
+  Serial.println(continuousPeriodMs);
+}
+
+void runCommand(char *line) {
+  char *arg = strchr(line, ' ');
+  long value = 0;
+  if (arg) {
+    *arg++ = '\0';
+    value = atol(arg);
+  }
+  if (value < 0) {
+    value = 0;
+  }
+  if (strcmp(line, "INTERVAL") == 0) {
+    sampleIntervalMs = value;
+  } else if (strcmp(line, "DISTANCE") == 0) {
+    distanceIntervalMs = value;
+  } else if (strcmp(line, "BUDGET") == 0) {
+    if (lox.setMeasurementTimingBudgetMicroSeconds(value)) {
+      timingBudgetUs = value;
+    } else {
+      Serial.println("# error: budget rejected");
+    }
+  } else if (strcmp(line, "CONTINUOUS") == 0) {
+    if (continuousPeriodMs) {
+      lox.stopRangeContinuous();
+    }
+    continuousPeriodMs = value;
+    if (continuousPeriodMs) {
+      lox.startRangeContinuous(continuousPeriodMs);
+    }
+  } else if (strcmp(line, "STATUS") != 0) {
+    Serial.print("# error: unknown command ");
+    Serial.println(line);
+    return;
+  }
+  printStatus();
+}
+
+void readCommands() {
+  while (Serial.available()) {
+    char c = Serial.read();
+    if (c == '\n' || c == '\r') {
+      if (commandLength) {
+        command[commandLength] = '\0';
+        runCommand(command);
+        commandLength = 0;
+      }
+    } else if (commandLength < sizeof(command) - 1) {
+      command[commandLength++] = c;
+    }
+  }
+}
+
+uint16_t readDistance(uint32_t now) {
+  if (continuousPeriodMs) {
+    // Continuous ranging: take a result only when a new one is ready
+    if (!lox.isRangeComplete()) {
+      return NO_DISTANCE;
+    }
+    uint16_t range = lox.readRangeResult();
+    return lox.readRangeStatus() != 4 ? range : NO_DISTANCE;
+  }
+  if (distanceIntervalMs && now - lastDistanceMs < distanceIntervalMs) {
+    return NO_DISTANCE;
+  }
+  lastDistanceMs = now;
+  // Blocks for the timing budget
+  VL53L0X_Error status = lox.getSingleRangingMeasurement(&measure, false); // false = disable debug prints
+  // measure.RangeStatus == 4 indicates "Phase out of valid limits" or "Sigma Fail" or out of range
+  if (status == VL53L0X_ERROR_NONE && measure.RangeStatus != 4) {
+    return measure.RangeMilliMeter;
+  }
+  return NO_DISTANCE;
+}
+
 void setup() {
   // Initialize Serial communication at 115200 baud
   Serial.begin(115200);
-  pinMode(4,OUTPUT);
+  pinMode(FSR_PIN,OUTPUT);
   while (!Serial) {
     delay(1);
   }
@@ -23,34 +181,13 @@ void setup() {
 }
 
 void loop() {
+  readCommands();
   t_val = millis();
-  VL53L0X_Error status = lox.getSingleRangingMeasurement(&measure, false); // false = disable debug prints
-
-  if (status == VL53L0X_ERROR_NONE) {
-    // Print the distance measurement:
-    // measure.RangeStatus == 4 indicates "Phase out of valid limits" or "Sigma Fail" or out of range
-    if (measure.RangeStatus != 4) {
-      Serial.print("Distance(mm): ");
-      Serial.print(measure.RangeMilliMeter);
-    } else {
-      Serial.print("Distance(mm): ");
-      Serial.print("NaN");
-    }
-
-    // --- Optional: Print more details from the measurement struct ---
-    // Serial.print("Signal Rate (Mcps): "); Serial.println(measure.SignalRateRtnMegaCps / 65536.0);
-    // Serial.print("Ambient Rate (Mcps): "); Serial.println(measure.AmbientRateRtnMegaCps / 65536.0);
-    // Serial.print("Sigma (mm): "); Serial.println(measure.SigmaMilliMeter / 65536.0);
-    // Serial.print("Status: "); Serial.println((int)measure.RangeStatus);
-    // lox.printRangeStatus(&measure); // Helper function to decode status
-
-  } else {
-    Serial.print("Distance(mm): ");
-    Serial.print("NaN");
+  if (t_val - lastSampleMs < sampleIntervalMs) {
+    return;
   }
-  Serial.print("\tFSR Reading: ");
-  Serial.print(analogRead(4));
-  Serial.print("\tTime(ms):");
-  Serial.println(t_val);
-  delay(50);
-}
\ No newline at end of file
+  // Keep the cadence (no drift from the loop overhead) unless we fell behind
+  lastSampleMs = (sampleIntervalMs && t_val - lastSampleMs < 2 * sampleIntervalMs) ? lastSampleMs + sampleIntervalMs : t_val;
+  uint16_t distance = readDistance(t_val);
+  sendSample(distance, analogRead(FSR_PIN), t_val);
+}
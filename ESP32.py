@@ -2,12 +2,52 @@ import serial
 import re
 import time
 import csv
+import os
+import argparse
+import queue
+import threading
 
+import numpy as np
+
+import binlog
+from serial_framing import REPLY_PREFIX, make_decoder
 
 SERIAL_PORT = '/dev/ttyUSB0' 
 BAUD_RATE = 115200           
 TIMEOUT_SEC = 1            
 
+# Wire format sent by SendValues.ino (its OUTPUT_FORMAT must match):
+# 'text' (Distance(mm): ... lines, parsed with the regex below),
+# 'terse' (distance,fsr,time lines) or 'binary' (11-byte frames)
+SERIAL_FORMAT = 'text'
+
+# --- Logging ---
+OUTPUT_FILE = 'data_esp.csv'
+# 'csv' or 'bin' (binary record log, see binlog.py; written to data_esp.bin)
+STORAGE = 'csv'
+CSV_HEADER = ['distance mm', 'fsr reading', 'time ms']
+FLUSH_ROWS = 200          # write buffered rows once this many are pending...
+FLUSH_INTERVAL_SEC = 0.5  # ...or once this long has passed since the last write
+FSYNC_INTERVAL_SEC = 5.0  # force data to disk this often (0 disables)
+ROTATE_ROWS = 0           # start a new file after this many rows (0 disables)
+PRINT_INTERVAL_SEC = 1.0  # console status this often
+
+# --- Acquisition ---
+RING_BUFFER_BYTES = 1 << 20  # raw bytes buffered between the reader and parser threads
+READ_CHUNK_BYTES = 65536     # most bytes taken from the port per read
+QUEUE_BATCHES = 256          # parsed batches waiting for the storage thread
+RECONNECT_MIN_SEC = 0.5      # first reconnect delay, doubled after every failure...
+RECONNECT_MAX_SEC = 10.0     # ...up to this
+
+# --- Sampling (sent to SendValues.ino on connect; None leaves the sketch's setting) ---
+SAMPLE_INTERVAL_MS = None    # one sample every this many ms (0 = as fast as possible)
+DISTANCE_INTERVAL_MS = None  # single-shot distance at most this often; FSR-only samples in between
+TIMING_BUDGET_US = None      # VL53L0X timing budget, 20000 (fast) .. 200000 (accurate)
+CONTINUOUS_MS = None         # VL53L0X continuous ranging period (0 = single-shot)
+
+# Achieved rate and jitter are computed over the time stamps of the last RATE_WINDOW samples
+RATE_WINDOW = 1000
+
 # --- Regular Expression to parse the line ---
 # This pattern looks for the specific keys and captures the values
 # It handles potential whitespace variations and the "NaN" value for distance.
@@ -55,49 +95,470 @@ def parse_serial_data(line):
         #    print(f"Warning: Line did not match expected format: '{line}'")
         return None
 
-def read_serial(port, baudrate, timeout):
+class BufferedCsvLogger:
+    """
+    Keeps the output CSV open and writes rows in batches. Rows are flushed
+    when `flush_rows` are pending or `flush_interval` seconds have passed,
+    fsync'd every `fsync_interval` seconds and, if `rotate_rows` is set,
+    continued in a new numbered file (data_esp_001.csv, ...) once a file
+    holds that many rows.
+    """
+
+    def __init__(self, filename=OUTPUT_FILE, header=CSV_HEADER, flush_rows=FLUSH_ROWS,
+                 flush_interval=FLUSH_INTERVAL_SEC, fsync_interval=FSYNC_INTERVAL_SEC,
+                 rotate_rows=ROTATE_ROWS):
+        self.filename = filename
+        self.header = header
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.rotate_rows = rotate_rows
+        self.rows_written = 0
+        self.file_index = 0
+        self._pending = []
+        self._file_rows = 0
+        self._file = None
+        self._writer = None
+        self.start_time = time.monotonic()
+        self._last_flush = self.start_time
+        self._last_fsync = self.start_time
+        self._open()
+
+    def _current_filename(self):
+        if self.file_index == 0:
+            return self.filename
+        root, ext = os.path.splitext(self.filename)
+        return f"{root}_{self.file_index:03d}{ext}"
+
+    def _open(self):
+        self._file = open(self._current_filename(), 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.header)
+        self._file_rows = 0
+
+    def _write_batch(self, rows):
+        self._writer.writerows(rows)
+
+    def write(self, row):
+        """Queue one row; writes to disk only when a flush is due."""
+        self._pending.append(row)
+        if len(self._pending) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_rows(self, rows):
+        """Queue several rows at once (e.g. a decoded chunk)."""
+        self._pending.extend(rows)
+        if len(self._pending) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        now = time.monotonic()
+        pending = self._pending
+        self._pending = []
+        while pending:
+            n = len(pending)
+            if self.rotate_rows:
+                n = min(n, self.rotate_rows - self._file_rows)
+            self._write_batch(pending[:n])
+            pending = pending[n:]
+            self._file_rows += n
+            self.rows_written += n
+            if self.rotate_rows and self._file_rows >= self.rotate_rows:
+                self._rotate()
+        self._file.flush()
+        self._last_flush = now
+        if self.fsync_interval and now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def _rotate(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self.file_index += 1
+        self._open()
+
+    @property
+    def backlog(self):
+        """Rows received but not yet written to the file."""
+        return len(self._pending)
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.monotonic() - self.start_time
+        return self.rows_written / elapsed if elapsed > 0 else 0.0
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+class BufferedBinLogger(BufferedCsvLogger):
+    """
+    Same batching, fsync and rotation policy as BufferedCsvLogger, but
+    writes a binary record log (binlog.RAW_DTYPE) that can be memory-mapped
+    with binlog.open_log and converted back with binlog.bin_to_csv.
+    """
+
+    def __init__(self, filename=None, **kwargs):
+        if filename is None:
+            filename = os.path.splitext(OUTPUT_FILE)[0] + binlog.EXTENSION
+        super().__init__(filename, **kwargs)
+
+    def _open(self):
+        self._file = binlog.RecordWriter(self._current_filename(), binlog.RAW_DTYPE, csv_header=self.header)
+        self._file_rows = 0
+
+    def _write_batch(self, rows):
+        self._file.write(rows)
+
+
+class ByteRing:
+    """
+    Fixed-capacity byte buffer between the serial reader thread and the
+    parser. write() never blocks: bytes that do not fit are discarded and
+    counted in `overflow_bytes`, so the reader keeps draining the port even
+    when everything downstream is stalled.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity or RING_BUFFER_BYTES
+        self._buffer = bytearray(self.capacity)
+        self._start = 0
+        self._size = 0
+        self.overflow_bytes = 0
+        self._cond = threading.Condition()
+
+    def write(self, data):
+        with self._cond:
+            n = min(len(data), self.capacity - self._size)
+            self.overflow_bytes += len(data) - n
+            end = (self._start + self._size) % self.capacity
+            first = min(n, self.capacity - end)
+            self._buffer[end:end + first] = data[:first]
+            self._buffer[:n - first] = data[first:n]
+            self._size += n
+            self._cond.notify()
+
+    def read(self, timeout=None):
+        """All buffered bytes (waits up to `timeout` for some; b'' if none)."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._size > 0, timeout):
+                return b''
+            end = self._start + self._size
+            if end <= self.capacity:
+                data = bytes(self._buffer[self._start:end])
+            else:
+                data = bytes(self._buffer[self._start:]) + bytes(self._buffer[:end - self.capacity])
+            self._start = 0
+            self._size = 0
+            return data
+
+    @property
+    def fill(self):
+        return self._size
+
+
+class TextLineDecoder:
+    """
+    Splits the 'text' format into lines across arbitrary chunks and parses
+    them with parse_serial_data. feed() returns a list of
+    [distance, fsr, time] rows; lines that do not parse are counted in
+    `bad_frames`.
+    """
+
+    def __init__(self):
+        self._buffer = b''
+        self.frames = 0
+        self.bad_frames = 0
+        self.messages = []
+
+    def feed(self, data):
+        lines = (self._buffer + data).split(b'\n')
+        self._buffer = lines.pop()
+        rows = []
+        for line in lines:
+            line_str = line.decode('utf-8', errors='ignore').strip()
+            if not line_str:
+                continue
+            if line.startswith(REPLY_PREFIX):
+                self.messages.append(line_str)
+                continue
+            parsed = parse_serial_data(line_str)
+            if parsed:
+                rows.append([parsed['distance_mm'], parsed['fsr_reading'], parsed['time_ms']])
+                self.frames += 1
+            else:
+                self.bad_frames += 1
+        return rows
+
+
+def sampling_commands(interval_ms=SAMPLE_INTERVAL_MS, distance_ms=DISTANCE_INTERVAL_MS,
+                      budget_us=TIMING_BUDGET_US, continuous_ms=CONTINUOUS_MS):
+    """
+    Command lines for SendValues.ino (see its command list) for the
+    settings that are not None, followed by STATUS so the sketch echoes the
+    result. Empty if nothing is set.
+    """
+    settings = [("INTERVAL", interval_ms), ("DISTANCE", distance_ms), ("BUDGET", budget_us),
+                ("CONTINUOUS", continuous_ms)]
+    lines = [f"{name} {int(value)}\n" for name, value in settings if value is not None]
+    return [line.encode() for line in lines + ["STATUS\n"]] if lines else []
+
+
+class RateMonitor:
+    """
+    Achieved sample rate and jitter from the ESP32 time stamps (time_ms) of
+    the last `window` samples, plus how often they carried a distance.
+    A time stamp going backwards (board reset) starts over.
+    """
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self._times = np.zeros(window)
+        self._distance = np.zeros(window, dtype=bool)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def add(self, rows):
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, 3)
+        times = rows[:, 2]
+        with self._lock:
+            previous = self._times[(self._count - 1) % self.window] if self._count else -np.inf
+            back = np.flatnonzero(np.diff(np.concatenate(([previous], times))) < 0)
+            if len(back):
+                rows, times = rows[back[-1]:], times[back[-1]:]
+                self._count = 0
+            rows, times = rows[-self.window:], times[-self.window:]
+            index = (self._count + np.arange(len(times))) % self.window
+            self._times[index] = times
+            self._distance[index] = ~np.isnan(rows[:, 0])
+            self._count += len(times)
+
+    def summary(self):
+        """Dict of rate_hz, distance_hz, mean/jitter (std)/max interval in ms; None below 2 samples."""
+        with self._lock:
+            n = min(self._count, self.window)
+            if n < 2:
+                return None
+            order = (self._count - n + np.arange(n)) % self.window
+            times = self._times[order]
+            distance = self._distance[order]
+        dt = np.diff(times)
+        span = (times[-1] - times[0]) / 1000.0
+        return {
+            "samples": int(n),
+            "rate_hz": (n - 1) / span if span > 0 else float('inf'),
+            "distance_hz": np.count_nonzero(distance[1:]) / span if span > 0 else float('inf'),
+            "interval_ms": float(dt.mean()),
+            "jitter_ms": float(dt.std()),
+            "max_gap_ms": float(dt.max()),
+        }
+
+
+def format_rate(rate):
+    if rate is None:
+        return "rate n/a"
+    return (f"{rate['rate_hz']:.1f} Hz (interval {rate['interval_ms']:.1f} ms, jitter {rate['jitter_ms']:.2f} ms, "
+            f"max gap {rate['max_gap_ms']:.0f} ms), distance {rate['distance_hz']:.1f} Hz")
+
+
+class SerialAcquisition:
+    """
+    ESP32 acquisition on three threads:
+      reader  reads whatever the port has (up to READ_CHUNK_BYTES) into a
+              ByteRing, and reopens the port with exponential backoff
+              (RECONNECT_MIN_SEC .. RECONNECT_MAX_SEC) after any error
+      parser  decodes the buffered bytes and puts batches of rows on a
+              bounded queue (QUEUE_BATCHES); when storage falls behind it
+              waits, and the ring absorbs the difference
+      storage writes the batches through the logger
+    Data is only discarded when the ring is full, and then it is counted
+    (overflow_bytes). stats() returns all counters. `commands` (see
+    sampling_commands) are sent once the board is sending after every
+    (re)connect, since opening the port may reset it; its replies are
+    printed. `listeners` are called with every parsed batch of rows on the
+    parser thread; with logger=None they are its only consumers and there
+    is no storage thread.
+    """
+
+    def __init__(self, port, baudrate, logger, serial_format=SERIAL_FORMAT, timeout=TIMEOUT_SEC, commands=()):
+        self.port = port
+        self.commands = list(commands)
+        self.rate = RateMonitor()
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.logger = logger
+        self.serial_format = serial_format
+        self.decoder = TextLineDecoder() if serial_format == 'text' else make_decoder(serial_format)
+        self.ring = ByteRing()
+        self.batches = queue.Queue(maxsize=QUEUE_BATCHES)
+        self.connected = False
+        self.bytes_read = 0
+        self.reconnects = 0
+        self.last_error = None
+        self.last_row = None
+        self.listeners = []
+        self._running = threading.Event()
+        self._reading = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._read_loop, name="serial-reader", daemon=True),
+            threading.Thread(target=self._parse_loop, name="serial-parser", daemon=True),
+        ]
+        if logger is not None:
+            self._threads.append(threading.Thread(target=self._store_loop, name="serial-storage", daemon=True))
+
+    def start(self):
+        self._running.set()
+        self._reading.set()
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stops reading, then lets the parser and storage drain everything already received."""
+        self._reading.clear()
+        self._threads[0].join()
+        self._running.clear()
+        self._threads[1].join()
+        if self.logger is not None:
+            self.batches.put(None)
+            self._threads[2].join()
+
+    def _read_loop(self):
+        delay = RECONNECT_MIN_SEC
+        while self._reading.is_set():
+            try:
+                with serial.serial_for_url(self.port, self.baudrate, timeout=self.timeout) as ser:
+                    self.connected = True
+                    delay = RECONNECT_MIN_SEC
+                    print(f"Successfully connected to {self.port}. Reading data...")
+                    pending = bool(self.commands)
+                    while self._reading.is_set():
+                        data = ser.read(min(max(ser.in_waiting, 1), READ_CHUNK_BYTES))
+                        if data:
+                            self.bytes_read += len(data)
+                            self.ring.write(data)
+                            if pending:
+                                ser.write(b''.join(self.commands))
+                                pending = False
+            except (serial.SerialException, OSError) as e:
+                self.last_error = str(e)
+            self.connected = False
+            if not self._reading.is_set():
+                break
+            self.reconnects += 1
+            print(f"Serial error: {self.last_error}")
+            print(f"Attempting to reconnect in {delay:.1f} s...")
+            # Interruptible sleep: stop() does not have to wait out the backoff
+            self._wait_reading_cleared(delay)
+            delay = min(delay * 2, RECONNECT_MAX_SEC)
+
+    def _wait_reading_cleared(self, seconds):
+        end = time.monotonic() + seconds
+        while self._reading.is_set() and time.monotonic() < end:
+            time.sleep(min(0.1, end - time.monotonic()))
+
+    def _parse_loop(self):
+        while self._running.is_set() or self.ring.fill:
+            data = self.ring.read(timeout=0.1)
+            if not data:
+                continue
+            rows = self.decoder.feed(data)
+            if not isinstance(rows, list):
+                rows = rows.tolist()
+            while self.decoder.messages:
+                print(f"ESP32: {self.decoder.messages.pop(0)}")
+            if rows:
+                self.last_row = rows[-1]
+                self.rate.add(rows)
+                for listener in self.listeners:
+                    listener(rows)
+                if self.logger is not None:
+                    self.batches.put(rows)
+
+    def _store_loop(self):
+        while True:
+            try:
+                rows = self.batches.get(timeout=self.logger.flush_interval)
+            except queue.Empty:
+                # Stream paused: do not leave the last rows pending
+                if self.logger.backlog:
+                    self.logger.flush()
+                continue
+            if rows is None:
+                break
+            self.logger.write_rows(rows)
+        self.logger.flush()
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "bytes": self.bytes_read,
+            "lines": self.decoder.frames + self.decoder.bad_frames,
+            "records": self.decoder.frames,
+            "parse_failures": self.decoder.bad_frames,
+            "overflow_bytes": self.ring.overflow_bytes,
+            "ring_bytes": self.ring.fill,
+            "queued_batches": self.batches.qsize(),
+            "reconnects": self.reconnects,
+            "rows_written": self.logger.rows_written if self.logger is not None else None,
+            "rows_per_second": self.logger.rows_per_second if self.logger is not None else None,
+            "rate": self.rate.summary(),
+        }
+
+
+def read_serial(port, baudrate, timeout, print_interval=PRINT_INTERVAL_SEC, serial_format=SERIAL_FORMAT,
+                storage=STORAGE, commands=()):
     """
-    Continuously reads from the specified serial port and parses the data.
+    Logs the ESP32 stream until Ctrl+C, reconnecting whenever the port
+    fails (see SerialAcquisition). `port` may be a device or any pyserial
+    URL (e.g. socket://host:port).
     """
-    with open('data_esp.csv', 'w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(['distance mm', 'fsr reading', 'time ms'])
+    logger = BufferedBinLogger() if storage == 'bin' else BufferedCsvLogger()
+    acquisition = SerialAcquisition(port, baudrate, logger, serial_format, timeout, commands)
     print(f"Attempting to connect to {port} at {baudrate} baud...")
+    acquisition.start()
     try:
-        with serial.Serial(port, baudrate, timeout=timeout) as ser:
-            print(f"Successfully connected to {port}. Reading data...")
-            while True:
-                try:
-                    # Read one line, including the newline character
-                    line_bytes = ser.readline()
-
-                    if line_bytes:
-                        # Decode bytes to string (assuming utf-8 encoding)
-                        # Use 'ignore' or 'replace' for errors if needed
-                        line_str = line_bytes.decode('utf-8', errors='ignore').strip()
-
-                        if line_str: # Check if the line is not empty after stripping
-                            parsed_data = parse_serial_data(line_str)
-                            if parsed_data:
-                                print(f"Received Data: {parsed_data}")
-                                with open('data_esp.csv', 'a', newline='') as file:
-                                    writer = csv.writer(file)
-                                    writer.writerow([parsed_data['distance_mm'], parsed_data['fsr_reading'], parsed_data['time_ms']])
-                except serial.SerialException as e:
-                    print(f"Serial error: {e}")
-                    print("Attempting to reconnect...")
-                    time.sleep(2) # Wait before retrying connection within the loop
-                    # Break or continue based on desired behavior on error
-                    break # Exit the inner loop to let the outer try handle reconnect (if applicable)
-                except KeyboardInterrupt:
-                    print("\nStopping reader...")
-                    break # Exit the loop cleanly on Ctrl+C
-
-    except serial.SerialException as e:
-        print(f"Error opening serial port {port}: {e}")
-        print("Please check the port name, permissions, and connections.")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        while True:
+            time.sleep(print_interval or 0.1)
+            s = acquisition.stats()
+            print(f"Received Data: {acquisition.last_row} | {s['rows_written']} rows, "
+                  f"{s['rows_per_second']:.1f} rows/s, {s['bytes']} bytes, {s['lines']} lines, "
+                  f"{s['parse_failures']} parse failures, {s['overflow_bytes']} bytes overflowed, "
+                  f"{s['reconnects']} reconnects, ring {s['ring_bytes']} bytes, "
+                  f"queue {s['queued_batches']}{'' if s['connected'] else ' (disconnected)'}")
+            print(f"  sampling: {format_rate(s['rate'])}")
+    except KeyboardInterrupt:
+        print("\nStopping reader...")
+    finally:
+        acquisition.stop()
+        logger.close()
+        s = acquisition.stats()
+        print(f"Wrote {logger.rows_written} rows to {logger.filename} ({logger.rows_per_second:.1f} rows/s sustained); "
+              f"{s['parse_failures']} parse failures, {s['overflow_bytes']} bytes overflowed, "
+              f"{s['reconnects']} reconnects.")
+        print(f"Last {s['rate']['samples'] if s['rate'] else 0} samples: {format_rate(s['rate'])}")
 
 if __name__ == "__main__":
-    read_serial(SERIAL_PORT, BAUD_RATE, TIMEOUT_SEC)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Log ESP32 distance/FSR samples to data_esp.csv.")
+    parser.add_argument("--port", default=SERIAL_PORT)
+    parser.add_argument("--baud", type=int, default=BAUD_RATE)
+    parser.add_argument("--format", choices=("text", "terse", "binary"), default=SERIAL_FORMAT,
+                        help="wire format; must match OUTPUT_FORMAT in SendValues.ino")
+    parser.add_argument("--storage", choices=("csv", "bin"), default=STORAGE,
+                        help="CSV (data_esp.csv) or binary record log (data_esp.bin)")
+    parser.add_argument("--interval", type=int, default=SAMPLE_INTERVAL_MS, metavar="MS",
+                        help="sample interval (0 = as fast as possible)")
+    parser.add_argument("--distance-interval", type=int, default=DISTANCE_INTERVAL_MS, metavar="MS",
+                        help="measure distance at most this often; the FSR keeps the sample interval")
+    parser.add_argument("--budget", type=int, default=TIMING_BUDGET_US, metavar="US",
+                        help="VL53L0X timing budget: 20000 (fast) .. 200000 (accurate)")
+    parser.add_argument("--continuous", type=int, default=CONTINUOUS_MS, metavar="MS",
+                        help="VL53L0X continuous ranging period (0 = single-shot)")
+    args = parser.parse_args()
+    commands = sampling_commands(args.interval, args.distance_interval, args.budget, args.continuous)
+    read_serial(args.port, args.baud, TIMEOUT_SEC, serial_format=args.format, storage=args.storage,
+                commands=commands)
\ No newline at end of file
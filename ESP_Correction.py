@@ -1,25 +1,191 @@
-import csv 
+import argparse
+import time
+
+import numpy as np
+
+import binlog
 import correction
 
-distance_unfiltered = []
-FSR_unfiltered = []
-FSR_filtered = []
-distance_filtered = []
-time = []
-
-
-with open('filtered_data.csv', 'w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(['distance mm', 'fsr  (grams)', 'time ms'])
-                        
-
-with open('data_esp.csv', 'r', newline='') as file:
-    reader = csv.reader(file)
-    header = next(reader)  # Skip the header row
-    for row in reader:
-        FSR_unfiltered.append(int(row[1]))
-        distance_unfiltered.append(float(row[0]))
-        time.append(int(row[2]))
-        with open('filtered_data.csv', 'a', newline='') as file2:
-            writer = csv.writer(file2)
-            writer.writerow([correction.correct_distance(float(row[0])), correction.correct_fsr(int(row[1])), int(row[2])])
+INPUT_FILE = 'data_esp.csv'
+OUTPUT_FILE = 'filtered_data.csv'
+OUTPUT_HEADER = 'distance mm,fsr  (grams),time ms'
+OUTPUT_ROW_FORMAT = '%.10g,%.10g,%d\n'
+
+# Bytes of input read (and rows converted/written) per chunk; memory use
+# stays bounded by this however long the log is
+CHUNK_BYTES = 1 << 20
+
+# What to do with samples whose distance is NaN (sensor out of range):
+#   'keep' write them with a NaN distance
+#   'drop' leave them out of the output
+#   'hold' repeat the last valid distance
+NAN_POLICY = 'keep'
+
+# Follow mode: seconds between checks for new rows in a growing log
+POLL_INTERVAL_SEC = 0.2
+
+
+def parse_rows(lines):
+    """
+    Parses CSV lines "distance,fsr,time" into an (n, 3) float array. Lines
+    that do not parse (e.g. a torn last line) are skipped.
+    """
+    try:
+        values = np.loadtxt(lines, delimiter=',', dtype=np.float64, ndmin=2)
+        if values.size and values.shape[1] != 3:
+            raise ValueError("wrong column count")
+        return values.reshape(-1, 3)
+    except ValueError:
+        rows = []
+        for line in lines:
+            try:
+                row = [float(v) for v in line.split(',')]
+            except ValueError:
+                continue
+            if len(row) == 3:
+                rows.append(row)
+        return np.array(rows, dtype=np.float64).reshape(-1, 3)
+
+
+def convert_chunk(values, nan_policy=NAN_POLICY, last_distance=np.nan):
+    """
+    Applies the distance and FSR calibration to an (n, 3) array of
+    [distance, fsr, time]. Returns (converted (m, 3) array, last valid
+    raw distance) so 'hold' can carry over into the next chunk.
+    """
+    distance = values[:, 0].copy()
+    missing = np.isnan(distance)
+    if nan_policy == 'drop':
+        values = values[~missing]
+        distance = distance[~missing]
+    elif nan_policy == 'hold' and missing.any():
+        # Index of the last valid sample at or before each row (-1: none in this chunk)
+        idx = np.where(~missing, np.arange(len(distance)), -1)
+        np.maximum.accumulate(idx, out=idx)
+        distance = np.where(idx >= 0, distance[np.maximum(idx, 0)], last_distance)
+    valid = distance[~np.isnan(distance)]
+    if len(valid):
+        last_distance = valid[-1]
+
+    out = np.empty((len(values), 3), dtype=np.float64)
+    out[:, 0] = correction.correct_distance(distance)
+    out[:, 1] = correction.correct_fsr(values[:, 1])
+    out[:, 2] = values[:, 2]
+    return out, last_distance
+
+
+def format_rows(out):
+    """The whole chunk as one CSV string, formatted in a single operation."""
+    return (OUTPUT_ROW_FORMAT * len(out)) % tuple(out.ravel().tolist())
+
+
+def iter_csv_chunks(path, chunk_bytes=CHUNK_BYTES, follow=False, poll_interval=POLL_INTERVAL_SEC):
+    """
+    Yields (n, 3) arrays of [distance, fsr, time] from a CSV log, about
+    chunk_bytes of input at a time. In follow mode it yields None whenever
+    it is waiting for the writer.
+    """
+    with open(path, 'r', newline='') as src:
+        src.readline()  # Skip the header row
+        partial = ''
+        while True:
+            lines = src.readlines(chunk_bytes)
+            if not lines:
+                if not follow:
+                    return
+                yield None
+                time.sleep(poll_interval)
+                continue
+            lines[0] = partial + lines[0]
+            partial = ''
+            if follow and not lines[-1].endswith('\n'):
+                # The writer is mid-row; finish it on the next read
+                partial = lines.pop()
+                if not lines:
+                    continue
+            yield parse_rows(lines)
+
+
+def iter_bin_chunks(path, chunk_bytes=CHUNK_BYTES, follow=False, poll_interval=POLL_INTERVAL_SEC):
+    """Same as iter_csv_chunks for a binary record log (see binlog.py)."""
+    position = 0
+    while True:
+        # Re-mapped on every pass so records appended meanwhile become visible
+        records = binlog.open_log(path)
+        chunk_rows = max(1, chunk_bytes // records.dtype.itemsize)
+        if position >= len(records):
+            if not follow:
+                return
+            yield None
+            time.sleep(poll_interval)
+            continue
+        chunk = records[position:position + chunk_rows]
+        position += len(chunk)
+        yield np.column_stack([chunk[name].astype(np.float64) for name in records.dtype.names[:3]])
+
+
+def convert_log(input_file=INPUT_FILE, output_file=OUTPUT_FILE, chunk_bytes=CHUNK_BYTES,
+                nan_policy=NAN_POLICY, follow=False, poll_interval=POLL_INTERVAL_SEC):
+    """
+    Streams input_file through the calibration in chunks and writes
+    output_file; either may be CSV or a binary record log (.bin). With
+    follow=True it keeps waiting for rows appended by ESP32.py until
+    interrupted with Ctrl+C. Returns (rows written, seconds).
+    """
+    rows_in = 0
+    rows_out = 0
+    nan_rows = 0
+    last_distance = np.nan
+    start = time.perf_counter()
+    read_chunks = iter_bin_chunks if binlog.is_binlog(input_file) else iter_csv_chunks
+    if binlog.is_binlog(output_file):
+        dst = binlog.RecordWriter(output_file, binlog.FILTERED_DTYPE, csv_header=OUTPUT_HEADER.split(','),
+                                  metadata={'source': input_file, 'nan_policy': nan_policy,
+                                            'calibration': correction.calibration_version()})
+
+        def write(out):
+            dst.write(np.rec.fromarrays(out.T, dtype=binlog.FILTERED_DTYPE))
+    else:
+        dst = open(output_file, 'w', newline='')
+        dst.write(OUTPUT_HEADER + '\n')
+
+        def write(out):
+            dst.write(format_rows(out))
+    try:
+        for values in read_chunks(input_file, chunk_bytes, follow, poll_interval):
+            if values is None:
+                dst.flush()
+                continue
+            rows_in += len(values)
+            nan_rows += int(np.count_nonzero(np.isnan(values[:, 0])))
+            out, last_distance = convert_chunk(values, nan_policy, last_distance)
+            write(out)
+            rows_out += len(out)
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        dst.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"{rows_in} rows read ({nan_rows} with NaN distance, policy '{nan_policy}'), "
+          f"{rows_out} rows written to {output_file}")
+    return rows_out, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Apply the sensor calibration to an ESP32 log (CSV or .bin record log).")
+    parser.add_argument("input", nargs="?", default=INPUT_FILE)
+    parser.add_argument("output", nargs="?", default=OUTPUT_FILE)
+    parser.add_argument("--chunk-bytes", type=int, default=CHUNK_BYTES)
+    parser.add_argument("--nan", choices=("keep", "drop", "hold"), default=NAN_POLICY,
+                        help="handling of samples with a NaN distance")
+    parser.add_argument("-f", "--follow", action="store_true",
+                        help="keep converting rows appended to the input (Ctrl+C to stop)")
+    parser.add_argument("--calibration", type=correction.calibration_choice, metavar="VERSION|latest",
+                        help="apply a saved calibration (see calibration.py); default: the built-in tables")
+    args = parser.parse_args()
+    if not correction.select_calibration(args.calibration):
+        raise SystemExit(1)
+    rows, seconds = convert_log(args.input, args.output, args.chunk_bytes, args.nan, args.follow)
+    print(f"{rows / seconds if seconds > 0 else 0.0:.0f} rows/s")
@@ -0,0 +1,164 @@
+import numpy as np
+
+# --- Configuration ---
+# Constant-velocity Kalman filter on every axis sample coordinate.
+# PROCESS_NOISE is the spectral density of the (white) acceleration in
+# px^2/s^3: larger follows fast bending more closely, smaller smooths more.
+# MEASUREMENT_NOISE is the per-frame jitter of a raw sample in px.
+PROCESS_NOISE = 500.0
+MEASUREMENT_NOISE = 0.15
+
+# Gains of the fixed-gain alternative, mode "alpha-beta" (no covariance
+# update; alpha weighs the position, beta the velocity correction)
+ALPHA = 0.5
+BETA = 0.1
+
+# A measurement further than this many standard deviations (RMS over all
+# coordinates) from the prediction restarts the filter, e.g. after the
+# actuator was lost or moved by hand
+GATE_SIGMA = 8.0
+
+# Frames without a measurement before the filter is restarted
+MAX_COAST_FRAMES = 10
+
+# Frames kept for the noise floor estimate
+NOISE_WINDOW = 100
+
+
+class AxisFilter:
+    """
+    Streaming filter over the axis samples (n_points, 2) of one actuator,
+    in float pixels, with mode "kalman" or "alpha-beta". All coordinates
+    share one 2x2 covariance (they are measured together with the same
+    noise), so the cost per frame is one 2x2 update plus a few vector
+    operations, independent of history.
+    """
+
+    def __init__(self, mode="kalman", process_noise=PROCESS_NOISE, measurement_noise=MEASUREMENT_NOISE,
+                 alpha=ALPHA, beta=BETA, gate_sigma=GATE_SIGMA, max_coast=MAX_COAST_FRAMES,
+                 noise_window=NOISE_WINDOW):
+        if mode not in ("kalman", "alpha-beta"):
+            raise ValueError(f"Unknown filter mode {mode!r}")
+        self.mode = mode
+        self.q = process_noise
+        self.r = measurement_noise ** 2
+        self.alpha = alpha
+        self.beta = beta
+        self.gate_sigma = gate_sigma
+        self.max_coast = max_coast
+        self.noise_window = noise_window
+        self.restarts = 0
+        self.reset()
+
+    def reset(self):
+        self.position = None  # (n_points, 2)
+        self.velocity = None  # px/s
+        self.time = None
+        self.P = None
+        self.coasted = 0
+        self._raw = None
+        self._filtered = None
+        self._count = 0
+
+    @property
+    def initialized(self):
+        return self.position is not None
+
+    def _start(self, samples, t):
+        self.position = samples.copy()
+        self.velocity = np.zeros_like(samples)
+        self.time = t
+        self.P = np.array([[self.r, 0.0], [0.0, 1e4]])
+        self.coasted = 0
+        self._raw = np.zeros((self.noise_window,) + samples.shape)
+        self._filtered = np.zeros_like(self._raw)
+        self._count = 0
+
+    def _predict(self, t):
+        dt = max(t - self.time, 0.0)
+        position = self.position + self.velocity * dt
+        F = np.array([[1.0, dt], [0.0, 1.0]])
+        Q = self.q * np.array([[dt ** 3 / 3, dt ** 2 / 2], [dt ** 2 / 2, dt]])
+        return position, F @ self.P @ F.T + Q, dt
+
+    def predict(self, t):
+        """Predicted samples at time t (None before the first measurement)."""
+        if self.position is None:
+            return None
+        return self.position + self.velocity * max(t - self.time, 0.0)
+
+    def predicted_shift(self, t):
+        """Mean (dx, dy) the axis is expected to move between the last estimate and t."""
+        if self.position is None:
+            return np.zeros(2)
+        return self.velocity.mean(axis=0) * max(t - self.time, 0.0)
+
+    def update(self, samples, t):
+        """
+        Adds the measured samples at time t (seconds) and returns the
+        filtered samples. samples=None (actuator not found) advances the
+        prediction only.
+        """
+        if samples is None:
+            if self.position is None:
+                return None
+            self.coasted += 1
+            if self.coasted > self.max_coast:
+                self.reset()
+                return None
+            position, P, _ = self._predict(t)
+            self.position, self.P, self.time = position, P, t
+            return self.position
+
+        samples = np.asarray(samples, dtype=np.float64)
+        if self.position is None or self.position.shape != samples.shape:
+            self._start(samples, t)
+            self._store(samples, samples)
+            return self.position.copy()
+
+        position, P, dt = self._predict(t)
+        innovation = samples - position
+        if self.mode == "alpha-beta":
+            gain = np.array([self.alpha, self.beta / dt if dt > 0 else 0.0])
+            P = self.P
+        else:
+            S = P[0, 0] + self.r
+            if np.sqrt(np.mean(innovation ** 2)) > self.gate_sigma * np.sqrt(S):
+                self.restarts += 1
+                self._start(samples, t)
+                self._store(samples, samples)
+                return self.position.copy()
+            gain = P[:, 0] / S
+            P = P - np.outer(gain, P[0, :])
+        self.position = position + gain[0] * innovation
+        self.velocity = self.velocity + gain[1] * innovation
+        self.P = P
+        self.time = t
+        self.coasted = 0
+        self._store(samples, self.position)
+        return self.position.copy()
+
+    def _store(self, raw, filtered):
+        i = self._count % self.noise_window
+        self._raw[i] = raw
+        self._filtered[i] = filtered
+        self._count += 1
+
+    def noise_floor(self):
+        """
+        Jitter of the raw and filtered samples in px: the standard deviation
+        over the last noise_window frames, RMS over all coordinates. It is
+        the noise floor while the actuator is at rest (motion adds to it).
+        "model_px" is the filter's own estimate (posterior position std).
+        """
+        n = min(self._count, self.noise_window)
+        if n < 2:
+            return None
+        raw = self._raw[:n].std(axis=0)
+        filtered = self._filtered[:n].std(axis=0)
+        return {
+            "frames": n,
+            "raw_px": float(np.sqrt(np.mean(raw ** 2))),
+            "filtered_px": float(np.sqrt(np.mean(filtered ** 2))),
+            "model_px": float(np.sqrt(self.P[0, 0])) if self.mode == "kalman" else None,
+        }
@@ -0,0 +1,369 @@
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import bend
+import segmentation
+from centerline import find_centerline
+from deflection import axis_samples, deflection_summary
+
+# --- Configuration ---
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+BEND_ANGLES_DEG = [0, 15, 30, 60, 90]
+NOISE_SIGMAS = [0.0, 8.0]
+
+# Timed frames per case, after WARMUP untimed ones
+REPEATS = 50
+WARMUP = 5
+
+# Bend angle of the frames the stage timings are taken on
+TIMING_ANGLE_DEG = 30
+
+# Downscale factor of the coarse-to-fine variant
+COARSE_SCALE = 4
+
+# Actuator size relative to the frame height, and its BGR color / background
+ACTUATOR_LENGTH = 0.6
+ACTUATOR_THICKNESS = 0.06
+ACTUATOR_COLOR = (40, 200, 60)
+BACKGROUND_COLOR = (40, 40, 40)
+
+# --compare flags a regression when a p50 latency grows by more than this
+# fraction (and by at least LATENCY_MIN_DELTA_MS, so timer noise on the
+# microsecond stages does not count), or a deflection error by more than
+# ACCURACY_TOLERANCE_PX
+LATENCY_TOLERANCE = 0.25
+LATENCY_MIN_DELTA_MS = 0.05
+ACCURACY_TOLERANCE_PX = 0.5
+
+
+# --- Synthetic Frames ---
+
+def arc_centerline(length, bend_angle, num_points, base=(0.0, 0.0)):
+    """
+    Points evenly spaced by arc length along a constant-curvature arc that
+    starts at `base` heading straight down (+y) and turns towards +x by
+    bend_angle (radians) over `length` pixels. Returns (points, tangent
+    angles), shapes (num_points, 2) and (num_points,).
+    """
+    s = np.linspace(0.0, length, num_points)
+    phi = s * bend_angle / length
+    if abs(bend_angle) < 1e-9:
+        x, y = np.zeros_like(s), s
+    else:
+        r = length / bend_angle
+        x, y = r * (1 - np.cos(phi)), r * np.sin(phi)
+    return np.column_stack((x + base[0], y + base[1])), phi
+
+
+def render_actuator(width, height, bend_angle_deg, noise=0.0, num_points=bend.NUM_POINTS,
+                    length=ACTUATOR_LENGTH, thickness=ACTUATOR_THICKNESS, seed=0):
+    """
+    Frame of a green actuator bent into a constant-curvature arc, hanging
+    from the top of the frame, with Gaussian pixel noise of standard
+    deviation `noise`. length and thickness are fractions of the frame
+    height. The strip is drawn as a filled polygon with flat ends, so its
+    geometry (and ground truth) is exact up to anti-aliasing.
+
+    Returns (frame, truth) where truth holds the ground-truth "samples"
+    (num_points arc-length-spaced centerline points), "base", "tip" and
+    "bend_angle" (radians).
+    """
+    length_px = length * height
+    half = thickness * height / 2
+    base = (width / 2 - 0.2 * length_px * bend_angle_deg / 90, (height - length_px) / 2)
+    bend_angle = np.radians(bend_angle_deg)
+
+    outline, phi = arc_centerline(length_px, bend_angle, 200, base)
+    normal = np.column_stack((np.cos(phi), -np.sin(phi)))
+    polygon = np.concatenate((outline + half * normal, (outline - half * normal)[::-1]))
+
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = BACKGROUND_COLOR
+    # 4 fractional bits: vertices are placed to 1/16 px
+    cv2.fillPoly(frame, [np.round(polygon * 16).astype(np.int32)], ACTUATOR_COLOR, cv2.LINE_AA, shift=4)
+    if noise > 0:
+        rng = np.random.default_rng(seed)
+        noisy = frame + rng.normal(0.0, noise, frame.shape)
+        frame = np.clip(noisy, 0, 255).astype(np.uint8)
+
+    samples, _ = arc_centerline(length_px, bend_angle, num_points, base)
+    truth = {"samples": samples, "base": samples[0], "tip": samples[-1], "bend_angle": bend_angle}
+    return frame, truth
+
+
+# --- Timing ---
+
+def percentiles(times):
+    """Latency summary (ms) of per-call times in seconds."""
+    ms = np.asarray(times) * 1000.0
+    return {
+        "mean": float(ms.mean()),
+        "p50": float(np.percentile(ms, 50)),
+        "p95": float(np.percentile(ms, 95)),
+        "p99": float(np.percentile(ms, 99)),
+        "fps": float(1000.0 / ms.mean()) if ms.mean() > 0 else 0.0,
+    }
+
+
+def time_stages(frame, reference_samples, repeats=REPEATS, warmup=WARMUP, num_points=bend.NUM_POINTS):
+    """
+    Runs find_actuator_and_axis, get_points_on_axis and the deflection step
+    one stage at a time and returns {stage: latency summary}. The stages
+    repeat what bend.make_mask / find_actuator_and_axis do; the staged mask
+    is checked against make_mask so the two cannot drift apart unnoticed.
+    """
+    lower, upper, min_area = bend.lower_green, bend.upper_green, bend.MIN_CONTOUR_AREA
+    stages = ["cvtColor", "inRange", "erode", "dilate", "findContours", "select", "minAreaRect",
+              "axis", "sampling", "deflection", "detect (total)"]
+    times = {name: [] for name in stages}
+
+    for i in range(warmup + repeats):
+        t = [time.perf_counter()]
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        t.append(time.perf_counter())
+        mask = cv2.inRange(hsv, lower, upper)
+        t.append(time.perf_counter())
+        mask = cv2.erode(mask, None, iterations=1)
+        t.append(time.perf_counter())
+        mask = cv2.dilate(mask, None, iterations=2)
+        t.append(time.perf_counter())
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        t.append(time.perf_counter())
+        largest = max(contours, key=cv2.contourArea) if contours else None
+        if largest is None or cv2.contourArea(largest) < min_area:
+            raise RuntimeError("synthetic actuator not detected; check ACTUATOR_COLOR against the HSV range")
+        t.append(time.perf_counter())
+        rect = cv2.minAreaRect(largest)
+        t.append(time.perf_counter())
+        endpoints = bend.axis_from_rect(rect, subpixel=bend.SUBPIXEL_AXIS)
+        t.append(time.perf_counter())
+        # As bend.measure_detection: float samples plus the int points for drawing
+        samples = axis_samples(endpoints, num_points)
+        points = [tuple(pt) for pt in samples.astype(int).tolist()]
+        t.append(time.perf_counter())
+        deflection_summary(samples, reference_samples)
+        t.append(time.perf_counter())
+        if i < warmup:
+            continue
+        for name, t0, t1 in zip(stages, t, t[1:]):
+            times[name].append(t1 - t0)
+        times["detect (total)"].append(t[6] - t[0])
+
+    if not np.array_equal(mask, bend.make_mask(frame, lower, upper)):
+        raise RuntimeError("staged mask differs from bend.make_mask; update time_stages")
+    return {name: percentiles(values) for name, values in times.items()}
+
+
+def time_end_to_end(frame, reference, repeats=REPEATS, warmup=WARMUP):
+    """
+    Latency of bend.process_frame per axis mode, with ROI tracking, with
+    coarse-to-fine search on every frame and with LUT segmentation.
+    """
+    variants = {
+        "process_frame rect": dict(axis_mode="rect"),
+        "process_frame rect+roi": dict(axis_mode="rect", roi=True),
+        f"process_frame rect coarse/{COARSE_SCALE}": dict(axis_mode="rect", coarse=COARSE_SCALE),
+        "process_frame rect lut": dict(axis_mode="rect", segmentation="lut"),
+        "process_frame centerline": dict(axis_mode="centerline"),
+    }
+    results = {}
+    method = segmentation.METHOD
+    for name, options in variants.items():
+        tracker = None
+        if options.get("roi") or options.get("coarse"):
+            tracker = bend.RoiTracker(bend.lower_green, bend.upper_green, bend.MIN_CONTOUR_AREA,
+                                      coarse_scale=options.get("coarse", 1), track=options.get("roi", False))
+        segmentation.METHOD = options.get("segmentation", "hsv")
+        times = []
+        try:
+            for i in range(warmup + repeats):
+                t0 = time.perf_counter()
+                bend.process_frame(frame, reference, tracker=tracker, axis_mode=options["axis_mode"])
+                if i >= warmup:
+                    times.append(time.perf_counter() - t0)
+        finally:
+            segmentation.METHOD = method
+        results[name] = percentiles(times)
+    return results
+
+
+def check_fast_paths(width, height, angles, noise):
+    """
+    Checks that the LUT mask equals the HSV mask and that coarse-to-fine
+    detection returns the same endpoints as the full-resolution search, on
+    every bend angle. Returns {"lut_mask": bool, "coarse_endpoints": bool}.
+    """
+    lut_ok = coarse_ok = True
+    for angle in angles:
+        frame, _ = render_actuator(width, height, angle, noise, seed=angle + 1)
+        hsv_mask = segmentation.color_mask(frame, bend.lower_green, bend.upper_green, "hsv")
+        lut_mask = segmentation.color_mask(frame, bend.lower_green, bend.upper_green, "lut")
+        lut_ok &= bool(np.array_equal(hsv_mask, lut_mask))
+        full = bend.find_actuator_and_axis(frame, bend.lower_green, bend.upper_green, bend.MIN_CONTOUR_AREA)
+        tracker = bend.RoiTracker(bend.lower_green, bend.upper_green, bend.MIN_CONTOUR_AREA,
+                                  coarse_scale=COARSE_SCALE, track=False)
+        coarse = tracker.find(frame)
+        coarse_ok &= bool(np.array_equal(full[2], coarse[2]) and tracker.full_searches == 0)
+    return {"lut_mask": lut_ok, "coarse_endpoints": coarse_ok}
+
+
+# --- Accuracy ---
+
+def measure(frame, axis_mode, num_points=bend.NUM_POINTS):
+    """Measured axis samples of one frame (None if the actuator is not found)."""
+    contour, rect, endpoints = bend.find_actuator_and_axis(
+        frame, bend.lower_green, bend.upper_green, bend.MIN_CONTOUR_AREA)
+    if contour is None:
+        return None
+    if axis_mode == "centerline":
+        line = find_centerline(contour, num_points)
+        return None if line is None else line["points"]
+    if bend.SUBPIXEL_AXIS:
+        endpoints = bend.axis_from_rect(rect, subpixel=True)
+    return axis_samples(endpoints, num_points)
+
+
+def check_accuracy(width, height, angles, noise, num_points=bend.NUM_POINTS):
+    """
+    Measured deflection (each axis mode, against the measured straight
+    frame as reference) versus the ground truth (true bent centerline
+    against the true straight one). Returns {mode: {angle: errors}} with
+    the absolute tip and mean deflection errors in pixels.
+    """
+    straight, straight_truth = render_actuator(width, height, 0, noise, num_points)
+    results = {}
+    for mode in ("rect", "centerline"):
+        reference = measure(straight, mode, num_points)
+        results[mode] = {}
+        for angle in angles:
+            frame, truth = render_actuator(width, height, angle, noise, num_points, seed=angle + 1)
+            expected = deflection_summary(truth["samples"], straight_truth["samples"])
+            samples = measure(frame, mode, num_points)
+            if samples is None or reference is None:
+                results[mode][str(angle)] = {"tip_error": None, "mean_error": None}
+                continue
+            measured = deflection_summary(samples, reference)
+            results[mode][str(angle)] = {
+                "tip_truth": float(expected["tip"]),
+                "tip_error": float(abs(measured["tip"] - expected["tip"])),
+                "mean_error": float(np.mean(np.abs(measured["displacements"] - expected["displacements"]))),
+            }
+    return results
+
+
+# --- Report ---
+
+def run(resolutions=RESOLUTIONS, angles=BEND_ANGLES_DEG, noises=NOISE_SIGMAS, repeats=REPEATS,
+        num_points=bend.NUM_POINTS):
+    """Runs every case, prints the report and returns the results as a dict."""
+    report = {"cv2": cv2.__version__, "num_points": num_points, "cases": {}}
+    t0 = time.perf_counter()
+    segmentation.color_lut(bend.lower_green, bend.upper_green)
+    report["lut_build_ms"] = (time.perf_counter() - t0) * 1000.0
+    print(f"LUT build (first use, includes HSV of all colors): {report['lut_build_ms']:.0f} ms")
+    for width, height in resolutions:
+        for noise in noises:
+            case = f"{width}x{height} noise {noise:g}"
+            straight, _ = render_actuator(width, height, 0, noise, num_points)
+            frame, _ = render_actuator(width, height, TIMING_ANGLE_DEG, noise, num_points, seed=1)
+            reference = bend.Reference()
+            reference.set(bend.find_actuator_and_axis(
+                straight, bend.lower_green, bend.upper_green, bend.MIN_CONTOUR_AREA)[2], num_points)
+
+            timing = time_stages(frame, reference.get()[2], repeats, num_points=num_points)
+            timing.update(time_end_to_end(frame, reference, repeats))
+            accuracy = check_accuracy(width, height, angles, noise, num_points)
+            validation = check_fast_paths(width, height, angles, noise)
+            report["cases"][case] = {"timing": timing, "accuracy": accuracy, "validation": validation}
+
+            print(f"\n{case} (timing at {TIMING_ANGLE_DEG} deg, {repeats} frames)")
+            print(f"  {'stage':26s} {'mean':>7s} {'p50':>7s} {'p95':>7s} {'p99':>7s} {'FPS':>8s}")
+            for name, s in timing.items():
+                print(f"  {name:26s} {s['mean']:7.3f} {s['p50']:7.3f} {s['p95']:7.3f} {s['p99']:7.3f} {s['fps']:8.0f}")
+            print(f"  {'bend deg':26s} " + " ".join(f"{a:>7}" for a in angles))
+            truth = accuracy["rect"]
+            print(f"  {'true tip defl px':26s} " + " ".join(
+                f"{truth[str(a)].get('tip_truth', np.nan):7.1f}" for a in angles))
+            for mode, errors in accuracy.items():
+                for key, label in (("tip_error", "tip err px"), ("mean_error", "mean err px")):
+                    values = [errors[str(a)][key] for a in angles]
+                    print(f"  {mode + ' ' + label:26s} " + " ".join(
+                        f"{'lost':>7s}" if v is None else f"{v:7.2f}" for v in values))
+            print(f"  LUT mask identical to HSV: {validation['lut_mask']}, "
+                  f"coarse-to-fine endpoints identical: {validation['coarse_endpoints']}")
+    return report
+
+
+def compare(report, baseline, latency_tolerance=LATENCY_TOLERANCE, accuracy_tolerance=ACCURACY_TOLERANCE_PX):
+    """Returns the list of regressions of `report` against a saved `baseline`."""
+    regressions = []
+    for case, old in baseline["cases"].items():
+        new = report["cases"].get(case)
+        if new is None:
+            continue
+        for check, ok in new.get("validation", {}).items():
+            if not ok:
+                regressions.append(f"{case}: {check} no longer identical")
+        for stage, old_stats in old["timing"].items():
+            new_stats = new["timing"].get(stage)
+            if (new_stats and new_stats["p50"] > old_stats["p50"] * (1 + latency_tolerance)
+                    and new_stats["p50"] - old_stats["p50"] >= LATENCY_MIN_DELTA_MS):
+                regressions.append(f"{case} {stage}: p50 {old_stats['p50']:.3f} -> {new_stats['p50']:.3f} ms")
+        for mode, angles in old["accuracy"].items():
+            for angle, old_err in angles.items():
+                new_err = new["accuracy"].get(mode, {}).get(angle)
+                if new_err is None:
+                    continue
+                for key in ("tip_error", "mean_error"):
+                    if old_err[key] is None:
+                        continue
+                    if new_err[key] is None:
+                        regressions.append(f"{case} {mode} {angle} deg: actuator lost")
+                    elif new_err[key] > old_err[key] + accuracy_tolerance:
+                        regressions.append(f"{case} {mode} {angle} deg {key}: "
+                                           f"{old_err[key]:.2f} -> {new_err[key]:.2f} px")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the bend.py vision stages on synthetic actuator frames (speed and accuracy).")
+    parser.add_argument("--resolutions", nargs="+", default=[f"{w}x{h}" for w, h in RESOLUTIONS],
+                        help="e.g. 640x480 1920x1080")
+    parser.add_argument("--angles", type=float, nargs="+", default=BEND_ANGLES_DEG, help="bend angles in degrees")
+    parser.add_argument("--noise", type=float, nargs="+", default=NOISE_SIGMAS, help="pixel noise sigmas")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("-n", "--num-points", type=int, default=bend.NUM_POINTS)
+    parser.add_argument("--save", metavar="JSON", help="write the results (e.g. as a new baseline)")
+    parser.add_argument("--compare", metavar="JSON", help="baseline to check for regressions (exit code 1)")
+    parser.add_argument("--tolerance", type=float, default=LATENCY_TOLERANCE,
+                        help="allowed relative p50 latency increase")
+    args = parser.parse_args()
+
+    resolutions = [tuple(int(v) for v in r.lower().split("x")) for r in args.resolutions]
+    angles = [int(a) if float(a).is_integer() else a for a in args.angles]
+    report = run(resolutions, angles, args.noise, args.repeats, args.num_points)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(report, file, indent=1)
+        print(f"\nResults written to {args.save}")
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,18 @@
+import argparse
 import cv2
 import numpy as np
+import threading
 import time
 import math
 
+from centerline import find_centerline
+from axis_filter import AxisFilter
+from deflection import axis_samples, deflection_summary
+from metrics import METRICS_FILE, Metrics, MetricsOverlay, MetricsServer, MetricsWriter
+from pipeline import FrameGrabber, ProcessingStage
+from recording import Recorder, ReplaySource
+import segmentation
+
 # --- Configuration ---
 # Replace with your IP camera's stream URL (RTSP, HTTP, etc.)
 # Examples:
@@ -16,33 +26,80 @@ ip_camera_url = "http://192.168.50.118:8080/video" # Use 0 for default webcam, r
 # Format: [Hue, Saturation, Value]
 lower_green = np.array([41, 99, 102])  # Example lower bound
 upper_green = np.array([179, 255, 255]) # Example upper bound
+# Bounds saved by hsv_tuner.py (segmentation.HSV_CONFIG_FILE) replace these
+lower_green, upper_green = segmentation.load_bounds(lower_green, upper_green)
 
 # Number of points to track along the neutral axis
 NUM_POINTS = 10
 
+# How the neutral axis is measured:
+#   "rect"       straight line between the short-side midpoints of the minAreaRect
+#   "centerline" skeleton + spline of the actual (curved) actuator, with curvature
+AXIS_MODE = "rect"
+
+# At most this many per-point displacement labels are drawn on the overlay
+# (every k-th point), so a large NUM_POINTS stays readable and cheap to draw
+MAX_POINT_LABELS = 10
+
 # Minimum contour area to filter out noise
 MIN_CONTOUR_AREA = 500
 
-# --- Global Variables ---
-reference_points = None
-reference_axis_endpoints = None
-is_reference_set = False
+# Seconds between pipeline stats printouts (frames dropped, latency, FPS)
+STATS_INTERVAL = 5.0
+
+# ROI tracking: search only around the last detected rectangle instead of
+# the whole frame. The margin is a fraction of the rectangle size added on
+# every side (plus ROI_MIN_MARGIN pixels) so the actuator can move/bend.
+ROI_TRACKING = True
+ROI_MARGIN = 0.25
+ROI_MIN_MARGIN = 20
+
+# Sub-pixel axis: sample the axis between the float short-side midpoints of
+# the rectangle instead of the integer-truncated endpoints
+SUBPIXEL_AXIS = True
+
+# Temporal filter over the axis samples (see axis_filter.py): "none",
+# "kalman" or "alpha-beta". With ROI tracking, the predicted motion also
+# places the next search region, with only ROI_PREDICTION_MARGIN pixels
+# around the shifted rectangle.
+AXIS_FILTER = "none"
+ROI_PREDICTION_MARGIN = 15
+
+# Coarse-to-fine: when the ROI tracker has no region yet (first frame,
+# actuator lost), it first searches a copy of the frame downscaled by this
+# factor and then only the area around the hit at full resolution, so the
+# endpoints are still measured at full resolution. 1 = off.
+# COARSE_MARGIN is the margin around the coarse hit, in downscaled pixels.
+COARSE_SCALE = 1
+COARSE_MARGIN = 3
 
 # --- Helper Functions ---
 
-def find_actuator_and_axis(frame, lower_color, upper_color, min_area):
+def find_actuator_and_axis(frame, lower_color, upper_color, min_area, roi=None, metrics=None):
     """
     Finds the largest green contour, calculates its minimum area rectangle,
     and determines the endpoints of its neutral axis (centerline).
-    """
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-    mask = cv2.inRange(hsv, lower_color, upper_color)
-
-    # Optional: Morphological operations to clean up mask
-    mask = cv2.erode(mask, None, iterations=1)
-    mask = cv2.dilate(mask, None, iterations=2)
 
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    If roi = (x, y, w, h) is given, only that crop of the frame is searched;
+    the returned contour, rect and endpoints are still in full-frame
+    coordinates. If `metrics` is given (see metrics.py), the mask, contour
+    and axis steps are timed into it.
+    """
+    if metrics is not None:
+        t = time.perf_counter()
+    offset = (0, 0)
+    if roi is not None:
+        x, y, w, h = roi
+        frame = frame[y:y + h, x:x + w]
+        offset = (x, y)
+
+    mask = make_mask(frame, lower_color, upper_color)
+    if metrics is not None:
+        t = metrics.lap("mask", t)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
+    if metrics is not None:
+        t = metrics.lap("contours", t)
 
     if not contours:
         return None, None, None # No contours found
@@ -56,9 +113,52 @@ def find_actuator_and_axis(frame, lower_color, upper_color, min_area):
     # Get the minimum area rectangle bounding the contour
     # rect = ((center_x, center_y), (width, height), angle)
     rect = cv2.minAreaRect(largest_contour)
-    box = cv2.boxPoints(rect) # Get the 4 corners of the rectangle
-    box = box.astype(np.int32) # Get the 4 corners of the rectangle (as integers)
-# Or alternatively: box = box.astype(int)
+    axis_endpoints = axis_from_rect(rect)
+    if metrics is not None:
+        metrics.lap("axis", t)
+
+    return largest_contour, rect, axis_endpoints
+
+
+def find_actuators(frame, lower_color, upper_color, min_area):
+    """
+    Like find_actuator_and_axis, but for every contour of at least
+    min_area instead of only the largest. Returns a list of
+    (contour, rect, axis endpoints), ordered left to right.
+    """
+    mask = make_mask(frame, lower_color, upper_color)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    detections = []
+    for contour in contours:
+        if cv2.contourArea(contour) < min_area:
+            continue
+        rect = cv2.minAreaRect(contour)
+        detections.append((contour, rect, axis_from_rect(rect)))
+    detections.sort(key=lambda d: d[1][0])
+    return detections
+
+
+def make_mask(frame, lower_color, upper_color):
+    """
+    Binary mask of the pixels within the HSV color range (computed as set
+    by segmentation.METHOD), cleaned up with an erode/dilate pass.
+    """
+    mask = segmentation.color_mask(frame, lower_color, upper_color)
+
+    # Optional: Morphological operations to clean up mask
+    mask = cv2.erode(mask, None, iterations=1)
+    mask = cv2.dilate(mask, None, iterations=2)
+    return mask
+
+
+def axis_from_rect(rect, subpixel=False):
+    """
+    Endpoints of the neutral axis of a minAreaRect: the midpoints of its
+    shorter sides, ordered so the first has the smaller y. Integer pixel
+    tuples (for drawing), or floats with subpixel=True.
+    """
+    box = cv2.boxPoints(rect) # Get the 4 corners of the rectangle (floats,
+    # so the midpoints keep their sub-pixel part; cast only for drawing)
 
     # Calculate neutral axis endpoints (midpoints of the shorter sides)
     center, (w, h), angle = rect
@@ -89,6 +189,8 @@ def find_actuator_and_axis(frame, lower_color, upper_color, min_area):
     # Let's assume the actuator bends primarily horizontally, so check y-coords
     if mid1[1] > mid2[1]: # If mid1 is lower than mid2, swap them
          mid1, mid2 = mid2, mid1
+    if subpixel:
+        return tuple(mid1.tolist()), tuple(mid2.tolist())
 
     endpoint1 = tuple(mid1.astype(np.int32))
     endpoint2 = tuple(mid2.astype(np.int32))
@@ -101,104 +203,309 @@ def find_actuator_and_axis(frame, lower_color, upper_color, min_area):
     if endpoint1[1] > endpoint2[1]:
          endpoint1, endpoint2 = endpoint2, endpoint1
 
+    return endpoint1, endpoint2
 
-    return largest_contour, rect, (endpoint1, endpoint2)
+
+class RoiTracker:
+    """
+    Keeps the last detected rectangle plus a margin as the region of
+    interest and runs find_actuator_and_axis on that crop only. Falls back
+    to a full-frame search when the actuator is lost or its contour touches
+    the edge of the crop (it may extend beyond it).
+
+    With coarse_scale > 1 a missing region is first looked for on a
+    downscaled copy of the frame (coarse-to-fine). With track=False the
+    region is not carried over to the next frame, which leaves only the
+    coarse-to-fine search.
+    """
+
+    def __init__(self, lower_color, upper_color, min_area,
+                 margin=ROI_MARGIN, min_margin=ROI_MIN_MARGIN, coarse_scale=COARSE_SCALE, track=True):
+        self.lower_color = lower_color
+        self.upper_color = upper_color
+        self.min_area = min_area
+        self.margin = margin
+        self.min_margin = min_margin
+        self.coarse_scale = coarse_scale
+        self.track = track
+        self.roi = None
+        self.roi_hits = 0
+        self.full_searches = 0
+        self.coarse_searches = 0
+        self._box = None
+
+    def reset(self):
+        self.roi = None
+        self._box = None
+
+    def seed(self, shift, frame_w, frame_h, margin=ROI_PREDICTION_MARGIN):
+        """
+        Replaces the next search region by the last detected rectangle moved
+        by the predicted `shift` (dx, dy), e.g. from an AxisFilter, plus only
+        `margin` pixels instead of the usual fraction of its size.
+        """
+        if self._box is not None and self.track:
+            self.roi = self._roi_from_box(self._box + np.asarray(shift, dtype=np.float32),
+                                          frame_w, frame_h, 0.0, margin)
+
+    def find(self, frame, metrics=None):
+        """Same return value as find_actuator_and_axis."""
+        frame_h, frame_w = frame.shape[:2]
+        if self.roi is None and self.coarse_scale > 1:
+            self.roi = self._coarse_roi(frame, frame_w, frame_h)
+        if self.roi is not None:
+            result = find_actuator_and_axis(frame, self.lower_color, self.upper_color,
+                                            self.min_area, roi=self.roi, metrics=metrics)
+            if result[0] is not None and not self._touches_crop_edge(result[0], frame_w, frame_h):
+                self.roi_hits += 1
+                self.roi = self._roi_from_rect(result[1], frame_w, frame_h) if self.track else None
+                self._box = cv2.boxPoints(result[1])
+                return result
+
+        self.full_searches += 1
+        result = find_actuator_and_axis(frame, self.lower_color, self.upper_color, self.min_area,
+                                        metrics=metrics)
+        if result[0] is None or not self.track:
+            self.roi = None
+            self._box = None
+        else:
+            self.roi = self._roi_from_rect(result[1], frame_w, frame_h)
+            self._box = cv2.boxPoints(result[1])
+        return result
+
+    def _coarse_roi(self, frame, frame_w, frame_h):
+        """Region around the actuator found on the downscaled frame (None if not found)."""
+        self.coarse_searches += 1
+        small_w, small_h = max(frame_w // self.coarse_scale, 1), max(frame_h // self.coarse_scale, 1)
+        small = cv2.resize(frame, (small_w, small_h), interpolation=cv2.INTER_AREA)
+        contour, rect, _ = find_actuator_and_axis(small, self.lower_color, self.upper_color,
+                                                  self.min_area / self.coarse_scale ** 2)
+        if contour is None:
+            return None
+        box = cv2.boxPoints(rect) * (frame_w / small_w, frame_h / small_h)
+        # Same frame, so the margin only has to cover the coarse position error
+        return self._roi_from_box(box, frame_w, frame_h, 0.0, COARSE_MARGIN * self.coarse_scale)
+
+    def _roi_from_rect(self, rect, frame_w, frame_h):
+        return self._roi_from_box(cv2.boxPoints(rect), frame_w, frame_h, self.margin, self.min_margin)
+
+    def _roi_from_box(self, box, frame_w, frame_h, margin, min_margin):
+        x, y, w, h = cv2.boundingRect(box.astype(np.int32))
+        mx = max(int(w * margin), min_margin)
+        my = max(int(h * margin), min_margin)
+        x0, y0 = max(x - mx, 0), max(y - my, 0)
+        x1, y1 = min(x + w + mx, frame_w), min(y + h + my, frame_h)
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def _touches_crop_edge(self, contour, frame_w, frame_h):
+        # Only crop edges inside the frame count; the frame border is a hard limit anyway
+        rx, ry, rw, rh = self.roi
+        cx, cy, cw, ch = cv2.boundingRect(contour)
+        return ((rx > 0 and cx <= rx) or
+                (ry > 0 and cy <= ry) or
+                (rx + rw < frame_w and cx + cw >= rx + rw) or
+                (ry + rh < frame_h and cy + ch >= ry + rh))
 
 
 def get_points_on_axis(endpoints, num_points):
     """
     Linearly interpolates points along the line segment defined by endpoints.
+    Returns integer (x, y) tuples for drawing; use deflection.axis_samples
+    for the float coordinates.
     """
-    pt1, pt2 = np.array(endpoints[0]), np.array(endpoints[1])
-    if num_points < 2:
-        return [tuple(((pt1 + pt2) / 2).astype(int))]
-    points = [tuple(pt1.astype(int))] # Include start point
-    for i in range(1, num_points):
-        fraction = i / (num_points -1) # Correct interpolation factor
-        interpolated_point = pt1 + fraction * (pt2 - pt1)
-        points.append(tuple(interpolated_point.astype(int)))
-    # points = [tuple((pt1 + (pt2 - pt1) * i / (num_points - 1)).astype(int)) for i in range(num_points)]
-    return points
+    return [tuple(pt) for pt in axis_samples(endpoints, num_points).astype(int).tolist()]
 
-# --- Main Loop ---
+class Reference:
+    """
+    Reference (undeflected) axis shared between the processing stage and
+    the key handler of the display stage.
+    """
 
-cap = cv2.VideoCapture(ip_camera_url)
-
-if not cap.isOpened():
-    print(f"Error: Could not open video stream at {ip_camera_url}")
-    exit()
-
-print("Video stream opened successfully.")
-print("Press 's' to set the current frame as the reference (undeflected) state.")
-print("Press 'r' to reset the reference state.")
-print("Press 'q' to quit.")
-
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        print("Error: Failed to grab frame or stream ended.")
-        # Optional: Attempt to reconnect
-        # cap.release()
-        # time.sleep(5)
-        # cap = cv2.VideoCapture(ip_camera_url)
-        # if not cap.isOpened():
-        #    print("Reconnect failed. Exiting.")
-        #    break
-        # continue
-        break # Exit if frame grab fails
-
-    # --- Find Actuator and Current Axis ---
-    contour, rect, current_axis_endpoints = find_actuator_and_axis(
-        frame, lower_green, upper_green, MIN_CONTOUR_AREA
-    )
-
-    display_frame = frame.copy() # Draw on a copy
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.axis_endpoints = None
+        self.points = None
+        self.samples = None
+
+    @property
+    def is_set(self):
+        return self.points is not None
+
+    def set(self, axis_endpoints, num_points, samples=None):
+        """Sets the reference axis; `samples` overrides the straight-line points."""
+        if samples is None:
+            samples = axis_samples(axis_endpoints, num_points)
+        with self._lock:
+            self.axis_endpoints = axis_endpoints
+            self.points = [tuple(pt) for pt in samples.astype(int).tolist()]
+            self.samples = samples
+
+    def reset(self):
+        with self._lock:
+            self.axis_endpoints = None
+            self.points = None
+            self.samples = None
+
+    def get(self):
+        """Returns (axis_endpoints, int points for drawing, float samples)."""
+        with self._lock:
+            return self.axis_endpoints, self.points, self.samples
+
+
+def process_frame(frame, reference, lower_color=lower_green, upper_color=upper_green,
+                  num_points=NUM_POINTS, min_area=MIN_CONTOUR_AREA, tracker=None,
+                  axis_mode=AXIS_MODE, metrics=None):
+    """
+    Runs detection on one frame (through `tracker` if given, see
+    RoiTracker) and, if a reference is set, the displacement of every axis
+    point. In "centerline" axis mode the points follow the skeleton of the
+    actuator and the curvature/bend angle are added. Returns a dict with
+    the results. `metrics` (see metrics.py), if given, gets the time of
+    every step.
+    """
+    if tracker is not None:
+        contour, rect, current_axis_endpoints = tracker.find(frame, metrics)
+    else:
+        contour, rect, current_axis_endpoints = find_actuator_and_axis(
+            frame, lower_color, upper_color, min_area, metrics=metrics
+        )
+    return measure_detection(frame, contour, rect, current_axis_endpoints, reference,
+                             num_points, axis_mode, metrics)
+
+
+def measure_detection(frame, contour, rect, current_axis_endpoints, reference,
+                      num_points=NUM_POINTS, axis_mode=AXIS_MODE, metrics=None):
+    """
+    The measuring half of process_frame for one detected actuator (contour
+    None: not found). Returns the same result dict.
+    """
+    result = {
+        "frame": frame,
+        "contour": contour,
+        "rect": rect,
+        "axis_endpoints": current_axis_endpoints,
+        "points": None,
+        "samples": None,
+        "displacements": None,
+        "avg_deflection": None,
+        "max_deflection": None,
+        "tip_deflection": None,
+        "curvature": None,
+        "bend_angle": None,
+    }
+    if contour is None:
+        return result
+
+    if metrics is not None:
+        t = time.perf_counter()
+    if axis_mode == "centerline":
+        line = find_centerline(contour, num_points)
+        if line is None:
+            result["contour"] = None
+            return result
+        samples = line["points"]
+        result["axis_endpoints"] = (tuple(samples[0].astype(int).tolist()), tuple(samples[-1].astype(int).tolist()))
+        result["curvature"] = line["curvature"]
+        result["bend_angle"] = line["bend_angle"]
+    elif SUBPIXEL_AXIS:
+        samples = axis_samples(axis_from_rect(rect, subpixel=True), num_points)
+    else:
+        samples = axis_samples(current_axis_endpoints, num_points)
+    result["samples"] = samples
+    result["points"] = [tuple(pt) for pt in samples.astype(int).tolist()]
+    if metrics is not None:
+        t = metrics.lap(axis_mode if axis_mode == "centerline" else "sampling", t)
+
+    _, _, reference_samples = reference.get()
+    if reference_samples is not None and len(samples) == len(reference_samples):
+        summary = deflection_summary(samples, reference_samples)
+        result["displacements"] = summary["displacements"]
+        result["avg_deflection"] = float(summary["average"])
+        result["max_deflection"] = float(summary["max"])
+        result["tip_deflection"] = float(summary["tip"])
+        if metrics is not None:
+            metrics.lap("deflection", t)
+    return result
+
+
+def filter_result(result, axis_filter, reference, t):
+    """
+    Runs the measured axis samples of a process_frame result at time t
+    through `axis_filter` (see axis_filter.py) and recomputes the
+    deflection from the filtered samples. The unfiltered samples are kept
+    as result["raw_samples"].
+    """
+    samples = axis_filter.update(result["samples"] if result["contour"] is not None else None, t)
+    if result["contour"] is None or samples is None:
+        return result
+    result["raw_samples"] = result["samples"]
+    result["samples"] = samples
+    result["points"] = [tuple(pt) for pt in samples.astype(int).tolist()]
+    _, _, reference_samples = reference.get()
+    if reference_samples is not None and len(samples) == len(reference_samples):
+        summary = deflection_summary(samples, reference_samples)
+        result["displacements"] = summary["displacements"]
+        result["avg_deflection"] = float(summary["average"])
+        result["max_deflection"] = float(summary["max"])
+        result["tip_deflection"] = float(summary["tip"])
+    return result
+
+
+def print_noise_floor(axis_filter):
+    floor = axis_filter.noise_floor()
+    if floor is not None:
+        model = f", model {floor['model_px']:.3f} px" if floor["model_px"] is not None else ""
+        print(f"Axis noise floor over {floor['frames']} frames: raw {floor['raw_px']:.3f} px, "
+              f"filtered {floor['filtered_px']:.3f} px{model} ({axis_filter.restarts} filter restarts)")
+
+
+def draw_overlay(result, reference):
+    """
+    Draws contour, box, axis, points and deflection values for one
+    processed frame. Returns the annotated copy of the frame.
+    """
+    display_frame = result["frame"].copy() # Draw on a copy
+    contour = result["contour"]
+    reference_axis_endpoints, reference_points, _ = reference.get()
 
     if contour is not None:
+        current_axis_endpoints = result["axis_endpoints"]
+        current_points = result["points"]
+
         # Draw the contour and bounding box
         cv2.drawContours(display_frame, [contour], -1, (0, 255, 0), 1)
-        box = cv2.boxPoints(rect)
+        box = cv2.boxPoints(result["rect"])
         box = box.astype(np.int32)
-# Or alternatively: box = box.astype(int)
         cv2.drawContours(display_frame, [box], 0, (255, 0, 0), 1)
 
         # Draw the current neutral axis
-        cv2.line(display_frame, current_axis_endpoints[0], current_axis_endpoints[1], (0, 0, 255), 2) # Red line for current axis
-
-        # Calculate current points
-        current_points = get_points_on_axis(current_axis_endpoints, NUM_POINTS)
+        if result["curvature"] is not None:
+            cv2.polylines(display_frame, [np.array(current_points, dtype=np.int32)], False, (0, 0, 255), 2)
+            cv2.putText(display_frame, f"Tip angle: {math.degrees(result['bend_angle'][-1]):.1f} deg", (10, 70),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        else:
+            cv2.line(display_frame, current_axis_endpoints[0], current_axis_endpoints[1], (0, 0, 255), 2) # Red line for current axis
 
         # Draw current points
-        for pt in current_points:
+        label_step = max(1, len(current_points) // MAX_POINT_LABELS)
+        for pt in current_points[::label_step]:
             cv2.circle(display_frame, pt, 4, (255, 255, 0), -1) # Cyan circles
 
-        # --- Displacement Calculation (if reference is set) ---
-        if is_reference_set:
-            if len(current_points) == len(reference_points):
-                total_deflection = 0
-                for i in range(NUM_POINTS):
-                    ref_pt = np.array(reference_points[i])
-                    curr_pt = np.array(current_points[i])
-                    # Calculate Euclidean distance
-                    displacement = np.linalg.norm(curr_pt - ref_pt)
-                    total_deflection += displacement
-
-                    # Draw line connecting reference point (visualized) to current point
-                    # For visualization, draw reference points slightly offset or in a fixed position if needed
-                    # Here, just draw line from calculated current point back towards where reference *was*
-                    # A better viz might draw the original axis faintly
-                    # Draw line from reference to current
-                    cv2.line(display_frame, reference_points[i], current_points[i], (255, 255, 255), 1)
-                    # Display displacement value near the current point
-                    cv2.putText(display_frame, f"{displacement:.1f}",
-                                (current_points[i][0] + 10, current_points[i][1]),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
-
-                # Display average or total deflection (optional)
-                avg_deflection = total_deflection / NUM_POINTS
-                cv2.putText(display_frame, f"Avg Defl: {avg_deflection:.1f} px", (10, 50),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-
+        # --- Displacement (if reference is set) ---
+        if result["displacements"] is not None and reference_points is not None:
+            for i in range(0, len(current_points), label_step):
+                # Draw line from reference to current
+                cv2.line(display_frame, reference_points[i], current_points[i], (255, 255, 255), 1)
+                # Display displacement value near the current point
+                cv2.putText(display_frame, f"{result['displacements'][i]:.1f}",
+                            (current_points[i][0] + 10, current_points[i][1]),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+
+            cv2.putText(display_frame, f"Avg Defl: {result['avg_deflection']:.1f} px  "
+                                       f"Max: {result['max_deflection']:.1f}  Tip: {result['tip_deflection']:.1f}",
+                        (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+
+        if reference_axis_endpoints is not None:
             # Draw the reference axis faintly for comparison
             cv2.line(display_frame, reference_axis_endpoints[0], reference_axis_endpoints[1], (0, 255, 255, 100), 1) # Faint yellow
 
@@ -207,37 +514,213 @@ while True:
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
     # --- Display Instructions ---
-    if not is_reference_set:
+    if not reference.is_set:
         cv2.putText(display_frame, "Press 's' to set reference", (10, 30),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
     else:
-         cv2.putText(display_frame, "Reference SET. Press 'r' to reset.", (10, 30),
+        cv2.putText(display_frame, "Reference SET. Press 'r' to reset.", (10, 30),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    return display_frame
 
 
-    # --- Show the frame ---
-    cv2.imshow("Actuator Deflection Analysis", display_frame)
+def print_stats(stages):
+    for stats in stages:
+        print(stats.summary())
 
-    # --- Handle User Input ---
-    key = cv2.waitKey(1) & 0xFF
 
-    if key == ord('q'):
-        print("Quitting...")
-        break
-    elif key == ord('s'):
-        if contour is not None:
-            reference_axis_endpoints = current_axis_endpoints
-            reference_points = get_points_on_axis(reference_axis_endpoints, NUM_POINTS)
-            is_reference_set = True
-            print(f"Reference state set with {len(reference_points)} points.")
-        else:
-            print("Cannot set reference: Actuator not found in current frame.")
-    elif key == ord('r'):
-        reference_points = None
-        reference_axis_endpoints = None
-        is_reference_set = False
-        print("Reference state reset.")
-
-# --- Cleanup ---
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+# --- Main Loop ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the neutral-axis deflection of a bending actuator.")
+    parser.add_argument("--url", default=ip_camera_url, help="camera stream URL or device index")
+    parser.add_argument("--no-display", action="store_true",
+                        help="run without a window; the first detected frame becomes the reference")
+    parser.add_argument("--stats-interval", type=float, default=STATS_INTERVAL,
+                        help="seconds between pipeline stats printouts (0 disables)")
+    parser.add_argument("--no-roi", action="store_true",
+                        help="always search the full frame instead of tracking a region of interest")
+    parser.add_argument("--axis", choices=("rect", "centerline"), default=AXIS_MODE,
+                        help="straight minAreaRect axis or curved skeleton centerline")
+    parser.add_argument("--coarse", type=int, default=COARSE_SCALE, metavar="FACTOR",
+                        help="find the actuator on a frame downscaled by FACTOR first, then refine at full resolution")
+    parser.add_argument("--filter", choices=("none", "kalman", "alpha-beta"), default=AXIS_FILTER,
+                        help="temporal filter over the axis points (sub-pixel, predicts the search region)")
+    parser.add_argument("--segmentation", choices=("hsv", "lut"), default=segmentation.METHOD,
+                        help="HSV conversion + inRange, or one 3-D BGR lookup table (identical masks)")
+    parser.add_argument("--record", metavar="NAME",
+                        help="also save the raw stream with timestamps to NAME.frames/NAME.idx")
+    parser.add_argument("--replay", metavar="NAME",
+                        help="analyse a recording instead of the camera (every frame, as fast as possible)")
+    parser.add_argument("--realtime", action="store_true", help="replay at the recorded pace")
+    parser.add_argument("--metrics", action="store_true",
+                        help="time every stage and show the latencies on the frame ('m' hides them)")
+    parser.add_argument("--metrics-file", nargs="?", const=METRICS_FILE, metavar="FILE",
+                        help=f"also rewrite FILE (default {METRICS_FILE}) with the metrics as JSON every second")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="also serve the metrics as JSON on http://127.0.0.1:PORT/metrics")
+    args = parser.parse_args()
+
+    if args.replay:
+        cap = ReplaySource(args.replay, pace="realtime" if args.realtime else "max")
+        lossless = not args.realtime
+    else:
+        source = int(args.url) if args.url.isdigit() else args.url
+        cap = cv2.VideoCapture(source)
+        lossless = False
+
+    if not cap.isOpened():
+        print(f"Error: Could not open video stream at {args.replay or args.url}")
+        return
+
+    print("Video stream opened successfully.")
+    if not args.no_display:
+        print("Press 's' to set the current frame as the reference (undeflected) state.")
+        print("Press 'r' to reset the reference state.")
+        if args.metrics or args.metrics_file or args.metrics_port is not None:
+            print("Press 'm' to show/hide the metrics.")
+        print("Press 'q' to quit.")
+
+    segmentation.METHOD = args.segmentation
+    reference = Reference()
+    tracker = None
+    roi = ROI_TRACKING and not args.no_roi
+    if roi or args.coarse > 1:
+        tracker = RoiTracker(lower_green, upper_green, MIN_CONTOUR_AREA, coarse_scale=args.coarse, track=roi)
+
+    # Metrics off: metrics stays None and none of the stages are timed
+    metrics = overlay = metrics_writer = metrics_server = None
+    if args.metrics or args.metrics_file or args.metrics_port is not None:
+        metrics = Metrics()
+        overlay = MetricsOverlay(metrics)
+
+    axis_filter = AxisFilter(args.filter) if args.filter != "none" else None
+
+    def process(seq, t_capture, frame):
+        if axis_filter is not None and tracker is not None:
+            tracker.seed(axis_filter.predicted_shift(t_capture), frame.shape[1], frame.shape[0])
+        result = process_frame(frame, reference, tracker=tracker, axis_mode=args.axis, metrics=metrics)
+        if axis_filter is not None:
+            filter_result(result, axis_filter, reference, t_capture)
+        result["seq"] = seq
+        result["t_capture"] = t_capture
+        if metrics is not None:
+            metrics.record("age at result", time.monotonic() - t_capture)
+        return result
+
+    recorder = None
+    if args.record:
+        recorder = Recorder(args.record)
+        recorder.start()
+        print(f"Recording to {recorder.data_path}")
+
+    grabber = FrameGrabber(cap, lossless=lossless, on_frame=recorder.submit if recorder else None)
+    processor = ProcessingStage(grabber.output, process, lossless=lossless)
+    display_stats = processor.output.stats
+    if metrics is not None:
+        metrics.pipeline = [grabber.stats, processor.stats, display_stats]
+        for stats in metrics.pipeline:
+            stats.metrics = metrics
+        if args.metrics_file:
+            metrics_writer = MetricsWriter(metrics, args.metrics_file)
+            metrics_writer.start()
+            print(f"Writing metrics to {args.metrics_file}")
+        if args.metrics_port is not None:
+            metrics_server = MetricsServer(metrics, args.metrics_port)
+            metrics_server.start()
+            print(f"Serving metrics on {metrics_server.url}")
+    grabber.start()
+    processor.start()
+
+    last_stats = time.monotonic()
+    try:
+        while True:
+            result = processor.output.get(timeout=0.5)
+            if result is None:
+                if processor.output.closed:
+                    if grabber.error:
+                        print(f"Error: {grabber.error}")
+                    break
+                continue
+
+            t0 = time.monotonic()
+            if args.no_display:
+                if not reference.is_set and result["contour"] is not None:
+                    reference.set(result["axis_endpoints"], NUM_POINTS, result["samples"])
+                    print("Reference state set from first detected frame.")
+                elif result["avg_deflection"] is not None:
+                    age_ms = (t0 - result["t_capture"]) * 1000.0
+                    angle = ""
+                    if result["bend_angle"] is not None:
+                        angle = f", Tip angle {math.degrees(result['bend_angle'][-1]):.1f} deg"
+                    print(f"frame {result['seq']}: Avg Defl {result['avg_deflection']:.2f} px, "
+                          f"Max {result['max_deflection']:.2f} px, Tip {result['tip_deflection']:.2f} px"
+                          f"{angle} (age {age_ms:.0f} ms)")
+                display_stats.record(time.monotonic() - t0)
+            elif metrics is None:
+                # --- Show the frame ---
+                cv2.imshow("Actuator Deflection Analysis", draw_overlay(result, reference))
+                display_stats.record(time.monotonic() - t0)
+                key = cv2.waitKey(1) & 0xFF
+            else:
+                # Same as above, with every step timed
+                t = time.perf_counter()
+                display_frame = overlay.draw(draw_overlay(result, reference))
+                t = metrics.lap("overlay", t)
+                cv2.imshow("Actuator Deflection Analysis", display_frame)
+                t = metrics.lap("imshow", t)
+                display_stats.record(time.monotonic() - t0)
+                key = cv2.waitKey(1) & 0xFF
+                metrics.lap("waitKey", t)
+            if metrics is not None:
+                metrics.record("age at display", time.monotonic() - result["t_capture"])
+
+            # --- Handle User Input ---
+            if not args.no_display:
+                if key == ord('q'):
+                    print("Quitting...")
+                    break
+                elif key == ord('s'):
+                    if result["contour"] is not None:
+                        reference.set(result["axis_endpoints"], NUM_POINTS, result["samples"])
+                        print(f"Reference state set with {NUM_POINTS} points.")
+                    else:
+                        print("Cannot set reference: Actuator not found in current frame.")
+                elif key == ord('r'):
+                    reference.reset()
+                    print("Reference state reset.")
+                elif key == ord('m') and overlay is not None:
+                    overlay.visible = not overlay.visible
+
+            if args.stats_interval and time.monotonic() - last_stats >= args.stats_interval:
+                print_stats([grabber.stats, processor.stats, display_stats])
+                if axis_filter is not None:
+                    print_noise_floor(axis_filter)
+                last_stats = time.monotonic()
+    except KeyboardInterrupt:
+        print("\nQuitting...")
+    finally:
+        # --- Cleanup ---
+        grabber.stop()
+        processor.stop()
+        grabber.join(timeout=2)
+        processor.join(timeout=2)
+        cap.release()
+        if metrics_writer is not None:
+            metrics_writer.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if recorder is not None:
+            recorder.close()
+            print(f"Recorded {recorder.frames} frames ({recorder.dropped} dropped)")
+        if not args.no_display:
+            cv2.destroyAllWindows()
+        print_stats([grabber.stats, processor.stats, display_stats])
+        if axis_filter is not None:
+            print_noise_floor(axis_filter)
+        if tracker is not None:
+            print(f"ROI tracking: {tracker.roi_hits} crop searches, {tracker.full_searches} full-frame searches, "
+                  f"{tracker.coarse_searches} coarse searches")
+
+
+if __name__ == "__main__":
+    main()
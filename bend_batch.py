@@ -0,0 +1,274 @@
+import argparse
+import csv
+import os
+import time
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+import bend
+import recording
+from centerline import find_centerline
+from deflection import axis_samples, deflection_summary
+
+# --- Configuration ---
+# Image file extensions picked up when an input is a directory of frames
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+# Long videos are split into chunks of this many frames so that one file
+# can be spread over several worker processes
+CHUNK_FRAMES = 500
+
+
+# --- Frame Sources ---
+
+def list_images(directory):
+    """Returns the sorted image files of a directory of frames."""
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(IMAGE_EXTENSIONS))
+    return [os.path.join(directory, n) for n in names]
+
+
+def count_frames(path):
+    """Number of frames in a video file, image directory or recording."""
+    if os.path.isdir(path):
+        return len(list_images(path))
+    cap = recording.ReplaySource(path) if recording.is_recording(path) else cv2.VideoCapture(path)
+    n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return max(n, 0)
+
+
+def iter_frames(path, start=0, stop=None):
+    """
+    Yields (frame_index, frame) for frames [start, stop) of a video file,
+    image directory or recording (see recording.py).
+    """
+    if os.path.isdir(path):
+        files = list_images(path)[start:stop]
+        for i, name in enumerate(files, start):
+            frame = cv2.imread(name)
+            if frame is not None:
+                yield i, frame
+        return
+
+    cap = recording.ReplaySource(path) if recording.is_recording(path) else cv2.VideoCapture(path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    i = start
+    while stop is None or i < stop:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield i, frame
+        i += 1
+    cap.release()
+
+
+# --- Worker Functions ---
+
+def _init_worker():
+    # One process per core already; keep OpenCV from spawning its own threads
+    cv2.setNumThreads(1)
+
+
+def measure_axis(frame, settings, tracker=None):
+    """
+    Float axis samples (num_points, 2) of one frame, straight or centerline
+    depending on settings["axis"], and the bend angle along the centerline
+    (None in rect mode). Returns (None, None) if the actuator is not found.
+    """
+    if tracker is not None:
+        contour, rect, endpoints = tracker.find(frame)
+    else:
+        contour, rect, endpoints = bend.find_actuator_and_axis(
+            frame, settings["lower"], settings["upper"], settings["min_area"])
+    if contour is None:
+        return None, None
+    if settings["axis"] == "centerline":
+        line = find_centerline(contour, settings["num_points"])
+        if line is None:
+            return None, None
+        return line["points"], line["bend_angle"]
+    if bend.SUBPIXEL_AXIS:
+        endpoints = bend.axis_from_rect(rect, subpixel=True)
+    return axis_samples(endpoints, settings["num_points"]), None
+
+
+def compute_reference(job):
+    """
+    Reference axis samples for one input: the average axis over the first
+    `n` frames where the actuator is found, or the axis found in a
+    reference image. Returns (path, samples) with samples None on failure.
+    """
+    path, reference_image, n, settings = job
+    if reference_image is not None:
+        image = cv2.imread(reference_image)
+        if image is None:
+            return path, None
+        return path, measure_axis(image, settings)[0]
+
+    found = []
+    for _, frame in iter_frames(path):
+        samples, _ = measure_axis(frame, settings)
+        if samples is not None:
+            found.append(samples)
+        if len(found) >= n:
+            break
+    if not found:
+        return path, None
+    return path, np.mean(found, axis=0)
+
+
+def process_chunk(job):
+    """
+    Runs the detection on frames [start, stop) of one input, then the
+    displacement calculation for the whole chunk at once. Returns
+    (path, start, rows) where each row is
+    [frame, found, avg, max, tip, tip angle, d_0 ... d_{n-1}].
+    """
+    path, start, stop, reference_samples, settings = job
+    num_points = settings["num_points"]
+    tracker = None
+    if settings["roi"]:
+        tracker = bend.RoiTracker(settings["lower"], settings["upper"], settings["min_area"])
+
+    indices = []
+    samples = []
+    tip_angles = []
+    missing = np.full((num_points, 2), np.nan)
+    for i, frame in iter_frames(path, start, stop):
+        points, bend_angle = measure_axis(frame, settings, tracker)
+        indices.append(i)
+        # NaN points propagate to NaN deflection for frames without a detection
+        samples.append(points if points is not None else missing)
+        tip_angles.append(np.degrees(bend_angle[-1]) if bend_angle is not None else np.nan)
+    if not indices:
+        return path, start, []
+
+    summary = deflection_summary(np.array(samples), reference_samples)
+    found = ~np.isnan(summary["average"])
+    table = np.column_stack([
+        indices, found, summary["average"], summary["max"], summary["tip"], tip_angles,
+        summary["displacements"],
+    ])
+    rows = table.tolist()
+    for row in rows:
+        row[0], row[1] = int(row[0]), int(row[1])
+    return path, start, rows
+
+
+# --- Batch Driver ---
+
+def collect_inputs(paths):
+    """Drops command-line inputs that do not exist."""
+    inputs = []
+    for path in paths:
+        if not os.path.exists(path) and not recording.is_recording(path):
+            print(f"Warning: {path} does not exist, skipping.")
+            continue
+        inputs.append(path)
+    return inputs
+
+
+def output_path(out_dir, path):
+    stem = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    return os.path.join(out_dir, f"{stem}_deflection.csv")
+
+
+def write_rows(filename, rows, num_points):
+    with open(filename, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['frame', 'found', 'avg deflection px', 'max deflection px', 'tip deflection px', 'tip angle deg'] + [f'd{i} px' for i in range(num_points)])
+        writer.writerows(rows)
+
+
+def run_batch(inputs, out_dir, num_points=bend.NUM_POINTS, min_area=bend.MIN_CONTOUR_AREA,
+              reference_frames=1, reference_image=None, workers=None, chunk_frames=CHUNK_FRAMES,
+              roi=bend.ROI_TRACKING, axis=bend.AXIS_MODE):
+    """
+    Processes every input across a process pool and writes one CSV of
+    per-frame deflection per input. Returns (frames processed, seconds).
+    """
+    settings = {
+        "lower": bend.lower_green,
+        "upper": bend.upper_green,
+        "min_area": min_area,
+        "num_points": num_points,
+        "roi": roi,
+        "axis": axis,
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    start_time = time.perf_counter()
+
+    with Pool(processes=workers, initializer=_init_worker) as pool:
+        references = dict(pool.map(
+            compute_reference,
+            [(path, reference_image, reference_frames, settings) for path in inputs],
+        ))
+
+        jobs = []
+        for path in inputs:
+            if references[path] is None:
+                print(f"Warning: no reference found for {path}, skipping.")
+                continue
+            n = count_frames(path)
+            if n <= 0:
+                # Unknown length (e.g. some containers): one chunk to the end
+                jobs.append((path, 0, None, references[path], settings))
+                continue
+            for start in range(0, n, chunk_frames):
+                jobs.append((path, start, min(start + chunk_frames, n), references[path], settings))
+
+        results = {}
+        for path, start, rows in pool.imap_unordered(process_chunk, jobs):
+            results.setdefault(path, []).append((start, rows))
+
+    total = 0
+    for path, chunks in results.items():
+        chunks.sort(key=lambda c: c[0])
+        rows = [row for _, chunk_rows in chunks for row in chunk_rows]
+        total += len(rows)
+        filename = output_path(out_dir, path)
+        write_rows(filename, rows, num_points)
+        print(f"{path}: {len(rows)} frames -> {filename}")
+
+    return total, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Headless batch deflection analysis of recorded videos or image directories.")
+    parser.add_argument("inputs", nargs="+", help="video files and/or directories of frames")
+    parser.add_argument("-o", "--out-dir", default="deflection_results", help="directory for the output CSVs")
+    parser.add_argument("-n", "--num-points", type=int, default=bend.NUM_POINTS)
+    parser.add_argument("--min-area", type=float, default=bend.MIN_CONTOUR_AREA)
+    parser.add_argument("--reference-frames", type=int, default=1,
+                        help="average the axis of the first N detected frames as the reference")
+    parser.add_argument("--reference-image", help="take the reference axis from this image instead")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-frames", type=int, default=CHUNK_FRAMES,
+                        help="frames per work unit when splitting long videos")
+    parser.add_argument("--no-roi", action="store_true",
+                        help="search the full frame every time instead of tracking a region of interest")
+    parser.add_argument("--axis", choices=("rect", "centerline"), default=bend.AXIS_MODE,
+                        help="straight minAreaRect axis or curved skeleton centerline")
+    args = parser.parse_args()
+
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print("Error: no inputs to process.")
+        return
+
+    frames, seconds = run_batch(
+        inputs, args.out_dir, num_points=args.num_points, min_area=args.min_area,
+        reference_frames=args.reference_frames, reference_image=args.reference_image,
+        workers=args.workers, chunk_frames=args.chunk_frames, roi=not args.no_roi,
+        axis=args.axis,
+    )
+    fps = frames / seconds if seconds > 0 else 0.0
+    print(f"Processed {frames} frames in {seconds:.2f} s ({fps:.1f} frames/s)")
+
+
+if __name__ == "__main__":
+    main()
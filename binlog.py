@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import re
+import struct
+import time
+
+import numpy as np
+
+# --- File Layout ---
+# MAGIC (8 bytes) | header size (uint32 LE, whole header incl. magic) |
+# JSON header (dtype, csv_header, metadata), space-padded to a multiple of
+# HEADER_ALIGN | fixed-size records, appended.
+# A record torn by a crash at the end of the file is ignored by readers.
+MAGIC = b'BAELOG\x00\x01'
+HEADER_ALIGN = 64
+EXTENSION = '.bin'
+
+# Record layouts of the logs written by this repo, keyed by their CSV header.
+# Sized to the sensors: VL53L0X gives whole mm, the ESP32 ADC 12 bits and
+# millis() is 32-bit, and float32 keeps ~7 significant digits for the
+# calibrated values.
+RAW_DTYPE = np.dtype([('distance_mm', '<f4'), ('fsr_reading', '<u2'), ('time_ms', '<u4')])
+FILTERED_DTYPE = np.dtype([('distance_mm', '<f4'), ('fsr_g', '<f4'), ('time_ms', '<u4')])
+KNOWN_LAYOUTS = {
+    ('distance mm', 'fsr reading', 'time ms'): RAW_DTYPE,
+    ('distance mm', 'fsr  (grams)', 'time ms'): FILTERED_DTYPE,
+}
+
+# Rows per chunk when converting to/from CSV
+CONVERT_CHUNK_ROWS = 100000
+
+
+def is_binlog(path):
+    return os.path.splitext(path)[1].lower() == EXTENSION
+
+
+def _encode_header(dtype, csv_header=None, metadata=None):
+    info = {
+        'dtype': np.lib.format.dtype_to_descr(dtype),
+        'csv_header': list(csv_header) if csv_header else list(dtype.names),
+        'metadata': metadata or {},
+        'created': time.time(),
+    }
+    body = json.dumps(info).encode()
+    size = len(MAGIC) + 4 + len(body)
+    size += -size % HEADER_ALIGN
+    return MAGIC + struct.pack('<I', size) + body.ljust(size - len(MAGIC) - 4)
+
+
+def read_header(path):
+    """
+    Returns (header dict, dtype, header size in bytes) of a record log.
+    Raises ValueError if the file is not a record log.
+    """
+    with open(path, 'rb') as file:
+        prefix = file.read(len(MAGIC) + 4)
+        if len(prefix) < len(MAGIC) + 4 or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a record log (bad magic)")
+        size = struct.unpack('<I', prefix[len(MAGIC):])[0]
+        info = json.loads(file.read(size - len(prefix)))
+    descr = info['dtype']
+    dtype = np.dtype([tuple(field) for field in descr] if isinstance(descr, list) else descr)
+    return info, dtype, size
+
+
+class RecordWriter:
+    """
+    Append-only writer of fixed-dtype records. write() takes a structured
+    array (or anything np.asarray can turn into one) and appends it with a
+    single file write. Opening an existing log with append=True continues it
+    (the dtype must match).
+    """
+
+    def __init__(self, path, dtype, csv_header=None, metadata=None, append=False):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.rows_written = 0
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            _, existing, size = read_header(path)
+            if existing != self.dtype:
+                raise ValueError(f"{path} holds {existing}, not {self.dtype}")
+            self._file = open(path, 'r+b')
+            # Drop a torn record left by an interrupted write
+            records = (os.path.getsize(path) - size) // self.dtype.itemsize
+            self._file.truncate(size + records * self.dtype.itemsize)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, 'wb')
+            self._file.write(_encode_header(self.dtype, csv_header, metadata))
+
+    def write(self, records):
+        if isinstance(records, np.ndarray) and records.dtype.names:
+            records = records.astype(self.dtype, copy=False)
+        else:
+            records = np.array([tuple(r) for r in records], dtype=self.dtype)
+        self._file.write(records.tobytes())
+        self.rows_written += len(records)
+
+    def flush(self):
+        self._file.flush()
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_log(path):
+    """
+    Memory-maps a record log read-only and returns the structured array of
+    its complete records (zero-copy; slicing and column access are views).
+    """
+    info, dtype, size = read_header(path)
+    count = (os.path.getsize(path) - size) // dtype.itemsize
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=size, shape=(count,))
+
+
+def time_slice(records, start=None, stop=None, column='time_ms'):
+    """
+    Records with start <= records[column] < stop, as a view. The column
+    must be sorted (time stamps of one run are).
+    """
+    times = records[column]
+    lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+    hi = len(records) if stop is None else int(np.searchsorted(times, stop, side='left'))
+    return records[lo:hi]
+
+
+# --- CSV Converters ---
+
+def _dtype_for_header(csv_header):
+    dtype = KNOWN_LAYOUTS.get(tuple(csv_header))
+    if dtype is not None:
+        return dtype
+    names = [re.sub(r'\W+', '_', name.strip()).strip('_') or f'col{i}' for i, name in enumerate(csv_header)]
+    return np.dtype([(name, '<f8') for name in names])
+
+
+def csv_to_bin(csv_path, bin_path, chunk_rows=CONVERT_CHUNK_ROWS):
+    """Converts a CSV log (with a header row) to a record log. Returns the row count."""
+    with open(csv_path, 'r', newline='') as src:
+        csv_header = [name.strip('\r\n') for name in src.readline().split(',')]
+        dtype = _dtype_for_header(csv_header)
+        with RecordWriter(bin_path, dtype, csv_header=csv_header, metadata={'source': csv_path}) as writer:
+            while True:
+                lines = [src.readline() for _ in range(chunk_rows)]
+                lines = [line for line in lines if line.strip()]
+                if not lines:
+                    break
+                values = np.loadtxt(lines, delimiter=',', dtype=np.float64, ndmin=2)
+                records = np.empty(len(values), dtype=dtype)
+                for i, name in enumerate(dtype.names):
+                    records[name] = values[:, i]
+                writer.write(records)
+            return writer.rows_written
+
+
+def bin_to_csv(bin_path, csv_path, chunk_rows=CONVERT_CHUNK_ROWS):
+    """Converts a record log back to the CSV layout it came from. Returns the row count."""
+    info, dtype, _ = read_header(bin_path)
+    records = open_log(bin_path)
+    formats = ','.join('%d' if dtype[name].kind in 'iu' else '%.7g' for name in dtype.names) + '\n'
+    with open(csv_path, 'w', newline='') as dst:
+        dst.write(','.join(info['csv_header']) + '\n')
+        for start in range(0, len(records), chunk_rows):
+            chunk = records[start:start + chunk_rows]
+            values = [v for row in chunk.tolist() for v in row]
+            dst.write((formats * len(chunk)) % tuple(values))
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between CSV logs and binary record logs.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('to-bin', help="CSV -> record log")
+    p.add_argument('csv')
+    p.add_argument('bin', nargs='?')
+    p = sub.add_parser('to-csv', help="record log -> CSV")
+    p.add_argument('bin')
+    p.add_argument('csv', nargs='?')
+    p = sub.add_parser('info', help="print the header and row count of a record log")
+    p.add_argument('bin')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.command == 'to-bin':
+        out = args.bin or os.path.splitext(args.csv)[0] + EXTENSION
+        rows = csv_to_bin(args.csv, out)
+    elif args.command == 'to-csv':
+        out = args.csv or os.path.splitext(args.bin)[0] + '.csv'
+        rows = bin_to_csv(args.bin, out)
+    else:
+        info, dtype, size = read_header(args.bin)
+        records = open_log(args.bin)
+        print(json.dumps(info, indent=2))
+        print(f"{len(records)} records of {dtype.itemsize} bytes, data at offset {size}")
+        if len(records) and 'time_ms' in dtype.names:
+            print(f"time_ms {records['time_ms'][0]} .. {records['time_ms'][-1]}")
+        return
+    print(f"{rows} rows -> {out} in {time.perf_counter() - t0:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
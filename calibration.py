@@ -0,0 +1,327 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import time
+
+import numpy as np
+from scipy.interpolate import PchipInterpolator
+
+# --- Configuration ---
+# Calibration sessions (CSV files, SESSION_HEADER) and the fitted versions
+# (v0001.json, v0002.json, ...) live in CALIBRATION_DIR
+CALIBRATION_DIR = 'calibration'
+SESSION_PATTERN = 'session_*.csv'
+VERSION_PATTERN = 'v{:04d}.json'
+
+# One reference measurement per row:
+#   sensor     'fsr' or 'distance'
+#   reference  true value: weight in g (fsr) or distance in mm (distance)
+#   raw        what the sensor reported: ADC reading or raw distance
+SESSION_HEADER = ['sensor', 'reference', 'raw']
+
+# FSR model:
+#   'pchip'  monotone piecewise cubic through the mean ADC of every reference
+#            weight (after forcing the weights to increase with ADC)
+#   'log'    power law of the voltage divider ratio,
+#            weight = k * (adc / (ADC_LEVELS - adc)) ** n, fitted in log space
+#   'linear' straight lines between the calibration points (old behaviour)
+FSR_MODEL = 'pchip'
+ADC_LEVELS = 4096  # 12-bit ESP32 ADC
+
+# Polynomial degree of the distance regression (reference vs raw)
+DISTANCE_DEGREE = 1
+
+
+def _read_session(path):
+    """(sensor, reference, raw) arrays of one session file; rows that do not parse are skipped."""
+    sensors, reference, raw = [], [], []
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            try:
+                values = float(row['reference']), float(row['raw'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            sensors.append(row['sensor'].strip().lower())
+            reference.append(values[0])
+            raw.append(values[1])
+    return np.array(sensors), np.array(reference), np.array(raw)
+
+
+def session_files(directory=CALIBRATION_DIR):
+    return sorted(glob.glob(os.path.join(directory, SESSION_PATTERN)))
+
+
+def append_session(sensor, reference, raw, directory=CALIBRATION_DIR):
+    """Appends reference measurements to today's session file and returns its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, time.strftime('session_%Y%m%d.csv'))
+    new = not os.path.exists(path)
+    with open(path, 'a', newline='') as file:
+        writer = csv.writer(file)
+        if new:
+            writer.writerow(SESSION_HEADER)
+        writer.writerows([sensor, r, x] for r, x in zip(np.ravel(reference), np.ravel(raw)))
+    return path
+
+
+def _isotonic(y, weights):
+    """Non-decreasing least-squares fit of y (pool adjacent violators)."""
+    blocks = []  # [mean, weight, count]
+    for value, weight in zip(y, weights):
+        blocks.append([value, weight, 1])
+        while len(blocks) > 1 and blocks[-2][0] > blocks[-1][0]:
+            v2, w2, n2 = blocks.pop()
+            v1, w1, n1 = blocks.pop()
+            blocks.append([(v1 * w1 + v2 * w2) / (w1 + w2), w1 + w2, n1 + n2])
+    return np.concatenate([np.full(n, v) for v, _, n in blocks])
+
+
+class Calibrator:
+    """
+    Accumulates reference measurements as sufficient statistics (count and
+    ADC sum per FSR reference weight, power sums of the distance pairs), so
+    adding points and refitting never needs the earlier raw points again.
+    """
+
+    def __init__(self, stats=None, sessions=()):
+        stats = stats or {}
+        self.fsr = {float(w): list(v) for w, v in stats.get('fsr', {}).items()}  # weight -> [count, adc sum]
+        self.distance = np.array(stats.get('distance', np.zeros((2, 2 * DISTANCE_DEGREE + 1))), dtype=np.float64)
+        self.sessions = list(sessions)
+
+    def add(self, sensor, reference, raw):
+        reference = np.atleast_1d(np.asarray(reference, dtype=np.float64))
+        raw = np.atleast_1d(np.asarray(raw, dtype=np.float64))
+        if sensor == 'fsr':
+            for weight in np.unique(reference):
+                values = raw[reference == weight]
+                entry = self.fsr.setdefault(float(weight), [0, 0.0])
+                entry[0] += len(values)
+                entry[1] += float(values.sum())
+        elif sensor == 'distance':
+            powers = raw[None, :] ** np.arange(self.distance.shape[1])[:, None]
+            # Row 0: sums of raw**k, row 1: sums of reference * raw**k
+            self.distance[0] += powers.sum(axis=1)
+            self.distance[1] += (powers * reference).sum(axis=1)
+        else:
+            raise ValueError(f"Unknown sensor {sensor!r}")
+
+    def add_session(self, path):
+        sensors, reference, raw = _read_session(path)
+        for sensor in ('fsr', 'distance'):
+            if np.any(sensors == sensor):
+                self.add(sensor, reference[sensors == sensor], raw[sensors == sensor])
+        self.sessions.append(os.path.basename(path))
+
+    def fsr_points(self):
+        """(mean ADC, weight, count) per reference weight, sorted by ADC."""
+        if not self.fsr:
+            return None
+        weights = np.array(list(self.fsr))
+        count, total = np.array(list(self.fsr.values())).T
+        adc = total / count
+        order = np.argsort(adc)
+        return adc[order], weights[order], count[order]
+
+    def fit_fsr(self, model=FSR_MODEL):
+        points = self.fsr_points()
+        if points is None:
+            return None
+        adc, weight, count = points
+        if model == 'log':
+            used = (weight > 0) & (adc > 0) & (adc < ADC_LEVELS)
+            if np.count_nonzero(used) < 2:
+                raise ValueError("The log model needs at least two non-zero reference weights")
+            ratio = np.log(adc[used] / (ADC_LEVELS - adc[used]))
+            n, log_k = np.polyfit(ratio, np.log(weight[used]), 1, w=np.sqrt(count[used]))
+            return {'model': 'log', 'k': float(np.exp(log_k)), 'n': float(n),
+                    'adc': adc.tolist(), 'weight': weight.tolist()}
+        if model not in ('pchip', 'linear'):
+            raise ValueError(f"Unknown FSR model {model!r}")
+        return {'model': model, 'adc': adc.tolist(), 'weight': _isotonic(weight, count).tolist()}
+
+    def fit_distance(self, degree=DISTANCE_DEGREE):
+        """Least-squares polynomial coefficients (highest power first), from the power sums."""
+        sums, cross = self.distance
+        if sums[0] <= degree:
+            return None
+        moments = np.array([[sums[i + j] for j in range(degree + 1)] for i in range(degree + 1)])
+        coefficients = np.linalg.solve(moments, cross[:degree + 1])
+        return coefficients[::-1].tolist()
+
+    def stats(self):
+        return {'fsr': {str(w): v for w, v in self.fsr.items()}, 'distance': self.distance.tolist()}
+
+    def fit(self, fsr_model=FSR_MODEL):
+        return Calibration({
+            'fsr': self.fit_fsr(fsr_model),
+            'distance': self.fit_distance(),
+            'sessions': self.sessions,
+            'stats': self.stats(),
+        })
+
+
+class Calibration:
+    """
+    A fitted calibration. fsr() and distance() take scalars or arrays: the
+    FSR model is tabulated once for every ADC level, so converting a log is
+    a table lookup per sample, whatever the model.
+    """
+
+    def __init__(self, params):
+        self.params = params
+        self.version = params.get('version')
+        fsr = params.get('fsr')
+        self._fsr_table = None
+        if fsr is not None:
+            levels = np.arange(ADC_LEVELS, dtype=np.float64)
+            adc, first = np.unique(fsr['adc'], return_index=True)
+            weight = np.array(fsr['weight'])[first]
+            # Held constant outside the calibrated range, like np.interp
+            clipped = np.clip(levels, adc[0], adc[-1])
+            if fsr['model'] == 'log':
+                table = fsr['k'] * (clipped / (ADC_LEVELS - clipped)) ** fsr['n']
+            elif fsr['model'] == 'pchip' and len(adc) > 1:
+                table = PchipInterpolator(adc, weight)(clipped)
+            else:
+                table = np.interp(levels, adc, weight)
+            self._fsr_table = table
+        coefficients = params.get('distance')
+        self._distance = np.array(coefficients) if coefficients is not None else None
+
+    @property
+    def has_fsr(self):
+        return self._fsr_table is not None
+
+    @property
+    def has_distance(self):
+        return self._distance is not None
+
+    def fsr(self, adc):
+        """Weight in g of ADC reading(s)."""
+        adc = np.asarray(adc)
+        if adc.dtype.kind in 'iu':
+            return self._fsr_table[np.clip(adc, 0, ADC_LEVELS - 1)]
+        # Float readings (whole numbers when they come from a log): the table
+        # is on a unit grid, so the neighbours are found by truncation
+        x = np.clip(adc, 0, ADC_LEVELS - 1)
+        missing = np.isnan(x)
+        if missing.any():
+            x = np.where(missing, 0, x)
+        i = x.astype(np.intp)
+        fraction = x - i
+        if not fraction.any():
+            weight = self._fsr_table[i]
+        else:
+            i = np.minimum(i, ADC_LEVELS - 2)
+            fraction = x - i
+            weight = self._fsr_table[i] + fraction * (self._fsr_table[i + 1] - self._fsr_table[i])
+        return np.where(missing, np.nan, weight) if missing.any() else weight
+
+    def distance(self, raw):
+        """Corrected distance of raw reading(s) (NaN stays NaN)."""
+        return np.polyval(self._distance, np.asarray(raw, dtype=np.float64))
+
+    def calibrator(self):
+        """A Calibrator holding this calibration's statistics, to add points to."""
+        return Calibrator(self.params.get('stats'), self.params.get('sessions', ()))
+
+    def save(self, directory=CALIBRATION_DIR):
+        """Saves as the next version and returns its number."""
+        os.makedirs(directory, exist_ok=True)
+        self.version = (max(versions(directory), default=0)) + 1
+        self.params['version'] = self.version
+        self.params['created'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        path = os.path.join(directory, VERSION_PATTERN.format(self.version))
+        with open(path + '.tmp', 'w') as file:
+            json.dump(self.params, file, indent=1)
+        os.replace(path + '.tmp', path)
+        return self.version
+
+
+def versions(directory=CALIBRATION_DIR):
+    """Saved version numbers, ascending."""
+    names = (os.path.basename(p) for p in glob.glob(os.path.join(directory, 'v*.json')))
+    return sorted(int(m.group(1)) for m in (re.fullmatch(r'v(\d+)\.json', n) for n in names) if m)
+
+
+def load_calibration(version=None, directory=CALIBRATION_DIR):
+    """A saved Calibration (the latest if version is None), or None if there is none."""
+    if version is None:
+        saved = versions(directory)
+        if not saved:
+            return None
+        version = saved[-1]
+    path = os.path.join(directory, VERSION_PATTERN.format(version))
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return Calibration(json.load(file))
+
+
+def fit_sessions(paths, fsr_model=FSR_MODEL):
+    calibrator = Calibrator()
+    for path in paths:
+        calibrator.add_session(path)
+    return calibrator.fit(fsr_model)
+
+
+def describe(calibration):
+    lines = [f"version {calibration.version} ({calibration.params.get('created', 'unsaved')}), "
+             f"sessions: {', '.join(calibration.params.get('sessions', [])) or 'none'}"]
+    fsr = calibration.params.get('fsr')
+    if fsr is not None:
+        model = f"k={fsr['k']:.4g}, n={fsr['n']:.4g}" if fsr['model'] == 'log' else f"{len(fsr['adc'])} points"
+        residual = calibration.fsr(np.array(fsr['adc'])) - np.array(fsr['weight'])
+        lines.append(f"  fsr: {fsr['model']}, {model}, RMS residual at the points {np.sqrt(np.mean(residual ** 2)):.2f} g")
+    if calibration.has_distance:
+        lines.append(f"  distance: coefficients {', '.join(f'{c:.6g}' for c in calibration.params['distance'])}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit, extend and list versioned sensor calibrations.")
+    parser.add_argument("--dir", default=CALIBRATION_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    fit = commands.add_parser("fit", help="fit all sessions (or the given files) and save a new version")
+    fit.add_argument("sessions", nargs="*")
+    fit.add_argument("--fsr-model", choices=("pchip", "log", "linear"), default=FSR_MODEL)
+    add = commands.add_parser("add", help="log reference readings and refit the latest version incrementally")
+    add.add_argument("sensor", choices=("fsr", "distance"))
+    add.add_argument("reference", type=float, help="true weight (g) or distance (mm)")
+    add.add_argument("raw", type=float, nargs="+", help="sensor reading(s) at that reference")
+    add.add_argument("--fsr-model", choices=("pchip", "log", "linear"))
+    commands.add_parser("list", help="show the saved versions")
+    args = parser.parse_args()
+
+    if args.command == "fit":
+        paths = args.sessions or session_files(args.dir)
+        if not paths:
+            print(f"No sessions in {args.dir} (expected {SESSION_PATTERN} with columns {','.join(SESSION_HEADER)})")
+            return
+        calibration = fit_sessions(paths, args.fsr_model)
+        calibration.save(args.dir)
+        print(describe(calibration))
+    elif args.command == "add":
+        path = append_session(args.sensor, [args.reference] * len(args.raw), args.raw, args.dir)
+        latest = load_calibration(directory=args.dir)
+        calibrator = latest.calibrator() if latest is not None else Calibrator()
+        calibrator.add(args.sensor, [args.reference] * len(args.raw), args.raw)
+        if os.path.basename(path) not in calibrator.sessions:
+            calibrator.sessions.append(os.path.basename(path))
+        model = args.fsr_model or (latest.params['fsr']['model'] if latest is not None and latest.has_fsr
+                                   else FSR_MODEL)
+        calibration = calibrator.fit(model)
+        calibration.save(args.dir)
+        print(f"Added {len(args.raw)} {args.sensor} readings to {path}")
+        print(describe(calibration))
+    else:
+        for version in versions(args.dir):
+            print(describe(load_calibration(version, args.dir)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import argparse
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+from scipy.interpolate import splev, splprep
+from skimage.morphology import skeletonize
+
+# --- Configuration ---
+# Spline smoothing factor per skeleton pixel (scipy splprep `s` = this * n).
+# Larger values give a smoother centerline and a less noisy curvature.
+SPLINE_SMOOTHING = 2.0
+
+# Skeletonizing is the expensive step and its cost grows with the square of
+# the actuator width, so the mask is downscaled until the actuator is about
+# this many pixels wide first (the spline fit restores sub-pixel positions).
+# Set to None to always skeletonize at full resolution.
+SKELETON_TARGET_WIDTH = 8
+
+# Skeleton paths shorter than this many pixels are treated as "no centerline"
+MIN_SKELETON_PIXELS = 10
+
+# 8-connected neighbour offsets (dy, dx)
+_NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+def contour_mask(contour, pad=2):
+    """
+    Filled mask of a single contour, cropped to its bounding box.
+    Returns (mask, (x0, y0)) where (x0, y0) is the crop offset in the frame.
+    """
+    x, y, w, h = cv2.boundingRect(contour)
+    x0, y0 = x - pad, y - pad
+    mask = np.zeros((h + 2 * pad, w + 2 * pad), dtype=np.uint8)
+    cv2.drawContours(mask, [contour], -1, 255, -1, offset=(-x0, -y0))
+    return mask, (x0, y0)
+
+
+def _bfs_farthest(start, pixels):
+    """Breadth-first search over skeleton pixels; returns (farthest pixel, parent map)."""
+    parent = {start: None}
+    queue = deque([start])
+    last = start
+    while queue:
+        last = queue.popleft()
+        y, x = last
+        for dy, dx in _NEIGHBOURS:
+            nb = (y + dy, x + dx)
+            if nb in pixels and nb not in parent:
+                parent[nb] = last
+                queue.append(nb)
+    return last, parent
+
+
+def longest_skeleton_path(skeleton):
+    """
+    Ordered (x, y) pixels of the longest path through a skeleton image
+    (the tree diameter, found with two BFS passes), which drops short spurs.
+    """
+    ys, xs = np.nonzero(skeleton)
+    if len(ys) == 0:
+        return np.empty((0, 2))
+    pixels = set(zip(ys.tolist(), xs.tolist()))
+    end_a, _ = _bfs_farthest((int(ys[0]), int(xs[0])), pixels)
+    end_b, parent = _bfs_farthest(end_a, pixels)
+    path = []
+    node = end_b
+    while node is not None:
+        path.append((node[1], node[0]))
+        node = parent[node]
+    return np.array(path, dtype=np.float64)
+
+
+def _extend_to_boundary(path, mask, lookback=5):
+    """
+    The skeleton stops about half a width short of each end of the
+    actuator; extend both ends along their end tangent until leaving the mask.
+    """
+    h, w = mask.shape
+
+    def extension(end, inner):
+        direction = end - inner
+        norm = np.hypot(*direction)
+        if norm == 0:
+            return []
+        direction /= norm
+        points = []
+        p = end.copy()
+        while True:
+            p = p + direction
+            xi, yi = int(round(p[0])), int(round(p[1]))
+            if not (0 <= xi < w and 0 <= yi < h) or not mask[yi, xi]:
+                break
+            points.append(p.copy())
+        return points
+
+    k = min(lookback, len(path) - 1)
+    head = extension(path[0], path[k])
+    tail = extension(path[-1], path[-1 - k])
+    parts = [np.array(head[::-1]).reshape(-1, 2), path, np.array(tail).reshape(-1, 2)]
+    return np.vstack(parts)
+
+
+def estimate_width(mask):
+    """Width of a long strip-shaped blob, from area and perimeter (w ~ 2A/P)."""
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return 0.0
+    contour = max(contours, key=cv2.contourArea)
+    perimeter = cv2.arcLength(contour, True)
+    return 2.0 * cv2.contourArea(contour) / perimeter if perimeter > 0 else 0.0
+
+
+def centerline_from_mask(mask, num_points, smoothing=SPLINE_SMOOTHING,
+                         target_width=SKELETON_TARGET_WIDTH):
+    """
+    Skeletonizes a binary mask, fits a smoothing spline to the longest
+    skeleton path and resamples it to `num_points` arc-length-spaced points.
+    The mask is downscaled first if the blob is wider than `target_width`.
+
+    Returns None if no usable centerline is found, else a dict with
+        'points'     (num_points, 2) float (x, y), first point has the smaller y
+        'tangent'    (num_points,) tangent angle in radians
+        'curvature'  (num_points,) signed curvature in 1/px
+        'bend_angle' (num_points,) tangent angle relative to the first point, radians
+        'length'     arc length in px
+    """
+    scale = 1.0
+    if target_width:
+        width = estimate_width(mask)
+        if width > target_width:
+            scale = target_width / width
+            mask = cv2.resize(mask, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            mask = (mask >= 128).astype(np.uint8)
+
+    skeleton = skeletonize(mask > 0)
+    path = longest_skeleton_path(skeleton)
+    if len(path) < MIN_SKELETON_PIXELS:
+        return None
+    path = _extend_to_boundary(path, mask)
+    if scale != 1.0:
+        # Pixel centres of the small image back to full-resolution coordinates
+        path = (path + 0.5) / scale - 0.5
+    if path[0, 1] > path[-1, 1]:
+        path = path[::-1]
+
+    # Drop repeated points, splprep rejects zero-length segments
+    keep = np.concatenate(([True], np.any(np.diff(path, axis=0) != 0, axis=1)))
+    path = path[keep]
+    if len(path) <= 3:
+        return None
+
+    # The smoothing budget is per full-resolution pixel of path length
+    tck, _ = splprep([path[:, 0], path[:, 1]], s=smoothing * len(path) / scale ** 2, k=3)
+
+    # Evaluate densely, then pick points at equal arc length
+    dense_u = np.linspace(0.0, 1.0, max(4 * len(path), 4 * num_points))
+    dense = np.column_stack(splev(dense_u, tck))
+    seg = np.hypot(*np.diff(dense, axis=0).T)
+    s = np.concatenate(([0.0], np.cumsum(seg)))
+    u = np.interp(np.linspace(0.0, s[-1], num_points), s, dense_u)
+
+    x, y = splev(u, tck)
+    dx, dy = splev(u, tck, der=1)
+    ddx, ddy = splev(u, tck, der=2)
+    tangent = np.unwrap(np.arctan2(dy, dx))
+    curvature = (dx * ddy - dy * ddx) / np.power(dx * dx + dy * dy, 1.5)
+    return {
+        "points": np.column_stack((x, y)),
+        "tangent": tangent,
+        "curvature": curvature,
+        "bend_angle": tangent - tangent[0],
+        "length": float(s[-1]),
+    }
+
+
+def find_centerline(contour, num_points, smoothing=SPLINE_SMOOTHING):
+    """
+    Centerline of the actuator outlined by `contour` (as returned by
+    bend.find_actuator_and_axis), in frame coordinates. See centerline_from_mask.
+    """
+    mask, (x0, y0) = contour_mask(contour)
+    result = centerline_from_mask(mask, num_points, smoothing)
+    if result is not None:
+        result["points"] += (x0, y0)
+    return result
+
+
+# --- Benchmark ---
+
+def synthetic_arc_frame(width, height, length, thickness, curvature, color=(40, 200, 60)):
+    """
+    Frame with a thick arc of the given length (px) and constant curvature
+    (1/px) starting at the top centre and hanging downwards.
+    """
+    frame = np.full((height, width, 3), 40, dtype=np.uint8)
+    s = np.linspace(0.0, length, 400)
+    if abs(curvature) < 1e-9:
+        x, y = np.zeros_like(s), s
+    else:
+        r = 1.0 / curvature
+        x, y = r * (1 - np.cos(s / r)), r * np.sin(s / r)
+    pts = np.column_stack((x + width / 2, y + (height - length) / 2)).astype(np.int32)
+    cv2.polylines(frame, [pts], False, color, thickness)
+    return frame
+
+
+def benchmark(width=1280, height=720, num_points=50, repeats=30):
+    import bend
+
+    print(f"{width}x{height}, {num_points} points, {repeats} frames per case")
+    length = 0.7 * height
+    for curvature in (0.0, 0.5 / length, 1.0 / length, 2.0 / length):
+        frame = synthetic_arc_frame(width, height, length, 40, curvature)
+
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            contour, rect, endpoints = bend.find_actuator_and_axis(
+                frame, bend.lower_green, bend.upper_green, bend.MIN_CONTOUR_AREA)
+        t_rect = (time.perf_counter() - t0) / repeats
+
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            line = find_centerline(contour, num_points)
+        t_center = (time.perf_counter() - t0) / repeats
+
+        # Interior points only; the spline ends are less constrained
+        k_mid = np.median(line["curvature"][num_points // 5: -num_points // 5])
+        print(f"  curvature {curvature * 1000:6.3f}/kpx: rect {t_rect * 1000:6.2f} ms, "
+              f"+centerline {t_center * 1000:6.2f} ms, measured {k_mid * 1000:6.3f}/kpx, "
+              f"length {line['length']:.0f}/{length:.0f} px")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the centerline extraction against the rect-based axis.")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("-n", "--num-points", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=30)
+    args = parser.parse_args()
+    benchmark(args.width, args.height, args.num_points, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
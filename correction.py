@@ -3,6 +3,14 @@ b = -5.905816318 #intercept from linear regression for the distance
 
 import numpy as np
 
+import calibration
+
+# A calibration saved by calibration.py is only applied once selected with
+# use_calibration() (the --calibration flag of ESP_Correction.py and
+# fusion.py), so the result never depends on the working directory;
+# raw_data and m/b above are used otherwise, and for whatever the saved
+# one does not cover (e.g. no distance sessions yet).
+
 # Your raw calibration data
 # List of tuples: (Actual Weight (g), Measured ADC Value)
 raw_data = [
@@ -17,17 +25,26 @@ raw_data = [
 ]
 
 # --- Data Processing: Group and Average ---
-calibration_points = {} # Dictionary to store {weight: [list of ADC readings]}
+# The averaged, sorted calibration table is built once and reused; it is
+# rebuilt only when raw_data changes (see get_calibration).
+_calibration_cache = None # (raw_data snapshot, adc_cal_points, weight_cal_points)
+_saved_calibration = None  # Calibration selected with use_calibration(), or None
 
 
-def parse_weight_data():
+def parse_weight_data(data=None):
     """
     Parse the raw calibration data and return two arrays: adc_cal_points and weight_cal_points.
     
     adc_cal_points is an array of average ADC values from the calibration data, sorted by ADC value.
     weight_cal_points is an array of corresponding weights (in grams), sorted by ADC value.
+
+    Uses `data` (a list of (weight, adc) tuples) if given, else raw_data.
+    Prefer get_calibration(), which caches the result.
     """
-    for weight, adc in raw_data:
+    if data is None:
+        data = raw_data
+    calibration_points = {} # Dictionary to store {weight: [list of ADC readings]}
+    for weight, adc in data:
         if weight not in calibration_points:
             calibration_points[weight] = []
         calibration_points[weight].append(adc)
@@ -47,17 +64,79 @@ def parse_weight_data():
     weight_cal_points = np.array([weight for adc, weight in averaged_data])
     return adc_cal_points, weight_cal_points
 
+
+def get_calibration():
+    """
+    Returns the cached (adc_cal_points, weight_cal_points) lookup table,
+    rebuilding it only if raw_data has changed since it was built. The
+    arrays are read-only.
+    """
+    global _calibration_cache
+    snapshot = tuple(raw_data)
+    if _calibration_cache is None or _calibration_cache[0] != snapshot:
+        adc_cal, weight_cal = parse_weight_data(snapshot)
+        adc_cal.flags.writeable = False
+        weight_cal.flags.writeable = False
+        _calibration_cache = (snapshot, adc_cal, weight_cal)
+    return _calibration_cache[1], _calibration_cache[2]
+
+
+def set_calibration_data(data):
+    """Replace the raw (weight, adc) calibration pairs; the table is rebuilt on next use."""
+    global raw_data
+    raw_data = list(data)
+
+def saved_calibration():
+    """The saved Calibration in use, or None while the built-in tables are used."""
+    return _saved_calibration
+
+
+def use_calibration(version=None):
+    """
+    Applies a saved calibration version (None: the latest) from now on.
+    Returns it, or None if there is no such version (the built-in tables
+    stay in use).
+    """
+    global _saved_calibration
+    _saved_calibration = calibration.load_calibration(version)
+    return _saved_calibration
+
+
+def calibration_version():
+    """Version of the saved calibration in use (None: built-in tables)."""
+    return _saved_calibration.version if _saved_calibration is not None else None
+
+
+def calibration_choice(value):
+    """argparse type of the --calibration flags: 'latest' or a version number."""
+    return value if value == 'latest' else int(value)
+
+
+def select_calibration(choice):
+    """
+    Applies the --calibration choice of an entry point (None: built-in
+    tables, 'latest' or a version number) and prints which calibration is
+    in use. Returns False if the requested version does not exist.
+    """
+    if choice is not None and use_calibration(None if choice == 'latest' else choice) is None:
+        print(f"Error: calibration {choice} not found in {calibration.CALIBRATION_DIR}/")
+        return False
+    version = calibration_version()
+    print(f"Calibration: {f'version {version}' if version else 'built-in tables (correction.py)'}")
+    return True
+
+
 def estimate_weight_interpolation(adc_reading, adc_cal, weight_cal):
     """
     Estimates weight based on ADC reading using linear interpolation.
 
     Args:
-        adc_reading (float or int): The current ADC reading from the FSR.
+        adc_reading (float, int or array_like): The current ADC reading(s) from the FSR.
         adc_cal (np.array): Sorted array of ADC values from calibration.
         weight_cal (np.array): Corresponding array of weights from calibration.
 
     Returns:
-        float: Estimated weight in grams. Handles readings outside the
+        float or np.array: Estimated weight in grams. Handles readings outside the
                calibration range by returning the min/max calibrated weight.
     """
     estimated_weight = np.interp(adc_reading, adc_cal, weight_cal)
@@ -70,15 +149,18 @@ def correct_distance(distance):
 
     Parameters
     ----------
-    distance : float
+    distance : float or array_like
         The distance measured by the lidar in inches.
 
     Returns
     -------
-    float
-        The corrected distance in inches.
+    float or np.ndarray
+        The corrected distance in inches (NaN stays NaN).
     """
-    return m * distance + b
+    saved = saved_calibration()
+    if saved is not None and saved.has_distance:
+        return saved.distance(distance)
+    return m * np.asarray(distance, dtype=np.float64) + b
 
 
 
@@ -89,15 +171,18 @@ def correct_fsr(fsr):
 
     Parameters
     ----------
-    fsr : float
-        The FSR reading.
+    fsr : float or array_like
+        The FSR reading, or a whole array of readings (one np.interp call).
 
     Returns
     -------
-    float
+    float or np.ndarray
         The corrected FSR reading.
     """
-    adc_cal, weight_cal = parse_weight_data()
+    saved = saved_calibration()
+    if saved is not None and saved.has_fsr:
+        return saved.fsr(fsr)
+    adc_cal, weight_cal = get_calibration()
     return estimate_weight_interpolation(fsr, adc_cal, weight_cal)
 #     # Correct the FSR reading using the linear regression model
 
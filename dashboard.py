@@ -0,0 +1,402 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import binlog
+
+# --- Configuration ---
+# Samples kept in memory per run (all channels share one time axis). Older
+# samples are still reachable when the source is a .bin record log, which
+# is memory-mapped for history views instead of loaded.
+RING_SAMPLES = 1 << 20
+
+# Horizontal resolution of a plot: every view is reduced to the min and max
+# of this many time bins per channel, so a redraw costs the same for a
+# 10 s window as for a 10 h run
+PLOT_BINS = 600
+
+# Initial/live view: the last WINDOW_SEC seconds, refreshed every REFRESH_SEC
+WINDOW_SEC = 30.0
+REFRESH_SEC = 0.25
+
+# Seconds between checks of a followed file for new rows
+FOLLOW_INTERVAL_SEC = 0.2
+
+DASHBOARD_HOST = '127.0.0.1'
+DASHBOARD_PORT = 8050
+
+# Columns plotted from a followed file: everything except time stamps and frame numbers
+SKIP_COLUMNS = ('time', 'frame')
+
+
+class SeriesRing:
+    """
+    Fixed-size ring of samples (time in s, one value per channel) shared
+    between a producer thread and the web server. Times must not decrease;
+    a sample older than the newest one starts a new run (the ring is
+    cleared), e.g. after the ESP32 was reset.
+    """
+
+    def __init__(self, channels, capacity=RING_SAMPLES):
+        self.channels = list(channels)
+        self.capacity = capacity
+        self.t = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(self.channels)), dtype=np.float32)
+        self.count = 0
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    def append(self, t, values):
+        self.extend(np.array([t], dtype=np.float64), np.asarray(values, dtype=np.float64).reshape(1, -1))
+
+    def extend(self, t, values):
+        """Appends samples (n,) / (n, channels); the first sample out of order starts a new run."""
+        t = np.asarray(t, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        with self._lock:
+            latest = self.t[(self.count - 1) % self.capacity] if self.count else -np.inf
+            back = np.flatnonzero(np.diff(np.concatenate(([latest], t))) < 0)
+            if len(back):
+                # Keep only the newest run of this batch
+                t, values = t[back[-1]:], values[back[-1]:]
+                self.count = 0
+                self.runs += 1
+            t, values = t[-self.capacity:], values[-self.capacity:]
+            index = (self.count + np.arange(len(t))) % self.capacity
+            self.t[index] = t
+            self.values[index] = values
+            self.count += len(t)
+
+    def span(self):
+        """(first, last) time in the ring, or None when empty."""
+        with self._lock:
+            if not self.count:
+                return None
+            first = 0 if self.count <= self.capacity else self.count % self.capacity
+            return float(self.t[first]), float(self.t[(self.count - 1) % self.capacity])
+
+    def slice(self, start, stop):
+        """Copies of (t, values) with start <= t < stop, in time order."""
+        with self._lock:
+            end = self.count % self.capacity
+            if self.count <= self.capacity:
+                segments = [(0, self.count)]
+            else:
+                segments = [(end, self.capacity), (0, end)]
+            parts = []
+            # Each segment is sorted, so only the part in range is copied
+            for lo, hi in segments:
+                t = self.t[lo:hi]
+                a = lo + int(np.searchsorted(t, start, side='left'))
+                b = lo + int(np.searchsorted(t, stop, side='left'))
+                parts.append((self.t[a:b].copy(), self.values[a:b].copy()))
+        return (np.concatenate([p[0] for p in parts]),
+                np.concatenate([p[1] for p in parts]).reshape(-1, len(self.channels)))
+
+
+def minmax_decimate(t, values, start, stop, bins=PLOT_BINS):
+    """
+    Reduces sorted samples to the min and max of each of `bins` equal time
+    bins over [start, stop). values is (n,) or (n, channels). Returns
+    (bin start times, min, max) with NaN for empty bins; NaN samples are
+    ignored. Drawn as a band from min to max, the result looks like the
+    full-resolution trace (every spike is kept) at a fixed cost.
+    """
+    edges = np.linspace(start, stop, bins + 1)
+    values = np.asarray(values)
+    shape = (bins,) + values.shape[1:]
+    lo = np.full(shape, np.nan)
+    hi = np.full(shape, np.nan)
+    bounds = np.searchsorted(t, edges, side='left')
+    filled = np.flatnonzero(bounds[1:] > bounds[:-1])
+    if len(filled):
+        starts = bounds[filled]
+        # Empty bins have no samples, so each filled bin runs exactly to the
+        # start of the next filled one; cut off what lies past the last
+        values = values[:bounds[filled[-1] + 1]]
+        lo[filled] = np.fmin.reduceat(values, starts, axis=0)
+        hi[filled] = np.fmax.reduceat(values, starts, axis=0)
+    return edges[:-1], lo, hi
+
+
+def _columns(names):
+    """(time column index, seconds per unit, value column indices) of a log's header."""
+    lowered = [name.lower() for name in names]
+    time_index = next((i for i, name in enumerate(lowered) if 'time' in name), None)
+    if time_index is None:
+        raise ValueError(f"No time column in {names}")
+    scale = 1e-3 if 'ms' in lowered[time_index].split() else 1.0
+    value_index = [i for i, name in enumerate(lowered) if not any(skip in name for skip in SKIP_COLUMNS)]
+    return time_index, scale, value_index
+
+
+class FileFollower(threading.Thread):
+    """
+    Follows a CSV or .bin record log that is still being written (ESP32.py,
+    ESP_Correction.py -f, fusion.py, ...) and appends its new rows to a
+    SeriesRing. For a .bin log, history() decimates any time range straight
+    from the memory-mapped file.
+    """
+
+    def __init__(self, path, capacity=RING_SAMPLES, interval=FOLLOW_INTERVAL_SEC):
+        super().__init__(name="dashboard-follow", daemon=True)
+        self.path = path
+        self.interval = interval
+        self.binary = binlog.is_binlog(path)
+        if self.binary:
+            info, dtype, _ = binlog.read_header(path)
+            names = info['csv_header']
+            self._fields = dtype.names
+        else:
+            with open(path, newline='') as file:
+                names = next(csv.reader(file))
+            self._offset = None
+        self._time, self._scale, self._value_index = _columns(names)
+        self.ring = SeriesRing([names[i] for i in self._value_index], capacity)
+        self._read = 0
+        self._running = threading.Event()
+        self._running.set()
+
+    def _rows_bin(self):
+        records = binlog.open_log(self.path)
+        # Only what fits in the ring is read; older rows stay in the file for history()
+        new = records[max(self._read, len(records) - self.ring.capacity):]
+        self._read = len(records)
+        if not len(new):
+            return None
+        t = new[self._fields[self._time]] * self._scale
+        values = np.column_stack([new[self._fields[i]] for i in self._value_index])
+        return t, values
+
+    def _rows_csv(self):
+        with open(self.path, 'rb') as file:
+            if self._offset is None:
+                file.readline()
+                self._offset = file.tell()
+            file.seek(self._offset)
+            data = file.read()
+        # An unfinished last line is read again on the next poll
+        end = data.rfind(b'\n') + 1
+        self._offset += end
+        rows = []
+        for line in data[:end].decode('utf-8', errors='ignore').splitlines():
+            try:
+                rows.append([float(v) for v in line.split(',')])
+            except ValueError:
+                continue
+        if not rows:
+            return None
+        rows = np.array(rows, dtype=np.float64)
+        return rows[:, self._time] * self._scale, rows[:, self._value_index]
+
+    def poll(self):
+        rows = self._rows_bin() if self.binary else self._rows_csv()
+        if rows is not None:
+            self.ring.extend(*rows)
+
+    def run(self):
+        while self._running.is_set():
+            try:
+                self.poll()
+            except (OSError, ValueError) as e:
+                print(f"dashboard: cannot read {self.path}: {e}")
+            time.sleep(self.interval)
+
+    def history(self, start, stop, bins):
+        """Decimated (t, min, max) of [start, stop) from the whole file (.bin only)."""
+        if not self.binary:
+            return None
+        records = binlog.time_slice(binlog.open_log(self.path), start / self._scale, stop / self._scale,
+                                    column=self._fields[self._time])
+        t = records[self._fields[self._time]] * self._scale
+        values = np.column_stack([records[self._fields[i]] for i in self._value_index]).reshape(-1, len(self._value_index))
+        return minmax_decimate(t, values, start, stop, bins)
+
+    def stop(self):
+        self._running.clear()
+
+
+def _json_list(array):
+    return [None if np.isnan(v) else round(float(v), 4) for v in array]
+
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Bending actuator</title>
+<style>body{margin:0;font:13px sans-serif;background:#111;color:#ddd}#bar{padding:6px 10px}
+canvas{display:block;width:100%}button{margin-left:8px}</style></head>
+<body><div id="bar"><span id="info"></span><button id="live">live</button>
+<span style="float:right">wheel: zoom, drag: pan, double-click: live</span></div><div id="plots"></div>
+<script>
+const REFRESH = __REFRESH_MS__, WINDOW = __WINDOW_SEC__;
+let view = null, live = true, busy = false, drag = null, canvases = [];
+const colors = ['#4caf50', '#2196f3', '#ff9800', '#e91e63', '#9c27b0', '#00bcd4'];
+function panel(i) {
+  if (!canvases[i]) { const c = document.createElement('canvas'); c.height = 160;
+    document.getElementById('plots').appendChild(c); canvases[i] = c; hook(c); }
+  return canvases[i];
+}
+function draw(d) {
+  d.series.forEach((s, i) => {
+    const c = panel(i), ctx = c.getContext('2d'), w = c.width = c.clientWidth, h = c.height;
+    ctx.fillStyle = '#181818'; ctx.fillRect(0, 0, w, h);
+    const v = s.max.concat(s.min).filter(x => x !== null);
+    let lo = Math.min(...v), hi = Math.max(...v); if (!(hi > lo)) { lo -= 1; hi += 1; }
+    const x = k => (d.t[k] - d.start) / (d.stop - d.start) * w, y = val => h - 16 - (val - lo) / (hi - lo) * (h - 24);
+    ctx.strokeStyle = ctx.fillStyle = colors[i % colors.length];
+    for (let k = 0; k < d.t.length; k++) { if (s.min[k] === null) continue;
+      ctx.fillRect(x(k), y(s.max[k]), Math.max(1, w / d.t.length), Math.max(1, y(s.min[k]) - y(s.max[k]))); }
+    ctx.fillStyle = '#ddd';
+    ctx.fillText(`${s.name}  [${lo.toFixed(2)} .. ${hi.toFixed(2)}]`, 6, 12);
+    ctx.fillText(`${d.start.toFixed(2)} s`, 6, h - 3);
+    ctx.fillText(`${d.stop.toFixed(2)} s`, w - 60, h - 3);
+  });
+  document.getElementById('info').textContent =
+    `${live ? 'live' : 'history'} | ${(d.stop - d.start).toFixed(1)} s shown | ${d.samples} samples in ${d.source}`;
+}
+async function refresh() {
+  if (busy) return; busy = true;
+  try {
+    const bins = Math.min(2000, Math.max(100, Math.floor(document.body.clientWidth)));
+    const q = live ? `window=${view ? view[1] - view[0] : WINDOW}` : `start=${view[0]}&stop=${view[1]}`;
+    const d = await (await fetch(`data?${q}&bins=${bins}`)).json();
+    if (d.start !== null) { view = [d.start, d.stop]; draw(d); }
+  } finally { busy = false; }
+}
+function hook(c) {
+  c.addEventListener('wheel', e => { e.preventDefault(); if (!view) return;
+    const f = e.offsetX / c.clientWidth, t = view[0] + f * (view[1] - view[0]), s = e.deltaY > 0 ? 1.25 : 0.8;
+    view = [t - (t - view[0]) * s, t + (view[1] - t) * s]; live = false; refresh(); });
+  c.addEventListener('mousedown', e => { drag = [e.clientX, view]; });
+  c.addEventListener('dblclick', () => { live = true; refresh(); });
+}
+window.addEventListener('mouseup', () => { drag = null; });
+window.addEventListener('mousemove', e => { if (!drag || !drag[1]) return;
+  const dt = (drag[0] - e.clientX) / document.body.clientWidth * (drag[1][1] - drag[1][0]);
+  view = [drag[1][0] + dt, drag[1][1] + dt]; live = false; refresh(); });
+document.getElementById('live').onclick = () => { live = true; refresh(); };
+setInterval(() => { if (live) refresh(); }, REFRESH);
+refresh();
+</script></body></html>
+"""
+
+
+class DashboardServer(threading.Thread):
+    """
+    Serves the dashboard page at http://host:port/ and the decimated data
+    at /data?window=SEC or /data?start=S&stop=S (plus &bins=N). Live views
+    come from the ring; a range that starts before the ring comes from
+    `history(start, stop, bins)` when one is given (a .bin log).
+    """
+
+    def __init__(self, ring, port=DASHBOARD_PORT, host=DASHBOARD_HOST, history=None, source="live",
+                 window=WINDOW_SEC, refresh=REFRESH_SEC):
+        super().__init__(name="dashboard-http", daemon=True)
+        page = PAGE.replace("__REFRESH_MS__", str(int(refresh * 1000))).replace("__WINDOW_SEC__", str(window)).encode()
+        data = self.data
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path in ('', '/'):
+                    body, content_type = page, 'text/html; charset=utf-8'
+                elif url.path == '/data':
+                    try:
+                        query = {k: float(v[0]) for k, v in parse_qs(url.query).items()}
+                        if not set(query) <= {'window', 'start', 'stop', 'bins'}:
+                            raise ValueError(f"unknown parameter in {url.query!r}")
+                        if not np.isfinite(list(query.values())).all():
+                            raise ValueError(f"non-finite value in {url.query!r}")
+                    except ValueError as e:
+                        self.send_error(400, str(e))
+                        return
+                    body, content_type = json.dumps(data(**query)).encode(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.ring = ring
+        self.history = history
+        self.source = source
+        self.window = window
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}/"
+
+    def data(self, window=None, start=None, stop=None, bins=PLOT_BINS):
+        bins = int(min(max(bins, 1), 4 * PLOT_BINS))
+        span = self.ring.span()
+        empty = {"start": None, "stop": None, "t": [], "series": [], "samples": 0, "source": self.source}
+        if span is None:
+            return empty
+        if start is None or stop is None:
+            stop = span[1]
+            start = stop - (window or self.window)
+        if not stop > start:
+            return empty
+        decimated = self.history(start, stop, bins) if self.history and start < span[0] else None
+        if decimated is None:
+            decimated = minmax_decimate(*self.ring.slice(start, stop), start, stop, bins)
+        t, lo, hi = decimated
+        return {
+            "start": start,
+            "stop": stop,
+            "t": _json_list(t),
+            "series": [{"name": name, "min": _json_list(lo[:, i]), "max": _json_list(hi[:, i])}
+                       for i, name in enumerate(self.ring.channels)],
+            "samples": self.ring.count,
+            "source": self.source,
+        }
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Headless live plot of a log that is being written (CSV or .bin), served as a local web page.")
+    parser.add_argument("file", help="e.g. data_esp.csv, data_esp.bin, filtered_data.csv, fused_data.csv")
+    parser.add_argument("--port", type=int, default=DASHBOARD_PORT)
+    parser.add_argument("--host", default=DASHBOARD_HOST)
+    parser.add_argument("--window", type=float, default=WINDOW_SEC, help="seconds shown in the live view")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"Error: {args.file} does not exist")
+        return
+    follower = FileFollower(args.file)
+    follower.poll()
+    server = DashboardServer(follower.ring, args.port, args.host, history=follower.history,
+                             source=args.file, window=args.window)
+    follower.start()
+    server.start()
+    print(f"Dashboard at {server.url} ({', '.join(follower.ring.channels)}); Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        follower.stop()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+def axis_samples(endpoints, num_points):
+    """
+    Evenly spaced points along the axis between two endpoints, as floats.
+
+    Parameters
+    ----------
+    endpoints : array_like, shape (..., 2, 2)
+        Axis endpoints ((x1, y1), (x2, y2)); any leading dimensions (e.g.
+        frames) are kept.
+    num_points : int
+        Number of samples. With fewer than 2 the axis midpoint is returned.
+
+    Returns
+    -------
+    np.ndarray, shape (..., num_points, 2)
+    """
+    endpoints = np.asarray(endpoints, dtype=np.float64)
+    pt1 = endpoints[..., 0:1, :]
+    pt2 = endpoints[..., 1:2, :]
+    if num_points < 2:
+        return (pt1 + pt2) / 2
+    fractions = np.linspace(0.0, 1.0, num_points)[:, None]
+    return pt1 + fractions * (pt2 - pt1)
+
+
+def displacements(current, reference):
+    """
+    Euclidean distance between corresponding points.
+
+    current and reference have shape (..., n_points, 2) and broadcast
+    against each other, so one reference of shape (n_points, 2) can be
+    compared with a whole (n_frames, n_points, 2) stack.
+
+    Returns
+    -------
+    np.ndarray, shape (..., n_points)
+    """
+    diff = np.asarray(current, dtype=np.float64) - np.asarray(reference, dtype=np.float64)
+    return np.hypot(diff[..., 0], diff[..., 1])
+
+
+def deflection_summary(current, reference):
+    """
+    Per-point displacement plus average, maximum and tip deflection.
+
+    The tip is the last sample, i.e. the second axis endpoint. For a stack
+    of frames every summary value is an array with one entry per frame;
+    frames whose points are NaN (actuator not found) give NaN.
+
+    Returns
+    -------
+    dict with keys 'displacements', 'average', 'max', 'tip'
+    """
+    d = displacements(current, reference)
+    return {
+        "displacements": d,
+        "average": d.mean(axis=-1),
+        "max": d.max(axis=-1),
+        "tip": d[..., -1],
+    }
@@ -0,0 +1,371 @@
+import argparse
+import csv
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+import bend
+import correction
+import dashboard
+import ESP32
+from pipeline import FrameGrabber, ProcessingStage
+
+# --- Configuration ---
+OUTPUT_FILE = 'fused_data.csv'
+FUSED_HEADER = ['host time s', 'frame', 'avg deflection px', 'max deflection px', 'tip deflection px',
+                'distance mm', 'fsr (grams)', 'esp time ms']
+
+# Clock sync: number of recent (millis, host time) pairs used for the fit,
+# and the minimum time span before the drift (slope) is estimated at all
+CLOCK_WINDOW = 2000
+CLOCK_MIN_SPAN_SEC = 5.0
+
+# Sensor samples kept for interpolation (ring size; ~30 s at 2 kHz)
+SENSOR_RING_SAMPLES = 1 << 16
+
+# A frame waits at most this long for a sensor sample after its capture
+# time before it is emitted with extrapolated (held) sensor values
+MAX_MERGE_WAIT_SEC = 0.5
+
+PRINT_INTERVAL_SEC = 1.0
+
+# Fused columns shown by --dashboard
+DASHBOARD_COLUMNS = ['avg deflection px', 'tip deflection px', 'distance mm', 'fsr (grams)']
+
+
+class ClockSync:
+    """
+    Maps ESP32 millis() to the host monotonic clock.
+
+    Every received sample gives a pair (millis, host receive time). The
+    receive time is the true send time plus a non-negative transport delay,
+    so the slope (1 + drift) is fitted by least squares over a sliding
+    window and the offset is taken from the lower envelope, i.e. the pair
+    with the smallest delay. millis() wrap-around at 2**32 is unwrapped;
+    any other backwards jump means the board was reset, and the fit starts
+    over from the new run.
+    """
+
+    def __init__(self, window=CLOCK_WINDOW, min_span=CLOCK_MIN_SPAN_SEC):
+        self.min_span = min_span
+        self._pairs = deque(maxlen=window)
+        self._wraps = 0
+        self._last_millis = None
+        self.slope = 1e-3  # host seconds per ESP32 millisecond
+        self.offset = None
+        self.resets = 0
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        self._pairs.clear()
+        self._wraps = 0
+        self.slope = 1e-3
+        self.offset = None
+        self.resets += 1
+
+    def unwrap(self, millis):
+        """
+        Unwraps a sequence of millis() values (in arrival order). Returns
+        the unwrapped values and the index where the current run starts
+        (0 unless the board was reset within the sequence).
+        """
+        out = []
+        start = 0
+        for i, value in enumerate(millis):
+            value = int(value)
+            if self._last_millis is not None and value < self._last_millis:
+                if value < self._last_millis - 2 ** 31:
+                    self._wraps += 1
+                else:
+                    self._reset()
+                    start = i
+            self._last_millis = value
+            out.append(value + self._wraps * 2 ** 32)
+        return np.array(out, dtype=np.float64), start
+
+    def update(self, millis, host_time):
+        """
+        Adds the samples received together at host_time and refits. Only
+        the last of them is used as a pair: the earlier ones waited longer
+        in the buffers. Returns the unwrapped millis values of the current
+        run; samples before a reset in the same batch are dropped (they
+        belong to the old clock).
+        """
+        with self._lock:
+            millis, start = self.unwrap(millis)
+            millis = millis[start:]
+            self._pairs.append((millis[-1], host_time))
+            pairs = np.array(self._pairs, dtype=np.float64)
+            m, h = pairs[:, 0], pairs[:, 1]
+            if h[-1] - h[0] >= self.min_span:
+                self.slope = np.polyfit(m - m[0], h - h[0], 1)[0]
+            self.offset = float(np.min(h - self.slope * m))
+        return millis
+
+    @property
+    def drift_ppm(self):
+        return (self.slope * 1000.0 - 1.0) * 1e6
+
+    def to_host(self, millis):
+        """Host monotonic time (s) of unwrapped millis value(s)."""
+        with self._lock:
+            return self.offset + self.slope * np.asarray(millis, dtype=np.float64)
+
+
+class SampleRing:
+    """
+    Fixed-size ring of host-time-stamped samples (time in s, one float64
+    value per channel), interpolated with a binary search, so a lookup
+    costs the same however many samples are kept. Times are kept
+    non-decreasing: a time earlier than the newest one (the clock fit moved
+    the offset back slightly) is clamped to it.
+    """
+
+    def __init__(self, channels, capacity=SENSOR_RING_SAMPLES):
+        self.capacity = capacity
+        self.t = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, channels), dtype=np.float64)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def extend(self, t, values):
+        """Appends samples (n,) / (n, channels)."""
+        t = np.asarray(t, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(t), -1)
+        t, values = t[-self.capacity:], values[-self.capacity:]
+        with self._lock:
+            if self.count:
+                t = np.maximum.accumulate(np.concatenate(([self.t[(self.count - 1) % self.capacity]], t)))[1:]
+            index = (self.count + np.arange(len(t))) % self.capacity
+            self.t[index] = t
+            self.values[index] = values
+            self.count += len(t)
+
+    def latest_time(self):
+        with self._lock:
+            return float(self.t[(self.count - 1) % self.capacity]) if self.count else None
+
+    def interpolate(self, t):
+        """Values at time t, linear between the neighbouring samples and held at the ends; None when empty."""
+        with self._lock:
+            if not self.count:
+                return None
+            n = min(self.count, self.capacity)
+            first = self.count % self.capacity if self.count > self.capacity else 0
+            # The ring holds at most two sorted segments: [first, capacity) and [0, first)
+            if first and t >= self.t[0]:
+                k = self.capacity - first + int(np.searchsorted(self.t[:first], t, side='right'))
+            else:
+                k = int(np.searchsorted(self.t[first:first + n], t, side='right'))
+            if k == 0:
+                return self.values[first].copy()
+            if k == n:
+                return self.values[(first + n - 1) % self.capacity].copy()
+            i0, i1 = (first + k - 1) % self.capacity, (first + k) % self.capacity
+            w = (t - self.t[i0]) / (self.t[i1] - self.t[i0])
+            return self.values[i0] + w * (self.values[i1] - self.values[i0])
+
+
+class SensorStream:
+    """
+    Reads the ESP32 through ESP32.SerialAcquisition (any wire format,
+    reconnect with backoff), converts the samples to calibrated
+    distance/force and stamps them with the host clock through ClockSync.
+    Valid distances are kept in their own ring, so NaN (out of range or
+    FSR-only) samples are bridged by the neighbouring measurements.
+    """
+
+    def __init__(self, port, baudrate, serial_format=ESP32.SERIAL_FORMAT, capacity=SENSOR_RING_SAMPLES):
+        self.clock = ClockSync()
+        self.samples = 0
+        self._force = SampleRing(2, capacity)  # fsr g, esp millis
+        self._distance = SampleRing(1, capacity)  # distance mm
+        self.acquisition = ESP32.SerialAcquisition(port, baudrate, None, serial_format)
+        self.acquisition.listeners.append(self._add)
+
+    def _add(self, rows):
+        """Listener for every batch of (distance, fsr, millis) rows, on the parser thread."""
+        host_now = time.monotonic()
+        values = np.asarray(rows, dtype=np.float64).reshape(-1, 3)
+        millis = self.clock.update(values[:, 2], host_now)
+        values = values[len(values) - len(millis):]
+        host_times = self.clock.to_host(millis)
+        distance = correction.correct_distance(values[:, 0])
+        force = correction.correct_fsr(values[:, 1])
+        self._force.extend(host_times, np.column_stack((force, millis)))
+        valid = ~np.isnan(distance)
+        if valid.any():
+            self._distance.extend(host_times[valid], distance[valid])
+        self.samples += len(values)
+
+    def start(self):
+        self.acquisition.start()
+
+    @property
+    def connected(self):
+        return self.acquisition.connected
+
+    def latest_time(self):
+        return self._force.latest_time()
+
+    def interpolate(self, host_time):
+        """
+        (distance, force, esp millis) at host_time, linearly interpolated
+        between the neighbouring samples (held at the ends). NaN distances
+        are interpolated from the valid neighbours. Returns None if no
+        samples have arrived yet.
+        """
+        force = self._force.interpolate(host_time)
+        if force is None:
+            return None
+        distance = self._distance.interpolate(host_time)
+        return float(distance[0]) if distance is not None else np.nan, float(force[0]), float(force[1])
+
+    def stop(self):
+        self.acquisition.stop()
+
+
+class FusionService:
+    """
+    Runs the camera pipeline (bend.py stages) and the SensorStream
+    concurrently and emits one merged record per processed frame:
+    deflection at the frame's capture time with force and distance
+    interpolated to that same host time.
+    """
+
+    def __init__(self, cap, sensor, axis_mode=bend.AXIS_MODE, roi=bend.ROI_TRACKING,
+                 max_wait=MAX_MERGE_WAIT_SEC):
+        self.sensor = sensor
+        self.max_wait = max_wait
+        self.reference = bend.Reference()
+        self.tracker = bend.RoiTracker(bend.lower_green, bend.upper_green, bend.MIN_CONTOUR_AREA) if roi else None
+        self.axis_mode = axis_mode
+        self.grabber = FrameGrabber(cap)
+        self.processor = ProcessingStage(self.grabber.output, self._process)
+        self._pending = deque()
+        self.listeners = []
+
+    def _process(self, seq, t_capture, frame):
+        result = bend.process_frame(frame, self.reference, tracker=self.tracker, axis_mode=self.axis_mode)
+        result["seq"] = seq
+        result["t_capture"] = t_capture
+        result["frame"] = None  # not needed downstream; don't keep frames alive
+        if not self.reference.is_set and result["contour"] is not None:
+            self.reference.set(result["axis_endpoints"], bend.NUM_POINTS, result["samples"])
+            print("Reference state set from first detected frame.")
+        return result
+
+    def start(self):
+        self.sensor.start()
+        self.grabber.start()
+        self.processor.start()
+
+    def stop(self):
+        self.grabber.stop()
+        self.processor.stop()
+        self.sensor.stop()
+
+    def _merge(self, result):
+        sensor = self.sensor.interpolate(result["t_capture"])
+        distance, force, millis = sensor if sensor is not None else (np.nan, np.nan, np.nan)
+
+        def value(key):
+            return result[key] if result[key] is not None else np.nan
+
+        return [result["t_capture"], result["seq"], value("avg_deflection"), value("max_deflection"),
+                value("tip_deflection"), distance, force, millis]
+
+    def poll(self, timeout=0.1):
+        """
+        Takes the newest processed frame (if any) and returns the merged
+        records that are ready: frames whose capture time is covered by
+        sensor data, or that have waited longer than max_wait.
+        """
+        result = self.processor.output.get(timeout=timeout)
+        if result is not None:
+            self._pending.append(result)
+        ready = []
+        latest = self.sensor.latest_time()
+        now = time.monotonic()
+        while self._pending:
+            t = self._pending[0]["t_capture"]
+            if (latest is not None and latest >= t) or now - t >= self.max_wait:
+                record = self._merge(self._pending.popleft())
+                for listener in self.listeners:
+                    listener(record)
+                ready.append(record)
+            else:
+                break
+        return ready
+
+    @property
+    def finished(self):
+        return self.processor.output.closed and not self._pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Acquire camera deflection and ESP32 force/distance on one clock.")
+    parser.add_argument("--url", default=bend.ip_camera_url, help="camera stream URL or device index")
+    parser.add_argument("--port", default=ESP32.SERIAL_PORT)
+    parser.add_argument("--baud", type=int, default=ESP32.BAUD_RATE)
+    parser.add_argument("--format", choices=("text", "terse", "binary"), default=ESP32.SERIAL_FORMAT)
+    parser.add_argument("--axis", choices=("rect", "centerline"), default=bend.AXIS_MODE)
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE)
+    parser.add_argument("--calibration", type=correction.calibration_choice, metavar="VERSION|latest",
+                        help="apply a saved calibration (see calibration.py); default: the built-in tables")
+    parser.add_argument("--dashboard", type=int, nargs="?", const=dashboard.DASHBOARD_PORT, metavar="PORT",
+                        help="serve a live plot of deflection, distance and force on this local port")
+    args = parser.parse_args()
+    if not correction.select_calibration(args.calibration):
+        return
+
+    source = int(args.url) if args.url.isdigit() else args.url
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        print(f"Error: Could not open video stream at {args.url}")
+        return
+
+    sensor = SensorStream(args.port, args.baud, args.format)
+    service = FusionService(cap, sensor, axis_mode=args.axis)
+    server = None
+    if args.dashboard is not None:
+        ring = dashboard.SeriesRing(DASHBOARD_COLUMNS)
+        columns = [FUSED_HEADER.index(name) for name in DASHBOARD_COLUMNS]
+        service.listeners.append(lambda record: ring.append(record[0], [record[i] for i in columns]))
+        server = dashboard.DashboardServer(ring, args.dashboard, source=args.output)
+        server.start()
+        print(f"Dashboard at {server.url}")
+    written = 0
+    last_print = 0.0
+    with open(args.output, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(FUSED_HEADER)
+        service.start()
+        try:
+            while not service.finished:
+                records = service.poll()
+                if records:
+                    writer.writerows(records)
+                    written += len(records)
+                now = time.monotonic()
+                if records and now - last_print >= PRINT_INTERVAL_SEC:
+                    t, seq, avg, _, _, distance, force, _ = records[-1]
+                    print(f"frame {seq}: defl {avg:.2f} px, force {force:.1f} g, distance {distance:.1f} mm | "
+                          f"{written} records, clock drift {sensor.clock.drift_ppm:.0f} ppm"
+                          f"{'' if sensor.connected else ' (serial disconnected)'}")
+                    last_print = now
+        except KeyboardInterrupt:
+            print("\nStopping...")
+        finally:
+            service.stop()
+            cap.release()
+            if server is not None:
+                server.stop()
+    print(f"Wrote {written} fused records to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,100 +1,309 @@
+import argparse
+
 import cv2
 import numpy as np
 
+import bend
+import segmentation
+
 # --- Configuration ---
 # Replace with your IP camera's stream URL or use 0 for default webcam
 ip_camera_url = "http://192.168.50.118:8080/video" # Use 0 for default webcam
 
+# --- Auto-calibration ---
+# Frames whose colors go into the histograms (the actuator should stay in
+# place; lighting flicker and sensor noise over these frames widen the bounds)
+CALIBRATION_FRAMES = 30
+
+# Without a dragged box the actuator is the largest blob of pixels with at
+# least this saturation and value
+BLOB_MIN_SATURATION = 80
+BLOB_MIN_VALUE = 60
+
+# Pixels this close to the actuator region count as neither actuator nor background
+BACKGROUND_MARGIN_PX = 10
+
+# Every PIXEL_STRIDE-th row and column go into the histograms
+PIXEL_STRIDE = 2
+
+# Bin widths (H, S, V) of the joint HSV histograms. Candidate bounds lie on
+# bin edges, so their pixel counts are exact.
+HIST_BIN_WIDTH = (2, 4, 4)
+
+# Candidate lower/upper bound of every channel, as percentiles of the
+# actuator colors (see HsvHistograms.actuator); all combinations are evaluated
+LOWER_PERCENTILES = [0, 1, 2, 5, 10, 20, 30, 40, 50]
+UPPER_PERCENTILES = [50, 60, 70, 80, 90, 95, 98, 99, 100]
+
+# Score = (region pixels inside the bounds - BACKGROUND_WEIGHT * background
+# pixels inside) / region pixels. Of the candidates within SCORE_TOLERANCE
+# of the best, the widest is chosen (most tolerant to lighting changes).
+BACKGROUND_WEIGHT = 1.0
+SCORE_TOLERANCE = 0.01
+
+HSV_MAX = np.array([179, 255, 255])
+
+
 # --- Callback function for trackbars (does nothing, needed by createTrackbar) ---
 def nothing(x):
     pass
 
-# --- Setup ---
-# Create a window for the trackbars
-cv2.namedWindow("Trackbars")
-cv2.resizeWindow("Trackbars", 400, 300) # Adjust size as needed
 
-# Create trackbars for lower HSV bounds
-# Hue range is 0-179 in OpenCV
-cv2.createTrackbar("L - H", "Trackbars", 0, 179, nothing)
-cv2.createTrackbar("L - S", "Trackbars", 0, 255, nothing)
-cv2.createTrackbar("L - V", "Trackbars", 0, 255, nothing)
+def largest_saturated_blob(frame):
+    """Filled mask (uint8, 0/255) of the largest saturated, bright blob, or None."""
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, np.array([0, BLOB_MIN_SATURATION, BLOB_MIN_VALUE]), HSV_MAX)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((5, 5), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    blob = np.zeros_like(mask)
+    cv2.drawContours(blob, [max(contours, key=cv2.contourArea)], -1, 255, cv2.FILLED)
+    return blob
+
+
+def box_region(frame, box):
+    """
+    Actuator region inside a dragged box: the largest saturated blob in it,
+    or the whole box if there is none. (Compression ringing around the
+    actuator only shows up near it, so the bare box would pass it off as
+    actuator color.)
+    """
+    x, y, w, h = box
+    region = np.zeros(frame.shape[:2], dtype=np.uint8)
+    blob = largest_saturated_blob(frame[y:y + h, x:x + w])
+    region[y:y + h, x:x + w] = 255 if blob is None else blob
+    return region
+
+
+class HsvHistograms:
+    """
+    Joint HSV histograms (HIST_BIN_WIDTH bins) of the actuator region and
+    of the background, accumulated over several frames.
+    """
+
+    def __init__(self, region, stride=PIXEL_STRIDE, bin_width=HIST_BIN_WIDTH):
+        self.width = np.array(bin_width)
+        self.shape = tuple(int(n) for n in -(-(HSV_MAX + 1) // self.width))
+        margin = cv2.dilate(region, np.ones((2 * BACKGROUND_MARGIN_PX + 1,) * 2, np.uint8))
+        self.stride = stride
+        self.inside = region[::stride, ::stride] > 0
+        self.outside = margin[::stride, ::stride] == 0
+        self.region = np.zeros(int(np.prod(self.shape)), dtype=np.int64)
+        self.background = np.zeros_like(self.region)
+        self.frames = 0
+
+    def add(self, frame):
+        hsv = cv2.cvtColor(np.ascontiguousarray(frame[::self.stride, ::self.stride]), cv2.COLOR_BGR2HSV)
+        bins = hsv // self.width.astype(np.uint8)
+        index = (bins[..., 0].astype(np.int64) * self.shape[1] + bins[..., 1]) * self.shape[2] + bins[..., 2]
+        size = len(self.region)
+        self.region += np.bincount(index[self.inside], minlength=size)
+        self.background += np.bincount(index[self.outside], minlength=size)
+        self.frames += 1
+
+    def actuator(self):
+        """
+        Estimated actuator colors: the region histogram minus the background
+        scaled to the region's size, so background pixels inside a dragged
+        box cancel out.
+        """
+        scale = self.region.sum() / max(self.background.sum(), 1)
+        return np.clip(self.region - scale * self.background, 0, None)
+
+    def percentiles(self, channel, q):
+        """
+        Percentiles (in bins) of one channel of the estimated actuator
+        colors: the first bin whose cumulative count reaches q %; q=0 is
+        the first occupied bin and q=100 the last. Without any actuator
+        pixels the whole range is returned (q < 100 -> 0, q=100 -> last).
+        """
+        marginal = self.actuator().reshape(self.shape).sum(axis=tuple(a for a in range(3) if a != channel))
+        cumulative = np.cumsum(marginal)
+        q = np.asarray(q) / 100.0
+        if not cumulative[-1] > 0:
+            return np.where(q < 1, 0, self.shape[channel] - 1)
+        bins = np.where(q > 0, np.searchsorted(cumulative, q * cumulative[-1]),
+                        np.searchsorted(cumulative, 0, side='right'))
+        return np.minimum(bins, self.shape[channel] - 1)
+
 
-# Create trackbars for upper HSV bounds
-cv2.createTrackbar("U - H", "Trackbars", 179, 179, nothing)
-cv2.createTrackbar("U - S", "Trackbars", 255, 255, nothing)
-cv2.createTrackbar("U - V", "Trackbars", 255, 255, nothing)
+def _summed_volume(hist, shape):
+    """3-D cumulative sum with a zero border: any box count is 8 lookups."""
+    table = np.zeros(tuple(n + 1 for n in shape), dtype=np.int64)
+    table[1:, 1:, 1:] = hist.reshape(shape).cumsum(0).cumsum(1).cumsum(2)
+    return table
 
-# --- Video Capture ---
-cap = cv2.VideoCapture(ip_camera_url)
 
-if not cap.isOpened():
-    print(f"Error: Could not open video stream at {ip_camera_url}")
-    exit()
+def _box_counts(table, lo, hi):
+    """Pixels within the bin boxes [lo, hi) (arrays of shape (n, 3)), all at once."""
+    h0, s0, v0 = lo.T
+    h1, s1, v1 = hi.T
+    return (table[h1, s1, v1] - table[h0, s1, v1] - table[h1, s0, v1] - table[h1, s1, v0]
+            + table[h0, s0, v1] + table[h0, s1, v0] + table[h1, s0, v0] - table[h0, s0, v0])
 
-print("Video stream opened.")
-print("Adjust trackbars until the 'Mask' window shows your object in white.")
-print("Press 'q' to quit and print the final values.")
 
-lower_h, lower_s, lower_v = 0, 0, 0
-upper_h, upper_s, upper_v = 179, 255, 255
+def best_bounds(histograms):
+    """
+    Evaluates every combination of the percentile candidates per channel
+    (LOWER_PERCENTILES x UPPER_PERCENTILES, up to 9**6 boxes) with
+    vectorized summed-volume lookups and returns (lower, upper, stats).
+    """
+    lows = [np.unique(histograms.percentiles(c, LOWER_PERCENTILES)) for c in range(3)]
+    highs = [np.unique(histograms.percentiles(c, UPPER_PERCENTILES)) + 1 for c in range(3)]
+    grids = np.meshgrid(lows[0], highs[0], lows[1], highs[1], lows[2], highs[2], indexing='ij')
+    candidates = np.stack([g.ravel() for g in grids], axis=1)
+    lo, hi = candidates[:, 0::2], candidates[:, 1::2]
+    valid = np.all(hi > lo, axis=1)
+    lo, hi = lo[valid], hi[valid]
 
-while True:
+    region = _box_counts(_summed_volume(histograms.region, histograms.shape), lo, hi)
+    background = _box_counts(_summed_volume(histograms.background, histograms.shape), lo, hi)
+    recall = region / max(histograms.region.sum(), 1)
+    false_positive = background / max(histograms.background.sum(), 1)
+    score = (region - BACKGROUND_WEIGHT * background) / max(histograms.region.sum(), 1)
+    good = np.flatnonzero(score >= score.max() - SCORE_TOLERANCE)
+    best = good[np.argmax(np.prod(hi[good] - lo[good], axis=1))]
+
+    lower = lo[best] * histograms.width
+    upper = np.minimum(hi[best] * histograms.width - 1, HSV_MAX)
+    stats = {
+        "candidates": len(lo),
+        "frames": histograms.frames,
+        "region_in_bounds": float(recall[best]),
+        "background_in_bounds": float(false_positive[best]),
+    }
+    return lower, upper, stats
+
+
+def auto_calibrate(cap, frames=CALIBRATION_FRAMES, select=True):
+    """
+    Suggests HSV bounds for the actuator: the region is a box dragged over
+    it (select=True, falls back to the largest saturated blob if the
+    selection is cancelled) or the largest saturated blob. Returns (lower,
+    upper, stats) or None.
+    """
     ret, frame = cap.read()
     if not ret:
         print("Error: Failed to grab frame or stream ended.")
-        break
+        return None
+    region = None
+    if select:
+        box = cv2.selectROI("Select actuator", frame, showCrosshair=False)
+        cv2.destroyWindow("Select actuator")
+        if box[2] > 0 and box[3] > 0:
+            region = box_region(frame, box)
+    if region is None:
+        region = largest_saturated_blob(frame)
+        if region is None:
+            print("Error: No saturated blob found; drag a box over the actuator instead.")
+            return None
+        print("Using the largest saturated blob as the actuator region.")
 
-    # Optional: Resize frame for performance if needed
-    # frame = cv2.resize(frame, (640, 480))
+    histograms = HsvHistograms(region)
+    histograms.add(frame)
+    while histograms.frames < frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        histograms.add(frame)
+    return best_bounds(histograms)
+
+
+def manual_tune(cap, lower, upper):
+    """The trackbar tuner; returns the final (lower, upper) and whether 's' was pressed."""
+    # Create a window for the trackbars
+    cv2.namedWindow("Trackbars")
+    cv2.resizeWindow("Trackbars", 400, 300) # Adjust size as needed
+
+    # Create trackbars for lower and upper HSV bounds, starting at the current bounds
+    # Hue range is 0-179 in OpenCV
+    for name, value, maximum in zip(("L - H", "L - S", "L - V", "U - H", "U - S", "U - V"),
+                                    list(lower) + list(upper), list(HSV_MAX) * 2):
+        cv2.createTrackbar(name, "Trackbars", int(value), int(maximum), nothing)
+
+    print("Adjust trackbars until the 'Mask' window shows your object in white.")
+    print(f"Press 's' to save the bounds to {segmentation.HSV_CONFIG_FILE}, 'q' to quit and print the final values.")
+
+    saved = False
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            print("Error: Failed to grab frame or stream ended.")
+            break
+
+        # Get current positions from trackbars
+        lower = np.array([cv2.getTrackbarPos(name, "Trackbars") for name in ("L - H", "L - S", "L - V")])
+        upper = np.array([cv2.getTrackbarPos(name, "Trackbars") for name in ("U - H", "U - S", "U - V")])
+
+        # Create the mask using the bounds, the same way bend.py does
+        # (segmentation.METHOD; with "lut" the table is only rebuilt when a
+        # trackbar has changed)
+        mask = segmentation.color_mask(frame, lower, upper)
+
+        # --- Optional: Show the result of masking on the original image ---
+        result = cv2.bitwise_and(frame, frame, mask=mask)
+        cv2.imshow("Result (Mask Applied)", result)
+
+        # Display the original frame and the mask
+        cv2.imshow("Original Frame", frame)
+        cv2.imshow("Mask", mask)
+
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q'):
+            break
+        elif key == ord('s'):
+            segmentation.save_bounds(lower, upper, method="manual")
+            saved = True
+            print(f"Saved to {segmentation.HSV_CONFIG_FILE}")
+    return lower, upper, saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the HSV bounds of the actuator and save them for bend.py.")
+    parser.add_argument("--url", default=ip_camera_url, help="camera stream URL, device index or video file")
+    parser.add_argument("--auto", action="store_true",
+                        help="suggest bounds from the colors of a dragged box (or the largest saturated blob)")
+    parser.add_argument("--blob", action="store_true",
+                        help="with --auto: use the largest saturated blob without showing any window")
+    parser.add_argument("--frames", type=int, default=CALIBRATION_FRAMES, help="frames for --auto")
+    args = parser.parse_args()
+
+    # --- Video Capture ---
+    cap = cv2.VideoCapture(int(args.url) if args.url.isdigit() else args.url)
+    if not cap.isOpened():
+        print(f"Error: Could not open video stream at {args.url}")
+        return
+    print("Video stream opened.")
+
+    # bend.py's bounds (the saved ones, if any) are the starting point
+    lower, upper = bend.lower_green, bend.upper_green
+    if args.auto:
+        found = auto_calibrate(cap, args.frames, select=not args.blob)
+        if found is None:
+            cap.release()
+            return
+        lower, upper, stats = found
+        print(f"{stats['candidates']} candidate bounds over {stats['frames']} frames: "
+              f"{stats['region_in_bounds']:.1%} of the actuator region and "
+              f"{stats['background_in_bounds']:.2%} of the background inside the bounds")
+        segmentation.save_bounds(lower, upper, method="blob" if args.blob else "auto", **stats)
+        print(f"Saved to {segmentation.HSV_CONFIG_FILE}")
+        if not args.blob:
+            # Continue in the trackbar tuner to review (and fine-tune) the suggestion
+            lower, upper, _ = manual_tune(cap, lower, upper)
+    else:
+        lower, upper, _ = manual_tune(cap, lower, upper)
+
+    # --- Cleanup ---
+    cap.release()
+    cv2.destroyAllWindows()
+
+    # Print the final selected values
+    print("\n--- Final HSV Bounds ---")
+    print(f"lower_green = np.array([{lower[0]}, {lower[1]}, {lower[2]}])")
+    print(f"upper_green = np.array([{upper[0]}, {upper[1]}, {upper[2]}])")
 
-    # Convert the frame to HSV color space
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
 
-    # Get current positions from trackbars
-    lower_h = cv2.getTrackbarPos("L - H", "Trackbars")
-    lower_s = cv2.getTrackbarPos("L - S", "Trackbars")
-    lower_v = cv2.getTrackbarPos("L - V", "Trackbars")
-    upper_h = cv2.getTrackbarPos("U - H", "Trackbars")
-    upper_s = cv2.getTrackbarPos("U - S", "Trackbars")
-    upper_v = cv2.getTrackbarPos("U - V", "Trackbars")
-
-    # Create numpy arrays for the lower and upper bounds
-    lower_bound = np.array([lower_h, lower_s, lower_v])
-    upper_bound = np.array([upper_h, upper_s, upper_v])
-
-    # Create the mask using the bounds
-    mask = cv2.inRange(hsv, lower_bound, upper_bound)
-
-    # --- Optional: Apply morphological operations to clean the mask ---
-    # kernel = np.ones((5,5),np.uint8)
-    # mask = cv2.erode(mask, kernel, iterations = 1)
-    # mask = cv2.dilate(mask, kernel, iterations = 1)
-    # -----------------------------------------------------------------
-
-    # --- Optional: Show the result of masking on the original image ---
-    result = cv2.bitwise_and(frame, frame, mask=mask)
-    cv2.imshow("Result (Mask Applied)", result)
-    # -----------------------------------------------------------------
-
-    # Display the original frame and the mask
-    cv2.imshow("Original Frame", frame)
-    cv2.imshow("Mask", mask)
-
-    # Print current bounds to console (optional, but helpful during tuning)
-    # print(f"\rLower: [{lower_h:3d}, {lower_s:3d}, {lower_v:3d}], Upper: [{upper_h:3d}, {upper_s:3d}, {upper_v:3d}]", end="")
-
-
-    # Check for 'q' key press to quit
-    key = cv2.waitKey(1) & 0xFF
-    if key == ord('q'):
-        break
-
-# --- Cleanup ---
-cap.release()
-cv2.destroyAllWindows()
-
-# Print the final selected values
-print("\n--- Final HSV Bounds ---")
-print(f"lower_green = np.array([{lower_h}, {lower_s}, {lower_v}])")
-print(f"upper_green = np.array([{upper_h}, {upper_s}, {upper_v}])")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+# --- Configuration ---
+# Latencies kept per stage; percentiles and histograms cover this many of
+# the most recent samples
+METRICS_WINDOW = 600
+
+# Histogram bucket edges in ms (the last bucket is everything above)
+HISTOGRAM_EDGES_MS = [0, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+# Seconds between rewrites of the metrics file / overlay text
+METRICS_INTERVAL_SEC = 1.0
+OVERLAY_REFRESH_SEC = 0.5
+
+METRICS_FILE = 'bend_metrics.json'
+METRICS_HOST = '127.0.0.1'
+
+
+class _Ring:
+    """Fixed-size ring of the latest latencies (seconds) of one stage."""
+
+    def __init__(self, size):
+        self.values = np.zeros(size, dtype=np.float64)
+        self.count = 0
+
+    def add(self, value):
+        self.values[self.count % len(self.values)] = value
+        self.count += 1
+
+    def latest(self):
+        return self.values[:min(self.count, len(self.values))]
+
+
+class Metrics:
+    """
+    Per-stage latency timers for the live loop. Code under measurement
+    calls record(name, seconds), or chains lap() between consecutive
+    stages. Everything that takes a `metrics` argument skips timing
+    entirely when it is None, so with metrics off nothing is measured.
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.started = time.time()
+        self.pipeline = []  # StageStats whose counters go into the snapshot
+        self._rings = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            ring = self._rings.get(name)
+            if ring is None:
+                ring = self._rings[name] = _Ring(self.window)
+            ring.add(seconds)
+
+    def lap(self, name, start):
+        """Records the time since `start` (a perf_counter value) as `name`; returns now."""
+        now = time.perf_counter()
+        self.record(name, now - start)
+        return now
+
+    def snapshot(self):
+        """Plain dict of every stage's rolling latency statistics (ms) and histogram."""
+        with self._lock:
+            rings = {name: (ring.count, ring.latest().copy()) for name, ring in self._rings.items()}
+        stages = {}
+        for name, (count, values) in rings.items():
+            ms = values * 1000.0
+            if not len(ms):
+                continue
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            counts = np.histogram(ms, bins=HISTOGRAM_EDGES_MS + [np.inf])[0]
+            stages[name] = {
+                "count": count,
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "max_ms": float(ms.max()),
+                "histogram": counts.tolist(),
+            }
+        return {
+            "time": time.time(),
+            "uptime_s": time.time() - self.started,
+            "histogram_edges_ms": HISTOGRAM_EDGES_MS,
+            "stages": stages,
+            "pipeline": [stats.snapshot() for stats in self.pipeline],
+        }
+
+
+def format_lines(snapshot):
+    """Short text lines (one per stage plus the pipeline rates) for the overlay."""
+    lines = [f"{name}: p50 {s['p50_ms']:.1f} p95 {s['p95_ms']:.1f} max {s['max_ms']:.1f} ms"
+             for name, s in snapshot["stages"].items()]
+    lines += [f"{s['stage']}: {s['fps']:.1f} FPS, {s['dropped']} dropped" for s in snapshot["pipeline"]]
+    return lines
+
+
+class MetricsOverlay:
+    """Draws the metrics onto display frames; the text is refreshed every `refresh` s."""
+
+    def __init__(self, metrics, refresh=OVERLAY_REFRESH_SEC):
+        self.metrics = metrics
+        self.refresh = refresh
+        self.visible = True
+        self._lines = []
+        self._last = 0.0
+
+    def draw(self, frame):
+        if not self.visible:
+            return frame
+        now = time.monotonic()
+        if now - self._last >= self.refresh:
+            self._lines = format_lines(self.metrics.snapshot())
+            self._last = now
+        y = frame.shape[0] - 10 - 16 * (len(self._lines) - 1)
+        for line in self._lines:
+            cv2.putText(frame, line, (10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 3)
+            cv2.putText(frame, line, (10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
+            y += 16
+        return frame
+
+
+class MetricsWriter(threading.Thread):
+    """
+    Rewrites `path` with the JSON snapshot every `interval` seconds. The
+    file is replaced atomically, so readers never see a partial write.
+    """
+
+    def __init__(self, metrics, path=METRICS_FILE, interval=METRICS_INTERVAL_SEC):
+        super().__init__(name="metrics-writer", daemon=True)
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def write(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as file:
+            json.dump(self.metrics.snapshot(), file, indent=1)
+        os.replace(tmp, self.path)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        self._stopped.set()
+        self.join(timeout=2)
+        self.write()
+
+
+class MetricsServer(threading.Thread):
+    """Serves the JSON snapshot at http://host:port/metrics (local only by default)."""
+
+    def __init__(self, metrics, port, host=METRICS_HOST):
+        super().__init__(name="metrics-http", daemon=True)
+        snapshot = metrics.snapshot
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = json.dumps(snapshot()).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}/metrics"
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,269 @@
+import argparse
+import csv
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+import bend
+from pipeline import FrameGrabber, ProcessingStage
+from recording import ReplaySource, is_recording
+
+# --- Configuration ---
+OUTPUT_FILE = 'multi_deflection.csv'
+OUTPUT_HEADER = ['host time s', 'camera', 'actuator', 'frame', 'avg deflection px', 'max deflection px',
+                 'tip deflection px', 'tip angle deg']
+
+# Processing threads shared by all cameras (OpenCV releases the GIL, so
+# they run in parallel); 0 = one per CPU core
+WORKERS = 0
+
+# Identity tracking: a detection keeps the id of the track whose last
+# center is nearest, if it moved less than TRACK_MAX_JUMP times the
+# actuator length. A track that is not seen for TRACK_MAX_MISSED frames
+# is dropped (its id and reference are not reused).
+TRACK_MAX_JUMP = 0.5
+TRACK_MAX_MISSED = 30
+
+PRINT_INTERVAL_SEC = 1.0
+
+
+class ActuatorTracker:
+    """
+    Gives the actuators seen by one camera stable ids across frames by
+    matching rectangle centers to the previous frame (minimum total
+    distance, scipy linear_sum_assignment), and keeps one Reference per id.
+    """
+
+    def __init__(self, max_jump=TRACK_MAX_JUMP, max_missed=TRACK_MAX_MISSED):
+        self.max_jump = max_jump
+        self.max_missed = max_missed
+        self.tracks = {}  # id -> {"center", "length", "missed", "reference"}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def assign(self, detections):
+        """Returns the id of each (contour, rect, endpoints) detection, in order."""
+        centers = np.array([d[1][0] for d in detections], dtype=np.float64).reshape(-1, 2)
+        lengths = [max(d[1][1]) for d in detections]
+        ids = [None] * len(detections)
+        with self._lock:
+            track_ids = list(self.tracks)
+            if track_ids and len(detections):
+                previous = np.array([self.tracks[i]["center"] for i in track_ids])
+                cost = np.hypot(*(previous[:, None, :] - centers[None, :, :]).transpose(2, 0, 1))
+                for row, col in zip(*linear_sum_assignment(cost)):
+                    track = self.tracks[track_ids[row]]
+                    if cost[row, col] <= self.max_jump * max(track["length"], lengths[col]):
+                        ids[col] = track_ids[row]
+
+            seen = set()
+            for k, track_id in enumerate(ids):
+                if track_id is None:
+                    track_id = ids[k] = self._next_id
+                    self._next_id += 1
+                    self.tracks[track_id] = {"reference": bend.Reference()}
+                self.tracks[track_id].update(center=centers[k], length=lengths[k], missed=0)
+                seen.add(track_id)
+            for track_id in track_ids:
+                if track_id not in seen:
+                    self.tracks[track_id]["missed"] += 1
+                    if self.tracks[track_id]["missed"] > self.max_missed:
+                        del self.tracks[track_id]
+        return ids
+
+    def reference(self, track_id):
+        with self._lock:
+            track = self.tracks.get(track_id)
+            return track["reference"] if track else None
+
+    def references(self):
+        with self._lock:
+            return [track["reference"] for track in self.tracks.values()]
+
+
+class Camera:
+    """One video source with its capture and processing stages and actuator tracker."""
+
+    def __init__(self, index, url, pool, records, axis_mode, auto_reference):
+        self.index = index
+        self.url = url
+        if is_recording(url):
+            self.cap = ReplaySource(url)
+            lossless = True
+        else:
+            self.cap = cv2.VideoCapture(int(url) if url.isdigit() else url)
+            lossless = False
+        self.pool = pool
+        self.records = records
+        self.axis_mode = axis_mode
+        self.auto_reference = auto_reference
+        self.tracker = ActuatorTracker()
+        self.grabber = FrameGrabber(self.cap, lossless=lossless)
+        self.processor = ProcessingStage(self.grabber.output, self._submit, lossless=lossless)
+        self.processor.name = f"processing-{index}"
+        self.grabber.name = f"capture-{index}"
+
+    def _submit(self, seq, t_capture, frame):
+        # The stage thread waits for its own job, so frames of one camera are
+        # processed in order while the pool bounds the total concurrency
+        return self.pool.submit(self._process, seq, t_capture, frame).result()
+
+    def _process(self, seq, t_capture, frame):
+        detections = bend.find_actuators(frame, bend.lower_green, bend.upper_green, bend.MIN_CONTOUR_AREA)
+        ids = self.tracker.assign(detections)
+        actuators = []
+        for track_id, (contour, rect, endpoints) in zip(ids, detections):
+            reference = self.tracker.reference(track_id)
+            result = bend.measure_detection(frame, contour, rect, endpoints, reference,
+                                            axis_mode=self.axis_mode)
+            if result["contour"] is None:
+                continue
+            if self.auto_reference and not reference.is_set:
+                reference.set(result["axis_endpoints"], bend.NUM_POINTS, result["samples"])
+                print(f"camera {self.index} actuator {track_id}: reference set")
+            elif result["avg_deflection"] is not None:
+                angle = math.degrees(result["bend_angle"][-1]) if result["bend_angle"] is not None else np.nan
+                self.records.put([t_capture, self.index, track_id, seq, result["avg_deflection"],
+                                  result["max_deflection"], result["tip_deflection"], angle])
+            result["id"] = track_id
+            actuators.append(result)
+        return {"frame": frame, "seq": seq, "t_capture": t_capture, "actuators": actuators}
+
+    def start(self):
+        self.grabber.start()
+        self.processor.start()
+
+    def stop(self):
+        self.grabber.stop()
+        self.processor.stop()
+        self.grabber.join(timeout=2)
+        self.processor.join(timeout=2)
+        self.cap.release()
+
+    def set_references(self, results):
+        """Sets the reference of every actuator in `results` (the last displayed frame)."""
+        for actuator in results["actuators"]:
+            reference = self.tracker.reference(actuator["id"])
+            if reference is not None:
+                reference.set(actuator["axis_endpoints"], bend.NUM_POINTS, actuator["samples"])
+        return len(results["actuators"])
+
+    def reset_references(self):
+        for reference in self.tracker.references():
+            reference.reset()
+
+
+def draw_actuators(results, camera):
+    """Contour, axis and id/deflection label of every tracked actuator."""
+    frame = results["frame"].copy()
+    for actuator in results["actuators"]:
+        cv2.drawContours(frame, [actuator["contour"]], -1, (0, 255, 0), 1)
+        cv2.polylines(frame, [np.array(actuator["points"], dtype=np.int32)], False, (0, 0, 255), 2)
+        reference = camera.tracker.reference(actuator["id"])
+        if reference is not None and reference.is_set:
+            _, reference_points, _ = reference.get()
+            cv2.polylines(frame, [np.array(reference_points, dtype=np.int32)], False, (0, 255, 255), 1)
+        label = f"#{actuator['id']}"
+        if actuator["tip_deflection"] is not None:
+            label += f" tip {actuator['tip_deflection']:.1f} px"
+        x, y = actuator["points"][0]
+        cv2.putText(frame, label, (x + 10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    cv2.putText(frame, f"{len(results['actuators'])} actuators. 's' sets all references, 'r' resets",
+                (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Track every actuator seen by one or more cameras and write one merged deflection stream.")
+    parser.add_argument("--url", nargs="+", default=[bend.ip_camera_url],
+                        help="camera stream URLs / device indices / recordings")
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE)
+    parser.add_argument("-j", "--workers", type=int, default=WORKERS, help="shared processing threads")
+    parser.add_argument("--axis", choices=("rect", "centerline"), default=bend.AXIS_MODE)
+    parser.add_argument("--no-display", action="store_true",
+                        help="run without windows; each actuator's first detection becomes its reference")
+    args = parser.parse_args()
+
+    records = queue.Queue()
+    pool = ThreadPoolExecutor(max_workers=args.workers or os.cpu_count(), thread_name_prefix="worker")
+    cameras = []
+    for index, url in enumerate(args.url):
+        camera = Camera(index, url, pool, records, args.axis, auto_reference=args.no_display)
+        if not camera.cap.isOpened():
+            print(f"Error: Could not open video stream at {url}")
+            return
+        cameras.append(camera)
+    for camera in cameras:
+        camera.start()
+    if not args.no_display:
+        print("Press 's' to set the references of all visible actuators, 'r' to reset them, 'q' to quit.")
+
+    written = 0
+    last_print = 0.0
+    shown = {}
+    with open(args.output, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(OUTPUT_HEADER)
+        try:
+            while not all(camera.processor.output.closed for camera in cameras) or not records.empty():
+                rows = []
+                try:
+                    rows.append(records.get(timeout=0.005))
+                    while True:
+                        rows.append(records.get_nowait())
+                except queue.Empty:
+                    pass
+                if rows:
+                    writer.writerows(rows)
+                    written += len(rows)
+
+                if not args.no_display:
+                    for camera in cameras:
+                        results = camera.processor.output.get(timeout=0)
+                        if results is not None:
+                            shown[camera.index] = results
+                            cv2.imshow(f"Camera {camera.index}", draw_actuators(results, camera))
+                    key = cv2.waitKey(1) & 0xFF
+                    if key == ord('q'):
+                        print("Quitting...")
+                        break
+                    elif key == ord('s'):
+                        count = sum(camera.set_references(shown[camera.index])
+                                    for camera in cameras if camera.index in shown)
+                        print(f"Reference set for {count} actuators.")
+                    elif key == ord('r'):
+                        for camera in cameras:
+                            camera.reset_references()
+                        print("References reset.")
+                else:
+                    for camera in cameras:
+                        camera.processor.output.get(timeout=0)
+
+                now = time.monotonic()
+                if rows and now - last_print >= PRINT_INTERVAL_SEC:
+                    tracked = ", ".join(f"camera {c.index}: {len(c.tracker.tracks)}" for c in cameras)
+                    print(f"{written} records | actuators {tracked}")
+                    last_print = now
+        except KeyboardInterrupt:
+            print("\nQuitting...")
+        finally:
+            for camera in cameras:
+                camera.stop()
+            pool.shutdown(wait=False, cancel_futures=True)
+            if not args.no_display:
+                cv2.destroyAllWindows()
+    for camera in cameras:
+        print(f"camera {camera.index}: {camera.grabber.stats.summary()}; {camera.processor.stats.summary()}")
+    print(f"Wrote {written} records to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
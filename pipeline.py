@@ -0,0 +1,223 @@
+import threading
+import time
+
+
+class StageStats:
+    """
+    Counters for one pipeline stage: items handled, items dropped,
+    per-item latency and effective FPS (over a sliding window). If
+    `metrics` (see metrics.py) is set, every latency is also recorded
+    there under the stage name.
+    """
+
+    def __init__(self, name, fps_window=2.0):
+        self.name = name
+        self.fps_window = fps_window
+        self.count = 0
+        self.dropped = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.fps = 0.0
+        self.metrics = None
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        """Record one handled item that took `latency` seconds."""
+        with self._lock:
+            self.count += 1
+            self.last_latency = latency
+            self.total_latency += latency
+            if latency > self.max_latency:
+                self.max_latency = latency
+            self._window_count += 1
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            if elapsed >= self.fps_window:
+                self.fps = self._window_count / elapsed
+                self._window_start = now
+                self._window_count = 0
+        if self.metrics is not None:
+            self.metrics.record(self.name, latency)
+
+    def drop(self, n=1):
+        """Count `n` items that were discarded before this stage saw them."""
+        with self._lock:
+            self.dropped += n
+
+    def snapshot(self):
+        """Return a plain dict copy of the counters."""
+        with self._lock:
+            mean = self.total_latency / self.count if self.count else 0.0
+            fps = self.fps
+            if not fps:
+                # First window not complete yet: report the partial rate
+                elapsed = time.monotonic() - self._window_start
+                fps = self._window_count / elapsed if elapsed > 0 else 0.0
+            return {
+                "stage": self.name,
+                "count": self.count,
+                "dropped": self.dropped,
+                "fps": fps,
+                "latency_ms": self.last_latency * 1000.0,
+                "mean_latency_ms": mean * 1000.0,
+                "max_latency_ms": self.max_latency * 1000.0,
+            }
+
+    def summary(self):
+        s = self.snapshot()
+        return (f"{s['stage']}: {s['count']} done, {s['dropped']} dropped, "
+                f"{s['fps']:.1f} FPS, latency {s['mean_latency_ms']:.1f} ms "
+                f"(max {s['max_latency_ms']:.1f} ms)")
+
+
+class LatestSlot:
+    """
+    Single-item mailbox between two stages. put() always replaces the
+    held item, so a slow consumer only ever sees the newest one; items
+    overwritten before being taken are counted as dropped.
+    """
+
+    def __init__(self, stats=None):
+        self.stats = stats
+        self._item = None
+        self._fresh = False
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item, block=False, timeout=None):
+        """
+        Publishes `item`. With block=True it first waits (up to `timeout`)
+        for the previous item to be taken, so nothing is dropped; returns
+        False if that wait timed out and the item was not published.
+        """
+        with self._cond:
+            if block and not self._cond.wait_for(lambda: not self._fresh or self._closed, timeout):
+                return False
+            if self._fresh and self.stats is not None:
+                self.stats.drop()
+            self._item = item
+            self._fresh = True
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Wait for an item that has not been taken yet and return it.
+        Returns None on timeout or once the slot is closed and empty.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._fresh or self._closed, timeout):
+                return None
+            if not self._fresh:
+                return None
+            self._fresh = False
+            self._cond.notify_all()
+            return self._item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+def _put_lossless(slot, item, running):
+    """Blocking put that gives up once `running` is cleared."""
+    while running.is_set():
+        if slot.put(item, block=True, timeout=0.5):
+            return
+
+
+class FrameGrabber(threading.Thread):
+    """
+    Capture stage: calls cap.read() in a tight loop on its own thread and
+    publishes (seq, capture_time, frame) to a LatestSlot so stale frames
+    are dropped instead of piling up in the stream buffer.
+
+    With lossless=True it waits for every frame to be taken instead (for
+    recorded input, where nothing should be skipped). on_frame(frame,
+    capture_time), if given, sees every frame on the capture thread, e.g.
+    to record it.
+    """
+
+    def __init__(self, cap, stats=None, lossless=False, on_frame=None):
+        super().__init__(name="capture", daemon=True)
+        self.cap = cap
+        self.stats = stats or StageStats("capture")
+        self.output = LatestSlot(self.stats)
+        self.lossless = lossless
+        self.on_frame = on_frame
+        self.error = None
+        self._running = threading.Event()
+        self._running.set()
+
+    def run(self):
+        seq = 0
+        try:
+            while self._running.is_set():
+                t0 = time.monotonic()
+                ret, frame = self.cap.read()
+                t1 = time.monotonic()
+                if not ret:
+                    self.error = "Failed to grab frame or stream ended."
+                    break
+                self.stats.record(t1 - t0)
+                if self.on_frame is not None:
+                    self.on_frame(frame, t1)
+                if self.lossless:
+                    _put_lossless(self.output, (seq, t1, frame), self._running)
+                else:
+                    self.output.put((seq, t1, frame))
+                seq += 1
+        finally:
+            self.output.close()
+
+    def stop(self):
+        self._running.clear()
+
+
+class ProcessingStage(threading.Thread):
+    """
+    Processing stage: takes the newest frame from `source`, runs
+    process_fn(seq, capture_time, frame) on it and publishes the result
+    to its own LatestSlot for the display stage (or any other consumer).
+    With lossless=True every result is handed over (see FrameGrabber).
+    """
+
+    def __init__(self, source, process_fn, stats=None, lossless=False):
+        super().__init__(name="processing", daemon=True)
+        self.source = source
+        self.process_fn = process_fn
+        self.lossless = lossless
+        self.stats = stats or StageStats("processing")
+        self.output = LatestSlot(StageStats("display"))
+        self._running = threading.Event()
+        self._running.set()
+
+    def run(self):
+        try:
+            while self._running.is_set():
+                item = self.source.get(timeout=0.5)
+                if item is None:
+                    if self.source.closed:
+                        break
+                    continue
+                seq, t_capture, frame = item
+                t0 = time.monotonic()
+                result = self.process_fn(seq, t_capture, frame)
+                self.stats.record(time.monotonic() - t0)
+                if self.lossless:
+                    _put_lossless(self.output, result, self._running)
+                else:
+                    self.output.put(result)
+        finally:
+            self.output.close()
+
+    def stop(self):
+        self._running.clear()
@@ -0,0 +1,244 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import binlog
+
+# --- Recording Layout ---
+# <name>.frames  encoded frames (CODEC, kept in the index metadata), back to back
+# <name>.idx     binary record log (binlog.py) with one INDEX_DTYPE record per
+#                frame: byte offset and size in the .frames, host capture time
+DATA_EXTENSION = '.frames'
+INDEX_EXTENSION = '.idx'
+# Data file of recordings made before the frames could be PNG; still replayed
+LEGACY_DATA_EXTENSION = '.mjpg'
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('size', '<u4'), ('host_time', '<f8')])
+
+# Encoding of recorded frames: '.png' (lossless, PNG_COMPRESSION 0-9) or
+# '.jpg' (JPEG_QUALITY; smaller, but a replay then differs from the frames
+# the live analysis saw). PNG is the default so replays reproduce live runs
+# exactly, e.g. when tuning the HSV thresholds on a recording.
+CODEC = '.png'
+PNG_COMPRESSION = 1
+JPEG_QUALITY = 95
+
+# Frames encoded in parallel (PNG takes ~20-40 ms per 720p frame); they are
+# still written in capture order
+ENCODE_THREADS = 3
+
+# Frames waiting to be encoded; beyond this, frames are dropped (and counted)
+# rather than stalling the capture thread
+RECORD_QUEUE_SIZE = 120
+
+
+def recording_paths(name, existing=False):
+    """
+    (data file, index file) of a recording; `name` may carry any of the
+    extensions. With existing=True, an older recording's .mjpg data file is
+    returned when there is no .frames file.
+    """
+    root, ext = os.path.splitext(name)
+    if ext.lower() not in (DATA_EXTENSION, INDEX_EXTENSION, LEGACY_DATA_EXTENSION):
+        root = name
+    data_path = root + DATA_EXTENSION
+    if existing and not os.path.isfile(data_path) and os.path.isfile(root + LEGACY_DATA_EXTENSION):
+        data_path = root + LEGACY_DATA_EXTENSION
+    return data_path, root + INDEX_EXTENSION
+
+
+def is_recording(path):
+    return os.path.isfile(recording_paths(path)[1])
+
+
+class Recorder(threading.Thread):
+    """
+    Saves frames with their host capture time. submit() only enqueues, so it
+    is cheap enough to call from the capture thread; frames are encoded on
+    `encode_threads` workers and written in order by this thread.
+    """
+
+    def __init__(self, name, codec=CODEC, quality=JPEG_QUALITY, queue_size=RECORD_QUEUE_SIZE,
+                 encode_threads=ENCODE_THREADS):
+        super().__init__(name="recorder", daemon=True)
+        self.data_path, self.index_path = recording_paths(name)
+        self.codec = codec
+        if codec == '.jpg':
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        else:
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]
+        self.encode_threads = encode_threads
+        self.frames = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._data = open(self.data_path, 'wb')
+        self._index = binlog.RecordWriter(self.index_path, INDEX_DTYPE, metadata={'codec': codec})
+        self._offset = 0
+
+    def submit(self, frame, host_time):
+        try:
+            self._queue.put_nowait((frame, host_time))
+        except queue.Full:
+            self.dropped += 1
+
+    def _encode(self, frame):
+        ok, encoded = cv2.imencode(self.codec, frame, self.params)
+        return encoded.tobytes() if ok else None
+
+    def _write(self, encoding, host_time):
+        data = encoding.result()
+        if data is None:
+            self.dropped += 1
+            return
+        self._data.write(data)
+        self._index.write([(self._offset, len(data), host_time)])
+        self._offset += len(data)
+        self.frames += 1
+
+    def run(self):
+        pending = deque()  # (encoding future, host time), in capture order
+        with ThreadPoolExecutor(max_workers=self.encode_threads, thread_name_prefix="encoder") as pool:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                frame, host_time = item
+                pending.append((pool.submit(self._encode, frame), host_time))
+                while len(pending) > self.encode_threads:
+                    self._write(*pending.popleft())
+            while pending:
+                self._write(*pending.popleft())
+        self._data.close()
+        self._index.close()
+
+    def close(self):
+        """Writes out everything still queued and closes the files."""
+        self._queue.put(None)
+        self.join()
+
+
+class ReplaySource:
+    """
+    Plays a recording back through the cv2.VideoCapture interface
+    (isOpened/read/get/set/release), so it can replace the live camera.
+    pace='max' returns frames as fast as they are decoded; pace='realtime'
+    waits to reproduce the recorded frame timing (scaled by `speed`).
+    The recorded host time of the last frame read is in `timestamp`.
+    """
+
+    def __init__(self, name, pace='max', speed=1.0):
+        data_path, index_path = recording_paths(name, existing=True)
+        self.index = binlog.open_log(index_path)
+        self._data = open(data_path, 'rb')
+        self.pace = pace
+        self.speed = speed
+        self.position = 0
+        self.timestamp = None
+        self._clock_start = None
+
+    def isOpened(self):
+        return self._data is not None
+
+    def __len__(self):
+        return len(self.index)
+
+    def read(self):
+        if self._data is None or self.position >= len(self.index):
+            return False, None
+        offset, size, host_time = self.index[self.position].tolist()
+        if self.pace == 'realtime':
+            if self._clock_start is None:
+                self._clock_start = (time.monotonic(), host_time)
+            due = self._clock_start[0] + (host_time - self._clock_start[1]) / self.speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self._data.seek(offset)
+        frame = cv2.imdecode(np.frombuffer(self._data.read(size), dtype=np.uint8), cv2.IMREAD_COLOR)
+        self.position += 1
+        self.timestamp = host_time
+        return frame is not None, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.index))
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        if prop == cv2.CAP_PROP_FPS and len(self.index) > 1:
+            times = self.index['host_time']
+            return float((len(times) - 1) / (times[-1] - times[0]))
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.position = int(min(max(value, 0), len(self.index)))
+            self._clock_start = None
+            return True
+        return False
+
+    def seek_time(self, host_time):
+        """Positions on the first frame captured at or after host_time."""
+        self.set(cv2.CAP_PROP_POS_FRAMES, np.searchsorted(self.index['host_time'], host_time))
+
+    def release(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+
+def record(url, name, duration=None, codec=CODEC):
+    """Records a stream straight to disk (no processing) until Ctrl+C or `duration` s."""
+    source = int(url) if str(url).isdigit() else url
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        print(f"Error: Could not open video stream at {url}")
+        return
+    recorder = Recorder(name, codec=codec)
+    recorder.start()
+    start = time.monotonic()
+    try:
+        while duration is None or time.monotonic() - start < duration:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            recorder.submit(frame, time.monotonic())
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        cap.release()
+        recorder.close()
+    print(f"Recorded {recorder.frames} frames ({recorder.dropped} dropped) to {recorder.data_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record a camera stream with host timestamps, or inspect a recording.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('record')
+    p.add_argument('name', help="output name (writes <name>.frames and <name>.idx)")
+    p.add_argument('--url', default='0')
+    p.add_argument('--duration', type=float)
+    p.add_argument('--codec', choices=('.jpg', '.png'), default=CODEC)
+    p = sub.add_parser('info')
+    p.add_argument('name')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.url, args.name, args.duration, args.codec)
+        return
+    replay = ReplaySource(args.name)
+    index = replay.index
+    print(f"{len(index)} frames, {index['size'].sum() / 1e6:.1f} MB")
+    if len(index) > 1:
+        span = index['host_time'][-1] - index['host_time'][0]
+        print(f"{span:.2f} s, {replay.get(cv2.CAP_PROP_FPS):.1f} FPS average")
+    replay.release()
+
+
+if __name__ == "__main__":
+    main()
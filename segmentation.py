@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# --- Configuration ---
+# How color_mask segments a frame:
+#   "hsv" cv2.cvtColor to HSV, then cv2.inRange (OpenCV's SIMD kernels)
+#   "lut" one lookup in a 3-D table over all 2**24 BGR colors, built once
+#         per threshold setting; no HSV conversion per frame. The mask is
+#         identical to "hsv". Only the 16 MB table stays in memory (a
+#         rebuild briefly peaks at ~100 MB); the per-pixel gather
+#         is memory-bound, so on machines where OpenCV's conversion is
+#         vectorized "hsv" is usually faster (see bench_vision.py).
+METHOD = "hsv"
+
+# Threshold bounds written by `python hsv_tuner.py` and loaded by bend.py
+# at startup (the defaults in bend.py apply while the file does not exist)
+HSV_CONFIG_FILE = 'hsv_config.json'
+
+_lock = threading.Lock()
+_lut_cache = {"bounds": None, "lut": None}
+
+
+def _hsv_of_all_colors():
+    """
+    HSV of every 24-bit BGR color, as a 4096x4096 image indexed like the
+    LUT (48 MB; built for each table and not kept).
+    """
+    # Axes (r, g, b), so the flat position is b | g << 8 | r << 16
+    levels = np.arange(256, dtype=np.uint8)
+    bgr = np.empty((256, 256, 256, 3), dtype=np.uint8)
+    bgr[..., 0] = levels
+    bgr[..., 1] = levels[:, None]
+    bgr[..., 2] = levels[:, None, None]
+    return cv2.cvtColor(bgr.reshape(4096, 4096, 3), cv2.COLOR_BGR2HSV)
+
+
+def color_lut(lower_color, upper_color):
+    """
+    Flat uint8 table with 255 for every BGR color whose HSV lies within the
+    bounds, indexed by b | g << 8 | r << 16. The table of the last bounds
+    used is cached, so only a threshold change rebuilds it.
+    """
+    bounds = (tuple(int(v) for v in lower_color), tuple(int(v) for v in upper_color))
+    with _lock:
+        if _lut_cache["bounds"] != bounds:
+            # Drop the old table first, and the HSV image right after
+            # inRange: only the table itself is cached
+            _lut_cache["lut"] = None
+            hsv = _hsv_of_all_colors()
+            _lut_cache["lut"] = cv2.inRange(hsv, np.array(bounds[0]), np.array(bounds[1])).reshape(-1)
+            del hsv
+            _lut_cache["bounds"] = bounds
+        return _lut_cache["lut"]
+
+
+def lut_mask(frame, lut):
+    """Applies a color_lut table to a BGR frame."""
+    # BGRA viewed as little-endian uint32 is b | g << 8 | r << 16 | a << 24
+    index = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA).view(np.uint32)[..., 0]
+    index &= 0xFFFFFF
+    return np.take(lut, index)
+
+
+def color_mask(frame, lower_color, upper_color, method=None):
+    """
+    Mask (uint8, 0/255) of the pixels whose HSV color lies within the
+    bounds, computed with `method` (default: METHOD).
+    """
+    if (method or METHOD) == "lut":
+        return lut_mask(frame, color_lut(lower_color, upper_color))
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    return cv2.inRange(hsv, lower_color, upper_color)
+
+
+def save_bounds(lower_color, upper_color, path=None, **info):
+    """Writes the HSV bounds (plus any `info`, e.g. how they were found) to the config file."""
+    config = {
+        "lower": [int(v) for v in lower_color],
+        "upper": [int(v) for v in upper_color],
+        "saved": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    config.update(info)
+    path = path or HSV_CONFIG_FILE
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as file:
+        json.dump(config, file, indent=1)
+    os.replace(tmp, path)
+
+
+def load_bounds(default_lower, default_upper, path=None):
+    """(lower, upper) HSV bounds from the config file, or the defaults if there is none."""
+    path = path or HSV_CONFIG_FILE
+    if not os.path.exists(path):
+        return default_lower, default_upper
+    with open(path) as file:
+        config = json.load(file)
+    return np.array(config["lower"]), np.array(config["upper"])
@@ -0,0 +1,231 @@
+import argparse
+import io
+import time
+
+import numpy as np
+
+# --- Frame Layouts ---
+# Binary frame sent by SendValues.ino with OUTPUT_FORMAT FORMAT_BINARY
+# (little-endian, packed, 11 bytes):
+#   sync        2 bytes  0xA5 0x5A
+#   time_ms     uint32   millis() at the start of the sample
+#   distance_mm uint16   NO_DISTANCE when out of range / ranging failed
+#   fsr_reading uint16   analogRead value
+#   checksum    uint8    sum of the 8 payload bytes, modulo 256
+SYNC = b'\xa5\x5a'
+NO_DISTANCE = 0xFFFF
+FRAME_DTYPE = np.dtype([
+    ('sync', '<u2'),
+    ('time_ms', '<u4'),
+    ('distance_mm', '<u2'),
+    ('fsr_reading', '<u2'),
+    ('checksum', 'u1'),
+])
+FRAME_SIZE = FRAME_DTYPE.itemsize
+
+# Decoded samples, whatever the wire format
+RECORD_DTYPE = np.dtype([
+    ('distance_mm', '<f8'),
+    ('fsr_reading', '<i4'),
+    ('time_ms', '<i8'),
+])
+
+_PAYLOAD = np.arange(2, FRAME_SIZE - 1)
+
+# Lines starting with this are replies of SendValues.ino to host commands
+# (in the text formats; binary decoding skips them like any other garbage)
+REPLY_PREFIX = b'#'
+
+
+def _empty():
+    return np.empty(0, dtype=RECORD_DTYPE)
+
+
+def encode_frames(records):
+    """
+    Binary frames for an array of RECORD_DTYPE samples (the inverse of
+    BinaryFrameDecoder; used for benchmarks and replaying logs).
+    """
+    frames = np.zeros(len(records), dtype=FRAME_DTYPE)
+    frames['sync'] = np.frombuffer(SYNC, dtype='<u2')[0]
+    frames['time_ms'] = records['time_ms']
+    distance = records['distance_mm']
+    frames['distance_mm'] = np.where(np.isnan(distance), NO_DISTANCE, np.nan_to_num(distance)).astype('<u2')
+    frames['fsr_reading'] = records['fsr_reading']
+    raw = frames.view(np.uint8).reshape(-1, FRAME_SIZE)
+    raw[:, -1] = raw[:, 2:-1].sum(axis=1) & 0xFF
+    return frames.tobytes()
+
+
+class BinaryFrameDecoder:
+    """
+    Decodes a stream of binary frames from arbitrary-sized chunks (as
+    returned by ser.read) into RECORD_DTYPE arrays. All sync positions in a
+    chunk are checked at once; frames with a bad checksum are skipped and
+    decoding resumes at the next valid sync word.
+    """
+
+    def __init__(self):
+        self._buffer = b''
+        self.frames = 0
+        self.bad_frames = 0
+        self.skipped_bytes = 0
+        self.messages = []  # stays empty: reply lines are skipped with the other non-frame bytes
+
+    def feed(self, data):
+        buf = self._buffer + data
+        n = len(buf) - FRAME_SIZE + 1
+        if n <= 0:
+            self._buffer = buf
+            return _empty()
+
+        raw = np.frombuffer(buf, dtype=np.uint8)
+        starts = np.flatnonzero((raw[:n] == SYNC[0]) & (raw[1:n + 1] == SYNC[1]))
+        checksum = raw[starts[:, None] + _PAYLOAD].sum(axis=1) & 0xFF
+        good = checksum == raw[starts + FRAME_SIZE - 1]
+        self.bad_frames += int(np.count_nonzero(~good))
+        starts = starts[good]
+        # A sync word + checksum inside the payload of a real frame is
+        # possible but rare; drop valid frames overlapping the previous one
+        if len(starts) > 1:
+            starts = starts[np.concatenate(([True], np.diff(starts) >= FRAME_SIZE))]
+
+        consumed = int(starts[-1]) + FRAME_SIZE if len(starts) else 0
+        # Keep whatever may still be the beginning of a frame
+        keep_from = max(consumed, len(buf) - FRAME_SIZE + 1)
+        self.skipped_bytes += keep_from - len(starts) * FRAME_SIZE
+        self._buffer = buf[keep_from:]
+        self.frames += len(starts)
+
+        frames = np.frombuffer(buf, dtype=np.uint8)[starts[:, None] + np.arange(FRAME_SIZE)]
+        frames = frames.reshape(-1).view(FRAME_DTYPE)
+        records = np.empty(len(frames), dtype=RECORD_DTYPE)
+        distance = frames['distance_mm']
+        records['distance_mm'] = np.where(distance == NO_DISTANCE, np.nan, distance)
+        records['fsr_reading'] = frames['fsr_reading']
+        records['time_ms'] = frames['time_ms']
+        return records
+
+
+class TerseLineDecoder:
+    """
+    Decodes the terse text format "distance,fsr,time\\n" (distance may be
+    "NaN") from arbitrary-sized chunks into RECORD_DTYPE arrays. Complete
+    lines are parsed in one np.loadtxt call; if a chunk contains a corrupted
+    line it is parsed line by line and bad lines are skipped. Reply lines
+    (REPLY_PREFIX) are collected in `messages`.
+    """
+
+    def __init__(self):
+        self._buffer = b''
+        self.frames = 0
+        self.bad_frames = 0
+        self.messages = []
+
+    def feed(self, data):
+        buf = self._buffer + data
+        end = buf.rfind(b'\n')
+        if end < 0:
+            self._buffer = buf
+            return _empty()
+        block, self._buffer = buf[:end + 1], buf[end + 1:]
+        if REPLY_PREFIX in block:
+            lines = block.split(b'\n')
+            self.messages += [line.strip().decode('utf-8', errors='ignore') for line in lines
+                              if line.startswith(REPLY_PREFIX)]
+            block = b'\n'.join(line for line in lines if not line.startswith(REPLY_PREFIX))
+            if not block.strip():
+                return _empty()
+        try:
+            values = np.loadtxt(io.BytesIO(block), delimiter=',', dtype=np.float64, ndmin=2)
+            if values.size and values.shape[1] != 3:
+                raise ValueError("wrong column count")
+        except ValueError:
+            values = self._parse_lines(block)
+        records = np.empty(len(values), dtype=RECORD_DTYPE)
+        if len(values):
+            records['distance_mm'] = values[:, 0]
+            records['fsr_reading'] = values[:, 1]
+            records['time_ms'] = values[:, 2]
+        self.frames += len(records)
+        return records
+
+    def _parse_lines(self, block):
+        rows = []
+        for line in block.split(b'\n'):
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split(b',')
+            try:
+                if len(parts) != 3:
+                    raise ValueError(line)
+                rows.append((float(parts[0]), int(parts[1]), int(parts[2])))
+            except ValueError:
+                self.bad_frames += 1
+        return np.array(rows, dtype=np.float64).reshape(-1, 3)
+
+
+def make_decoder(serial_format):
+    """Decoder for "binary" or "terse"; the "text" format is parsed line by line in ESP32.py."""
+    if serial_format == 'binary':
+        return BinaryFrameDecoder()
+    if serial_format == 'terse':
+        return TerseLineDecoder()
+    raise ValueError(f"No chunk decoder for serial format {serial_format!r}")
+
+
+# --- Benchmark ---
+
+def _synthetic_records(n):
+    rng = np.random.default_rng(0)
+    records = np.empty(n, dtype=RECORD_DTYPE)
+    records['distance_mm'] = rng.integers(20, 400, n)
+    records['distance_mm'][rng.random(n) < 0.05] = np.nan
+    records['fsr_reading'] = rng.integers(0, 4096, n)
+    records['time_ms'] = np.cumsum(rng.integers(1, 5, n)) + 10000
+    return records
+
+
+def benchmark(n=200000, chunk_size=4096, baud=115200):
+    import ESP32
+
+    records = _synthetic_records(n)
+    streams = {
+        'text': ''.join(
+            f"Distance(mm): {'NaN' if np.isnan(d) else int(d)}\tFSR Reading: {f}\tTime(ms):{t}\r\n"
+            for d, f, t in records.tolist()).encode(),
+        'terse': ''.join(
+            f"{'NaN' if np.isnan(d) else int(d)},{f},{t}\n" for d, f, t in records.tolist()).encode(),
+        'binary': encode_frames(records),
+    }
+    # 8N1 serial: 10 bits on the wire per byte
+    bytes_per_second = baud / 10
+    print(f"{n} samples, {chunk_size}-byte chunks, {baud} baud")
+    for name, stream in streams.items():
+        t0 = time.perf_counter()
+        if name == 'text':
+            parsed = 0
+            for line in io.BytesIO(stream):
+                if ESP32.parse_serial_data(line.decode('utf-8', errors='ignore').strip()):
+                    parsed += 1
+        else:
+            decoder = make_decoder(name)
+            parsed = sum(len(decoder.feed(stream[i:i + chunk_size])) for i in range(0, len(stream), chunk_size))
+        elapsed = time.perf_counter() - t0
+        per_sample = len(stream) / n
+        print(f"  {name:6s}: {per_sample:5.1f} bytes/sample -> max {bytes_per_second / per_sample:7.0f} samples/s "
+              f"on the link; parser {parsed / elapsed:10.0f} samples/s ({parsed} parsed)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the text, terse and binary serial parsers.")
+    parser.add_argument("-n", "--samples", type=int, default=200000)
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--baud", type=int, default=115200)
+    args = parser.parse_args()
+    benchmark(args.samples, args.chunk_size, args.baud)
+
+
+if __name__ == "__main__":
+    main()